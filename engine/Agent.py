@@ -1,44 +1,190 @@
 import random
 import time
-from collections import defaultdict
+import zlib
+from collections.abc import Callable
+from collections import defaultdict, namedtuple
 import chess
 from engine.Eval import Eval
-from enum import Enum
-from collections import namedtuple
-from engine.consts import MATE_SCORE
+from engine.EvalOld import EvalOld
+from engine.EvalCache import EvalCache, DEFAULT_EVAL_CACHE_BITS
+from engine.NodeStatus import NodeStatus, is_repetition
+from engine import attacks, kernels
+from engine.TranspositionTable import NodeType, TTEntry, TranspositionTable, DEFAULT_TT_BITS
+from engine.consts import MATE_SCORE, MATE, MAX_PLY
 
-class NodeType(Enum):
-    EXACT = 1
-    LOWER_BOUND = 2
-    UPPER_BOUND = 3
-
-TTEntry = namedtuple('TTEntry', ['value', 'depth', 'flag', 'best_move'])
+class SearchAborted(Exception):
+    # raised inside the search when the time is up or the search was stopped from outside
+    pass
 
 MAX_QS_DEPTH = 6
 
 MAX_SEARCH_DEPTH = 4
 
+# selective depth, see alpha_beta
+EXTENSION_LIMIT = 2  # extensions stop at this multiple of the nominal depth
+IID_DEPTH = 3
+SINGULAR_DEPTH = 3
+SINGULAR_MARGIN = 25  # per ply of depth
+
+# shallow depth pruning, see alpha_beta. margins are indexed by the remaining depth, depths past the end of a
+# table aren't pruned, so an empty dict turns the pruning off
+PRUNING_MARGINS = {
+    'reverse_futility': (0, 120, 240, 360),
+    'futility': (0, 150, 300, 500),
+    'razoring': (0, 300, 550),
+    'late_move_count': (0, 10, 16, 24),  # quiet moves searched before the rest are skipped
+}
+
+
+# ref https://www.chessprogramming.org/Checkmate#MateScores
+# mate scores count plies from the root, in the transposition table they count plies from the stored node instead,
+# so that the entry is still correct when the same position is reached at a different ply
+def score_to_tt(score: float, ply: int) -> float:
+    if score > MATE_SCORE:
+        return score + ply
+    if score < -MATE_SCORE:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: float, ply: int) -> float:
+    if score > MATE_SCORE:
+        return score - ply
+    if score < -MATE_SCORE:
+        return score + ply
+    return score
+
+
+# one line of a multipv search, the score is from the engine's side like the other search scores
+SearchLine = namedtuple('SearchLine', ['move', 'score', 'pv'])
+
+
+def mate_in(score: float) -> int | None:
+    # moves until mate, negative when the engine gets mated, None for scores that aren't mates
+    if abs(score) <= MATE_SCORE:
+        return None
+    moves = (MATE - abs(score) + 1) // 2
+    return int(moves if score > 0 else -moves)
+
+
+# ref https://www.chessprogramming.org/Zobrist_Hashing
+# the keys are shared by every agent and come from a generator of their own, so creating an agent doesn't reseed the
+# global random module. they are the values random.seed(2025) used to give, so stored tables stay valid
+_zobrist_random = random.Random(2025)
+ZOBRIST_PIECE = tuple(tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(64)) for _ in range(2))
+                      for _ in range(6))  # [piece type - 1][0 white, 1 black][square]
+ZOBRIST_CASTLING = tuple(_zobrist_random.getrandbits(64) for _ in range(16))  # 4 bits: KQkq
+ZOBRIST_EP_FILE = tuple(_zobrist_random.getrandbits(64) for _ in range(8))
+ZOBRIST_TURN = _zobrist_random.getrandbits(64)
+del _zobrist_random
+# the piece keys in the kernels' plane order, see engine/kernels.py
+ZOBRIST_KERNEL_KEYS = kernels.table([ZOBRIST_PIECE[piece_index][color_index] for color_index in range(2)
+                                     for piece_index in range(6)])
+
+
+def nnue_evaluator(*args, **kwargs):
+    # numpy and the network are only loaded once the nnue evaluator is used
+    from engine.EvalNNUE import EvalNNUE
+    return EvalNNUE(*args, **kwargs)
+
+
+# evaluators that can be plugged into the agent. they share the same interface:
+# constructed with (engine_color, cache=..., contempt=...), evaluate(board, ply, key, status) for the search,
+# evaluate_static(board) for the score without the terminal checks and push(board) / pop() around every move the
+# search makes, for evaluators that update their state incrementally
+EVALUATORS = {
+    'eval': Eval,
+    'old': EvalOld,
+    'nnue': nnue_evaluator,
+}
+
 class Agent:
-    def __init__(self, engine_color: chess.Color = chess.BLACK):
-        self.evaluator = Eval(engine_color)
+    def __init__(self, engine_color: chess.Color = chess.BLACK, evaluator: str = 'eval',
+                 pruning_margins: dict[str, tuple[int, ...]] | None = None, contempt: int = 0,
+                 tt_path: str | None = None, tt_bits: int = DEFAULT_TT_BITS,
+                 eval_cache_bits: int = DEFAULT_EVAL_CACHE_BITS):
+        # with tt_path the transposition table is kept in that file (see engine/TranspositionTable.py) and a search
+        # of a position the file already knows continues from the depth it reached
+        self.eval_cache = EvalCache(eval_cache_bits)
+        self.evaluator = EVALUATORS[evaluator](engine_color, cache=self.eval_cache, contempt=contempt)
+        self.pruning_margins = PRUNING_MARGINS if pruning_margins is None else pruning_margins
         self.killer_moves: dict[int, list[chess.Move]] = defaultdict(list)
         self.history_heuristic = defaultdict(int)
-        self.transposition_table: dict[int, TTEntry] = {}
-
-        random.seed(2025)
-        self.zobrist_piece = [[[random.getrandbits(64) for _ in range(64)] for _ in range(2)] for _ in range(6)]
-        self.zobrist_castling = [random.getrandbits(64) for _ in range(16)] # 4 bits: KQkq
-        self.zobrist_ep_file = [random.getrandbits(64) for _ in range(8)]
-        self.zobrist_turn = random.getrandbits(64)
+        self.transposition_table: dict[int, TTEntry] | TranspositionTable = {}
+        # zobrist keys of the game history and the current search path, used for repetition detection
+        self.key_history: list[int] = []
+        self.search_start = 0  # keys before this index are from the game, the rest from the search path
+
+        self.zobrist_piece = ZOBRIST_PIECE
+        self.zobrist_castling = ZOBRIST_CASTLING
+        self.zobrist_ep_file = ZOBRIST_EP_FILE
+        self.zobrist_turn = ZOBRIST_TURN
+        # piece values by piece type for the compiled SEE
+        self.see_values = kernels.values([0] + [self.evaluator.piece_scores[piece_type]
+                                                for piece_type in chess.PIECE_TYPES])
+
+        self.persistent_tt = tt_path is not None
+        if tt_path is not None:
+            self.transposition_table = TranspositionTable(tt_path, self.tt_fingerprint(), tt_bits)
 
         self.counter = 0
+        self.nodes = 0
+        # counted on every search, with or without the profiler, they cost no more than the node count
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_stores = 0
+
+        # search limits, checked at every node
+        self.stop_time: float | None = None
+        self.node_limit: int | None = None
+        self.stopped = False
+        self.root_best_move: chess.Move | None = None
+        self.completed_depth = 0
+        self.root_depth = 0
+        self.seldepth = 0  # deepest ply reached by the current search, with extensions and quiescence
+        self.lines: list[SearchLine] = []  # best root moves of the last completed depth, best first
+
+    def tt_fingerprint(self) -> int:
+        # identifies the zobrist keys and everything the stored scores depend on, including the engine's color
+        evaluator = self.evaluator
+        config = repr((type(evaluator).__name__, sorted(getattr(evaluator, 'weights', {}).items()),
+                       getattr(evaluator, 'network_id', None), evaluator.draw_score, MATE, evaluator.engine_color))
+        return self.zobrist_hash(chess.Board()) ^ zlib.crc32(config.encode())
+
+    def close(self):
+        # writes out and closes a persistent transposition table
+        if self.persistent_tt:
+            self.transposition_table.close()
+
+    def stop(self):
+        # can be called from another thread to end the current search early. the search doesn't clear the flag
+        # itself, whoever starts it in a thread does so before, otherwise a stop sent right after is lost
+        self.stopped = True
+
+    def check_limits(self):
+        if self.stopped or (self.stop_time is not None and time.perf_counter() >= self.stop_time) \
+                or (self.node_limit is not None and self.nodes >= self.node_limit):
+            raise SearchAborted()
+
+    def tt_probe(self, key: int) -> TTEntry | None:
+        # the search reads and writes the transposition table only through these two, so the profiler can time them
+        self.tt_probes += 1
+        entry = self.transposition_table.get(key)
+        if entry is not None:
+            self.tt_hits += 1
+        return entry
+
+    def tt_store(self, key: int, entry: TTEntry):
+        self.tt_stores += 1
+        self.transposition_table[key] = entry
 
     def zobrist_hash(self, board: chess.Board) -> int:
         # ref https://www.chessprogramming.org/Zobrist_Hashing
-        h = 0
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
+        if kernels.ENABLED:
+            h = int(kernels.zobrist_pieces(kernels.board_masks(board), ZOBRIST_KERNEL_KEYS)) & 0xFFFF_FFFF_FFFF_FFFF
+        else:
+            h = 0
+            for square, piece in board.piece_map().items():
                 piece_index = piece.piece_type - 1
                 color_index = 0 if piece.color == chess.WHITE else 1
                 h ^= self.zobrist_piece[piece_index][color_index][square]
@@ -50,7 +196,7 @@ class Agent:
         if board.has_queenside_castling_rights(chess.BLACK): castling_rights |= 1 << 0
         h ^= self.zobrist_castling[castling_rights]
 
-        if board.ep_square is not None:
+        if board.ep_square is not None and board.has_legal_en_passant():
             ep_file = chess.square_file(board.ep_square)
             h ^= self.zobrist_ep_file[ep_file]
 
@@ -59,53 +205,94 @@ class Agent:
 
         return h
 
+    def game_history_keys(self, board: chess.Board) -> list[int]:
+        # keys of the positions before the current one that can still be repeated,
+        # i.e. those since the last capture or pawn move
+        keys = []
+        board_copy = board.copy()
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            board_copy.pop()
+            keys.append(self.zobrist_hash(board_copy))
+        keys.reverse()
+        return keys
+
+    def is_draw(self, board: chess.Board, key: int) -> bool:
+        # ref https://www.chessprogramming.org/Repetitions
+        # ref https://www.chessprogramming.org/Fifty-move_Rule
+        # draws the search can see without generating moves, checked before anything else so cycles are cut off
+        # at once. the fifty move rule doesn't apply when the last move mated
+        if board.halfmove_clock >= 100:
+            return not board.is_check() or any(board.generate_legal_moves())
+        return board.halfmove_clock >= 4 \
+            and is_repetition(key, self.key_history, board.halfmove_clock, self.search_start)
+
+    def principal_variation(self, board: chess.Board, max_length: int = MAX_SEARCH_DEPTH * 2) -> list[chess.Move]:
+        # follows the best moves stored in the transposition table
+        pv = []
+        board_copy = board.copy(stack=False)
+        seen = set()
+        while len(pv) < max_length:
+            key = self.zobrist_hash(board_copy)
+            entry = self.transposition_table.get(key)
+            if key in seen or entry is None or entry.best_move is None or not board_copy.is_legal(entry.best_move):
+                break
+            seen.add(key)
+            pv.append(entry.best_move)
+            board_copy.push(entry.best_move)
+        return pv
+
     def see_capture(self, board: chess.Board, move: chess.Move) -> int:
         # see - static exchange evaluation
         # ref https://www.chessprogramming.org/Static_Exchange_Evaluation
+        # ref https://www.chessprogramming.org/SEE_-_The_Swap_Algorithm
+        # both sides recapture on the target square with their least valuable attacker and may stop when going on
+        # loses material. pieces leaving the square's lines uncover the sliders behind them
         if not board.is_capture(move):
             return 0
 
-        victim = board.piece_at(move.to_square)
+        victim = board.piece_type_at(move.to_square)
         if not victim:
             return 0
 
-        board.push(move)
+        if kernels.ENABLED:
+            return int(kernels.see(kernels.board_masks(board), move.from_square, move.to_square, int(board.turn),
+                                   self.see_values, kernels.KNIGHT_ATTACKS, kernels.KING_ATTACKS, kernels.PAWN_ATTACKS))
 
+        piece_scores = self.evaluator.piece_scores
         target_square = move.to_square
-        attackers = board.attackers(board.turn, target_square)
-
-        if not attackers:
-            board.pop()
-            return self.evaluator.piece_scores[victim.piece_type]
-
-        min_attacker_value = float('inf')
-        min_attacker_square = None
-
-        for attacker_square in attackers:
-            piece = board.piece_at(attacker_square)
-            if piece and self.evaluator.piece_scores[piece.piece_type] < min_attacker_value:
-                min_attacker_value = self.evaluator.piece_scores[piece.piece_type]
-                min_attacker_square = attacker_square
-
-        board.pop()
-
-        if min_attacker_square is None:
-            return self.evaluator.piece_scores[victim.piece_type]
-
-        recapture_move = chess.Move(min_attacker_square, target_square)
-        if recapture_move in board.legal_moves:
-            return self.evaluator.piece_scores[victim.piece_type] - self.see_capture(board, recapture_move)
-        else:
-            return self.evaluator.piece_scores[victim.piece_type]
-
-    def score_moves(self, board: chess.Board, moves: list[chess.Move], depth: int, maximizing_player: bool) \
-        -> list[chess.Move]:
+        occupied = board.occupied ^ (1 << move.from_square)
+        gain = [piece_scores[victim]]
+        on_square = piece_scores[board.piece_type_at(move.from_square)]
+        color = not board.turn
+        while True:
+            attackers = attacks.attackers_mask(board, color, target_square, occupied)
+            if not attackers:
+                break
+            for piece_type in chess.PIECE_TYPES:
+                attacker = attackers & board.pieces_mask(piece_type, color)
+                if attacker:
+                    break
+            if piece_type == chess.KING and attacks.attackers_mask(board, not color, target_square, occupied):
+                # the king can't recapture on a defended square
+                break
+            gain.append(on_square - gain[-1])
+            on_square = piece_scores[piece_type]
+            occupied ^= attacker & -attacker
+            color = not color
+
+        while len(gain) > 1:
+            last = gain.pop()
+            gain[-1] = -max(-gain[-1], last)
+        return gain[0]
+
+    def score_moves(self, board: chess.Board, moves: list[chess.Move], depth: int) -> list[chess.Move]:
+        # the move scores are from the point of view of the side to move, so the best moves come first for both sides
         moves_ = []
         for move in moves:
             score = self.score_move(board, move, depth)
             moves_.append((move, score))
 
-        moves_.sort(key=lambda x: x[1], reverse=maximizing_player)
+        moves_.sort(key=lambda x: x[1], reverse=True)
         sorted_moves = [move for move, _ in moves_]
         return sorted_moves
 
@@ -133,7 +320,7 @@ class Agent:
             else:
                 score += 200
 
-        if board.gives_check(move):
+        if attacks.gives_check(board, move):
             score += 120
 
         if board.is_castling(move):
@@ -151,16 +338,38 @@ class Agent:
 
         return score
 
-    def quiescence_minimax(self, board: chess.Board, main_depth: int, qs_depth: int, alpha: float, beta: float,
-                           maximizing_player: bool) -> float:
+    def pruning_margin(self, name: str, depth: int) -> int | None:
+        margins = self.pruning_margins.get(name, ())
+        return margins[depth] if 0 < depth < len(margins) else None
+
+    def is_quiet(self, board: chess.Board, move: chess.Move, tt_move: chess.Move | None, depth: int) -> bool:
+        # moves the shallow depth pruning may skip
+        return move != tt_move \
+            and not move.promotion \
+            and not board.is_capture(move) \
+            and move not in self.killer_moves.get(depth, []) \
+            and not attacks.gives_check(board, move)
+
+    def quiescence_minimax(self, board: chess.Board, ply: int, qs_depth: int, alpha: float, beta: float,
+                           maximizing_player: bool, key: int | None = None, status: NodeStatus | None = None) \
+            -> float:
         # ref https://www.chessprogramming.org/Quiescence_Search
         # implemented using minimax instead of negamax for consistency
-        eval_depth = main_depth + qs_depth
+        # ply is the distance of the main search leaf from the root
 
         self.counter += 1
-        static_eval = self.evaluator.evaluate(board, eval_depth)
-
-        if board.is_game_over() or qs_depth >= MAX_QS_DEPTH:
+        self.nodes += 1
+        self.seldepth = max(self.seldepth, ply + qs_depth)
+        self.check_limits()
+        if key is None:
+            key = self.zobrist_hash(board)
+            if self.is_draw(board, key):
+                return self.evaluator.draw_score
+        if status is None:
+            status = NodeStatus(board, key, self.key_history)
+        static_eval = self.evaluator.evaluate(board, ply + qs_depth, key, status)
+
+        if status.is_game_over or qs_depth >= MAX_QS_DEPTH:
             return static_eval
 
         if maximizing_player:
@@ -176,14 +385,14 @@ class Agent:
 
         moves = []
         check_move_ctr = 0
-        for move in board.legal_moves:
+        for move in status.legal_moves:
             if board.is_capture(move) or (move.promotion and move.promotion == chess.QUEEN):
                 moves.append(move)
-            elif qs_depth < 3 and check_move_ctr < 4 and board.gives_check(move):
+            elif qs_depth < 3 and check_move_ctr < 4 and attacks.gives_check(board, move):
                 check_move_ctr += 1
                 moves.append(move)
 
-        sorted_moves = self.score_moves(board, moves, eval_depth, maximizing_player)
+        sorted_moves = self.score_moves(board, moves, qs_depth)
 
         if qs_depth >= 3:
             moves = sorted_moves[:4]
@@ -192,27 +401,36 @@ class Agent:
         else:
             moves = sorted_moves[:8]
 
+        self.key_history.append(key)
         if maximizing_player:
             for move in moves:
                 board.push(move)
-                score = self.quiescence_minimax(board, main_depth, qs_depth + 1, alpha, beta, False)
+                self.evaluator.push(board)
+                score = self.quiescence_minimax(board, ply, qs_depth + 1, alpha, beta, False)
                 board.pop()
+                self.evaluator.pop()
 
                 if score >= beta:
-                    return beta
+                    alpha = beta
+                    break
                 if score > alpha:
                     alpha = score
+            self.key_history.pop()
             return alpha
         else:
             for move in moves:
                 board.push(move)
-                score = self.quiescence_minimax(board, main_depth, qs_depth + 1, alpha, beta, True)
+                self.evaluator.push(board)
+                score = self.quiescence_minimax(board, ply, qs_depth + 1, alpha, beta, True)
                 board.pop()
+                self.evaluator.pop()
 
                 if score <= alpha:
-                    return alpha
+                    beta = alpha
+                    break
                 if score < beta:
                     beta = score
+            self.key_history.pop()
             return beta
 
     def alpha_beta(
@@ -222,44 +440,160 @@ class Agent:
             alpha: float,
             beta: float,
             maximizing_player: bool,
+            ply: int = 0,
+            excluded_move: chess.Move | None = None,
+            extended: bool = False,
             ) -> tuple[float, chess.Move | None]:
-        if depth == 0 or board.is_game_over():
-            return self.quiescence_minimax(board, depth, 0, alpha, beta, maximizing_player), None
+        # excluded_move is only set by the singular extension search, which searches the node without the tt move.
+        # extended is set by internal iterative deepening, whose depth already has this node's extension
+        if ply == 0:
+            self.key_history = self.game_history_keys(board)
+            self.search_start = len(self.key_history)
+            self.root_depth = depth
+        self.seldepth = max(self.seldepth, ply)
 
         key = self.zobrist_hash(board)
+        if ply > 0 and self.is_draw(board, key):
+            return self.evaluator.draw_score, None
+        status = NodeStatus(board, key, self.key_history)
+
+        # ref https://www.chessprogramming.org/Check_Extensions
+        # ref https://www.chessprogramming.org/One_Reply_Extensions
+        # positions in check or with a single legal move are searched one ply deeper, but only up to twice the
+        # nominal depth so the extensions can't make the search explode
+        extend = ply < self.root_depth * EXTENSION_LIMIT and excluded_move is None
+        if extend and not extended and (status.in_check or len(status.legal_moves) == 1):
+            depth += 1
+        if ply >= MAX_PLY - MAX_QS_DEPTH:
+            depth = 0
+
+        if depth <= 0 or status.is_game_over:
+            return self.quiescence_minimax(board, ply, 0, alpha, beta, maximizing_player, key, status), None
+
+        self.nodes += 1
+        self.check_limits()
+
+        if ply > 0:
+            # ref https://www.chessprogramming.org/Mate_Distance_Pruning
+            # nothing below here can score better than mating or worse than being mated at this ply,
+            # if a shorter mate is already known the node can't change the result
+            alpha = max(alpha, -(MATE - ply))
+            beta = min(beta, MATE - ply)
+            if alpha >= beta:
+                return alpha, None
+
         alpha_original = alpha
 
-        if key in self.transposition_table:
-            value, stored_depth, flag, stored_move = self.transposition_table[key]
-            if stored_depth >= depth:
-                if flag == NodeType.EXACT:
-                    return value, stored_move
-                elif flag == NodeType.LOWER_BOUND and value >= beta:
-                    return value, stored_move
-                elif flag == NodeType.UPPER_BOUND and value <= alpha:
-                    return value, stored_move
+        tt_entry = self.tt_probe(key)
+        tt_move, tt_value = None, 0
+        if tt_entry is not None:
+            tt_value = score_from_tt(tt_entry.value, ply)
+            if tt_entry.depth >= depth and excluded_move is None:
+                if tt_entry.flag == NodeType.EXACT:
+                    return tt_value, tt_entry.best_move
+                elif tt_entry.flag == NodeType.LOWER_BOUND and tt_value >= beta:
+                    return tt_value, tt_entry.best_move
+                elif tt_entry.flag == NodeType.UPPER_BOUND and tt_value <= alpha:
+                    return tt_value, tt_entry.best_move
+            if tt_entry.best_move in status.legal_moves:
+                tt_move = tt_entry.best_move
+
+        # ref https://www.chessprogramming.org/Reverse_Futility_Pruning
+        # ref https://www.chessprogramming.org/Razoring
+        # close to the leaves a static eval far above beta (below alpha for the minimizing side) is trusted to
+        # fail high, and one far below alpha only gets a quiescence search to confirm it.
+        # never in check or against a mate score, where the static eval means nothing
+        static_eval = None
+        if ply > 0 and excluded_move is None and not status.in_check:
+            static_eval = self.evaluator.evaluate(board, ply, key, status)
+            reverse_futility = self.pruning_margin('reverse_futility', depth)
+            razoring = self.pruning_margin('razoring', depth)
+            if maximizing_player:
+                if reverse_futility is not None and abs(beta) < MATE_SCORE and static_eval - reverse_futility >= beta:
+                    return static_eval - reverse_futility, None
+                if razoring is not None and abs(alpha) < MATE_SCORE and static_eval + razoring < alpha:
+                    score = self.quiescence_minimax(board, ply, 0, alpha, beta, True, key, status)
+                    if score < alpha:
+                        return score, None
+            else:
+                if reverse_futility is not None and abs(alpha) < MATE_SCORE and static_eval + reverse_futility <= alpha:
+                    return static_eval + reverse_futility, None
+                if razoring is not None and abs(beta) < MATE_SCORE and static_eval - razoring > beta:
+                    score = self.quiescence_minimax(board, ply, 0, alpha, beta, False, key, status)
+                    if score > beta:
+                        return score, None
+
+        # ref https://www.chessprogramming.org/Futility_Pruning
+        # ref https://www.chessprogramming.org/Futility_Pruning#MoveCountBasedPruning
+        # quiet moves that can't bring the static eval back into the window are skipped, and so are the quiet
+        # moves late in the ordering once enough have been searched
+        futility_margin = None
+        if static_eval is not None and abs(alpha if maximizing_player else beta) < MATE_SCORE:
+            futility_margin = self.pruning_margin('futility', depth)
+        late_move_count = self.pruning_margin('late_move_count', depth) if static_eval is not None else None
+
+        if tt_move is None and depth >= IID_DEPTH and ply > 0 and excluded_move is None:
+            if beta - alpha > 1:
+                # ref https://www.chessprogramming.org/Internal_Iterative_Deepening
+                # a shallower search of this pv node finds a move to search first
+                self.alpha_beta(board, depth - 2, alpha, beta, maximizing_player, ply, extended=True)
+                tt_entry = self.tt_probe(key)
+                if tt_entry is not None and tt_entry.best_move in status.legal_moves:
+                    tt_move = tt_entry.best_move
+                    tt_value = score_from_tt(tt_entry.value, ply)
+            else:
+                # internal iterative reduction, without a move to try first a null window node isn't worth the depth
+                depth -= 1
+
+        # ref https://www.chessprogramming.org/Singular_Extensions
+        # the tt move is singular when every other move searched at reduced depth stays clearly worse than the
+        # tt score, it is then searched one ply deeper
+        singular_extension = 0
+        if extend and tt_move is not None and ply > 0 and depth >= SINGULAR_DEPTH \
+                and tt_entry.depth >= depth - 3 and abs(tt_value) < MATE_SCORE and len(status.legal_moves) > 1:
+            margin = SINGULAR_MARGIN * depth
+            if maximizing_player and tt_entry.flag != NodeType.UPPER_BOUND:
+                singular_beta = tt_value - margin
+                score, _ = self.alpha_beta(board, (depth - 1) // 2, singular_beta - 1, singular_beta, True, ply,
+                                           tt_move)
+                singular_extension = int(score < singular_beta)
+            elif not maximizing_player and tt_entry.flag != NodeType.LOWER_BOUND:
+                singular_alpha = tt_value + margin
+                score, _ = self.alpha_beta(board, (depth - 1) // 2, singular_alpha, singular_alpha + 1, False, ply,
+                                           tt_move)
+                singular_extension = int(score > singular_alpha)
 
         best_move = None
-        legal_moves = list(board.legal_moves)
+        legal_moves = status.legal_moves
 
-        sorted_moves = self.score_moves(board, legal_moves, depth, maximizing_player)
+        sorted_moves = self.score_moves(board, legal_moves, depth)
 
-        if key in self.transposition_table:
-            _, _, _, tt_move = self.transposition_table[key]
-            if tt_move in sorted_moves:
-                sorted_moves.remove(tt_move)
-                sorted_moves.insert(0, tt_move)
+        if tt_move is not None:
+            sorted_moves.remove(tt_move)
+            sorted_moves.insert(0, tt_move)
 
+        self.key_history.append(key)
         if maximizing_player:
             max_score = float('-inf')
-            for move in sorted_moves:
+            for i, move in enumerate(sorted_moves):
+                if move == excluded_move:
+                    continue
+                if best_move is not None and (futility_margin is not None and static_eval + futility_margin <= alpha
+                                              or late_move_count is not None and i >= late_move_count) \
+                        and self.is_quiet(board, move, tt_move, depth):
+                    continue
+                extension = singular_extension if move == tt_move else 0
                 board.push(move)
-                score, _ = self.alpha_beta(board, depth - 1, alpha, beta, False)
+                self.evaluator.push(board)
+                score, _ = self.alpha_beta(board, depth - 1 + extension, alpha, beta, False, ply + 1)
                 board.pop()
+                self.evaluator.pop()
 
                 if score > max_score:
                     best_move = move
                     max_score = score
+                    if ply == 0:
+                        self.root_best_move = move
 
                 alpha = max(alpha, score)
                 if beta <= alpha:
@@ -268,25 +602,38 @@ class Agent:
                     if move not in self.killer_moves[depth]:
                         self.killer_moves[depth].append(move)
                     break
+            self.key_history.pop()
+            if excluded_move is not None:
+                return max_score, best_move
             if max_score <= alpha_original:
                 flag = NodeType.UPPER_BOUND
             elif max_score >= beta:
                 flag = NodeType.LOWER_BOUND
             else:
                 flag = NodeType.EXACT
-            self.transposition_table[key] = TTEntry(max_score, depth, flag, best_move)
+            self.tt_store(key, TTEntry(score_to_tt(max_score, ply), depth, flag, best_move))
             return max_score, best_move
         else:
             min_eval = float('inf')
-            for move in legal_moves:
-
+            for i, move in enumerate(sorted_moves):
+                if move == excluded_move:
+                    continue
+                if best_move is not None and (futility_margin is not None and static_eval - futility_margin >= beta
+                                              or late_move_count is not None and i >= late_move_count) \
+                        and self.is_quiet(board, move, tt_move, depth):
+                    continue
+                extension = singular_extension if move == tt_move else 0
                 board.push(move)
-                score, _ = self.alpha_beta(board, depth - 1, alpha, beta, True)
+                self.evaluator.push(board)
+                score, _ = self.alpha_beta(board, depth - 1 + extension, alpha, beta, True, ply + 1)
                 board.pop()
+                self.evaluator.pop()
 
                 if score < min_eval:
                     best_move = move
                     min_eval = score
+                    if ply == 0:
+                        self.root_best_move = move
                 beta = min(beta, score)
                 if beta <= alpha:
                     if depth not in self.killer_moves:
@@ -294,34 +641,172 @@ class Agent:
                     if move not in self.killer_moves[depth]:
                         self.killer_moves[depth].append(move)
                     break
+            self.key_history.pop()
+            if excluded_move is not None:
+                return min_eval, best_move
             if min_eval <= alpha_original:
                 flag = NodeType.UPPER_BOUND
             elif min_eval >= beta:
                 flag = NodeType.LOWER_BOUND
             else:
                 flag = NodeType.EXACT
-            self.transposition_table[key] = TTEntry(min_eval, depth, flag, best_move)
+            self.tt_store(key, TTEntry(score_to_tt(min_eval, ply), depth, flag, best_move))
             return min_eval, best_move
 
-    def find_best_move(self, board: chess.Board, max_depth: int = MAX_SEARCH_DEPTH, debug = False) -> tuple[chess.Move | None, float]:
+    def search_lines(self, board: chess.Board, depth: int, maximizing_player: bool, multipv: int,
+                     root_moves: list[chess.Move]) -> list[SearchLine]:
+        # ref https://www.chessprogramming.org/Principal_Variation#Multiple_PVs
+        # root search for the best multipv moves. the first multipv moves are searched with a full window, every
+        # other one with a null window at the score of the worst line so far, and again with a full window when
+        # it beats it, so all lines have exact scores. root_moves is the order to search the moves in, it is
+        # sorted by this depth's scores for the next one
+        self.key_history = self.game_history_keys(board)
+        self.search_start = len(self.key_history)
+        self.root_depth = depth
+
+        key = self.zobrist_hash(board)
+        status = NodeStatus(board, key, self.key_history)
+        if status.in_check or len(status.legal_moves) == 1:
+            depth += 1
+
+        self.nodes += 1
+        self.check_limits()
+
+        # the side to move wants higher scores when it is the engine
+        sign = 1 if maximizing_player else -1
+        lines: list[tuple[float, chess.Move]] = []
+        scores = {}
+        self.key_history.append(key)
+        for move in root_moves:
+            board.push(move)
+            self.evaluator.push(board)
+            if len(lines) < multipv:
+                score, _ = self.alpha_beta(board, depth - 1, float('-inf'), float('inf'), not maximizing_player, 1)
+            else:
+                bound = lines[-1][0]
+                alpha, beta = (bound, bound + 1) if maximizing_player else (bound - 1, bound)
+                score, _ = self.alpha_beta(board, depth - 1, alpha, beta, not maximizing_player, 1)
+                if sign * score > sign * bound:
+                    score, _ = self.alpha_beta(board, depth - 1, float('-inf'), float('inf'), not maximizing_player,
+                                               1)
+            board.pop()
+            self.evaluator.pop()
+
+            scores[move] = score
+            if len(lines) < multipv or sign * score > sign * lines[-1][0]:
+                lines.append((score, move))
+                lines.sort(key=lambda line: -sign * line[0])
+                del lines[multipv:]
+                self.root_best_move = lines[0][1]
+        self.key_history.pop()
+        root_moves.sort(key=lambda move: -sign * scores[move])
+
+        if not lines:
+            return []
+        self.tt_store(key, TTEntry(score_to_tt(lines[0][0], 0), depth, NodeType.EXACT, lines[0][1]))
+        result = []
+        for score, move in lines:
+            board.push(move)
+            result.append(SearchLine(move, score, [move] + self.principal_variation(board, depth - 1)))
+            board.pop()
+        return result
+
+    def find_best_lines(self, board: chess.Board, multipv: int, max_depth: int = MAX_SEARCH_DEPTH,
+                        time_limit: float | None = None, info_callback: Callable[[dict], None] | None = None,
+                        node_limit: int | None = None) -> list[SearchLine]:
+        # the best multipv root moves of the deepest completed search, best first, see find_best_move
+        self.find_best_move(board, max_depth, time_limit=time_limit, info_callback=info_callback,
+                            node_limit=node_limit, multipv=multipv)
+        return self.lines
+
+    def find_best_move(self, board: chess.Board, max_depth: int = MAX_SEARCH_DEPTH, debug = False,
+                       time_limit: float | None = None, info_callback: Callable[[dict], None] | None = None,
+                       node_limit: int | None = None, multipv: int = 1) \
+            -> tuple[chess.Move | None, float]:
+        # time_limit is in seconds, the search returns the result of the last completed depth once it runs out.
+        # node_limit works the same way with the number of searched nodes.
+        # info_callback is called after every completed depth with the depth, score, best move, pv, nodes and time,
+        # once for every line with multipv > 1, the lines of the last completed depth are kept in self.lines.
+        # the position may also have the opponent to move (analysis, pondering), scores stay from the engine's side.
+        search_start = time.perf_counter()
         best_move, best_score = None, 0
+        self.nodes = 0
+        self.tt_probes = self.tt_hits = self.tt_stores = 0
+        self.root_best_move = None
+        self.completed_depth = 0
+        self.seldepth = 0
+        self.stop_time = time.perf_counter() + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        stack_size = len(board.move_stack)
+        maximizing_player = board.turn == self.evaluator.engine_color
         start = 0
         if debug:
             self.counter = 0
             start = time.perf_counter()
-        for depth in range(1, max_depth + 1):
-            score, move = self.alpha_beta(board, depth, float('-inf'), float('inf'), True)
-            
-            if abs(score) > MATE_SCORE:
-                break
-            
-            if move is not None:
-                best_move = move
-                best_score = score
+        self.lines = []
+        first_depth = 1
+        if self.persistent_tt and multipv == 1:
+            # a position the table has an exact root result for is searched further from the depth it reached
+            entry = self.transposition_table.get(self.zobrist_hash(board))
+            if entry is not None and entry.flag == NodeType.EXACT and entry.best_move in board.legal_moves:
+                best_move, best_score = entry.best_move, entry.value
+                self.completed_depth = min(entry.depth, max_depth)
+                self.lines = [SearchLine(best_move, best_score, self.principal_variation(board, entry.depth))]
+                first_depth = entry.depth + 1
+        root_moves = self.score_moves(board, list(board.legal_moves), 0)
+        try:
+            for depth in range(first_depth, max_depth + 1):
+                if multipv > 1:
+                    lines = self.search_lines(board, depth, maximizing_player, multipv, root_moves)
+                else:
+                    score, move = self.alpha_beta(board, depth, float('-inf'), float('inf'), maximizing_player)
+                    lines = [SearchLine(move, score, self.principal_variation(board, depth))] if move is not None \
+                        else []
+
+                if lines:
+                    self.lines = lines
+                    best_move, best_score = lines[0].move, lines[0].score
+                    self.completed_depth = depth
+                    if info_callback is not None:
+                        for rank, line in enumerate(lines, 1):
+                            info_callback({
+                                'depth': depth,
+                                'seldepth': self.seldepth,
+                                'multipv': rank,
+                                'score': line.score,
+                                'mate': mate_in(line.score),
+                                'move': line.move,
+                                'pv': line.pv,
+                                'nodes': self.nodes,
+                                'time': time.perf_counter() - search_start,
+                            })
+                if self.persistent_tt:
+                    self.transposition_table.flush()
+
+                # a mate within the full width part of the search is the shortest one, searching deeper can't
+                # change the result. the same goes for a position without moves
+                if all(abs(line.score) > MATE_SCORE and MATE - abs(line.score) <= depth for line in lines):
+                    break
+        except SearchAborted:
+            # the search was interrupted somewhere down the tree, undo the moves it made
+            while len(board.move_stack) > stack_size:
+                board.pop()
+                self.evaluator.pop()
+            if best_move is None:
+                best_move = self.root_best_move
+            if best_move is None:
+                # not even one root move was searched, any legal move is better than none
+                best_move = next(iter(board.legal_moves), None)
+            if not self.lines and best_move is not None:
+                self.lines = [SearchLine(best_move, best_score, [best_move])]
+        finally:
+            self.stop_time = None
+            self.node_limit = None
         if debug:
             end = time.perf_counter()
             elapsed = end - start
             print(elapsed)
+            print(f"eval cache: {self.eval_cache.stats()}")
 
         return best_move, best_score
     
@@ -338,26 +823,27 @@ class Agent:
             alpha: float,
             beta: float,
             maximizing_player: bool,
-            quiescence: bool = True
+            quiescence: bool = True,
+            ply: int = 0,
            ) -> tuple[float, chess.Move | None, list[chess.Move]]:
 
         if depth == 0 or board.is_game_over():
             if quiescence:
-                return self.quiescence_minimax(board, depth, 0, alpha, beta, maximizing_player), None, []
+                return self.quiescence_minimax(board, ply, 0, alpha, beta, maximizing_player), None, []
 
-            return self.evaluator.evaluate(board, depth), None, []
+            return self.evaluator.evaluate(board, ply), None, []
 
         best_move = None
         best_line: list[chess.Move] = []
         legal_moves = list(board.legal_moves)
 
-        sorted_moves = self.score_moves(board, legal_moves, depth, maximizing_player)
+        sorted_moves = self.score_moves(board, legal_moves, depth)
 
         if maximizing_player:
             max_score = float('-inf')
             for move in sorted_moves:
                 board.push(move)
-                score, _, line = self.alpha_beta_with_trace(board, depth - 1, alpha, beta, False, quiescence)
+                score, _, line = self.alpha_beta_with_trace(board, depth - 1, alpha, beta, False, quiescence, ply + 1)
                 board.pop()
 
                 if score > max_score:
@@ -371,9 +857,9 @@ class Agent:
             return max_score, best_move, best_line
         else:
             min_score = float('inf')
-            for move in legal_moves:
+            for move in sorted_moves:
                 board.push(move)
-                score, _, line = self.alpha_beta_with_trace(board, depth - 1, alpha, beta, True, quiescence)
+                score, _, line = self.alpha_beta_with_trace(board, depth - 1, alpha, beta, True, quiescence, ply + 1)
                 board.pop()
 
                 if score < min_score:
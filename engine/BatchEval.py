@@ -0,0 +1,155 @@
+import chess
+import numpy as np
+
+from engine import consts
+from engine.weights import WEIGHTS
+
+# positions are encoded as 12 piece-square planes, white pawn to white king followed by black pawn to
+# black king. plane index = color_index * 6 + piece_type - 1, square index as in python-chess (a1 = 0).
+PLANES = 12
+
+
+def plane_index(piece_type: chess.PieceType, color: chess.Color) -> int:
+    return (0 if color == chess.WHITE else 6) + piece_type - 1
+
+
+def encode_bitboards(boards: list[chess.Board]) -> np.ndarray:
+    # (N, 12) array of uint64 bitboards
+    bitboards = np.empty((len(boards), PLANES), dtype=np.uint64)
+    for i, board in enumerate(boards):
+        for color in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                bitboards[i, plane_index(piece_type, color)] = board.pieces_mask(piece_type, color)
+    return bitboards
+
+
+def bitboards_to_planes(bitboards: np.ndarray) -> np.ndarray:
+    # (N, 12) uint64 -> (N, 12, 64) uint8
+    as_bytes = bitboards.astype('<u8').view(np.uint8).reshape(len(bitboards), PLANES, 8)
+    return np.unpackbits(as_bytes, axis=-1, bitorder='little')
+
+
+def encode_boards(boards: list[chess.Board]) -> np.ndarray:
+    return bitboards_to_planes(encode_bitboards(boards))
+
+
+def _piece_square_tables(tables: dict[chess.PieceType, list[int]]) -> np.ndarray:
+    # (12, 64) table, the black planes use the mirrored square like Eval does
+    result = np.empty((PLANES, 64), dtype=np.int64)
+    for piece_type in chess.PIECE_TYPES:
+        table = np.array(tables[piece_type], dtype=np.int64)
+        result[plane_index(piece_type, chess.WHITE)] = table
+        result[plane_index(piece_type, chess.BLACK)] = table[np.arange(64) ^ 56]
+    return result
+
+
+class BatchEval:
+    # vectorized version of the material, PeSTO, pawn structure and rook file terms of engine/Eval.py,
+    # for scoring many positions at once in offline analysis and tuning.
+    # with integer weights the results are identical to the scalar terms.
+    def __init__(self, engine_color: chess.Color = chess.WHITE, weights: dict[str, float] | None = None):
+        self.engine_color = engine_color
+        self.weights = weights if weights is not None else WEIGHTS
+        self.total_phase = consts.TOTAL_PHASE_WEIGHT
+
+        own = 0 if engine_color == chess.WHITE else 6
+        self.signs = np.array([1 if own <= i < own + 6 else -1 for i in range(PLANES)], dtype=np.int64)
+
+        piece_scores = [consts.piece_scores[piece_type] for piece_type in chess.PIECE_TYPES] * 2
+        self.piece_scores = np.array(piece_scores, dtype=np.int64)
+        self.phase_weights = np.array([consts.PHASE_WEIGHT[piece_type] for piece_type in chess.PIECE_TYPES] * 2,
+                                      dtype=np.int64)
+        self.mg_tables = _piece_square_tables(consts.MG_TABLES) * self.signs[:, None]
+        self.eg_tables = _piece_square_tables(consts.EG_TABLES) * self.signs[:, None]
+
+    def evaluate(self, planes: np.ndarray) -> np.ndarray:
+        # planes: (N, 12, 64), see encode_boards
+        planes = planes.astype(np.int64, copy=False)
+        return self.evaluate_material(planes) + \
+            self.evaluate_board(planes) + \
+            self.evaluate_pawn_structure(planes) + \
+            self.evaluate_rook_files(planes)
+
+    def evaluate_material(self, planes: np.ndarray) -> np.ndarray:
+        planes = planes.astype(np.int64, copy=False)
+        counts = planes.sum(axis=2)
+        return counts @ (self.piece_scores * self.signs)
+
+    def evaluate_board(self, planes: np.ndarray) -> np.ndarray:
+        # ref https://www.chessprogramming.org/PeSTO%27s_Evaluation_Function
+        planes = planes.astype(np.int64, copy=False)
+        counts = planes.sum(axis=2)
+        material_score = counts @ (self.piece_scores * self.signs)
+        mg_score = np.einsum('npq,pq->n', planes, self.mg_tables)
+        eg_score = np.einsum('npq,pq->n', planes, self.eg_tables)
+        phase = np.minimum(counts @ self.phase_weights, self.total_phase)
+
+        # same order of operations as Eval.evaluate_board
+        pst_scale = self.weights['pst_scale']
+        score = (phase * mg_score * pst_scale + (24 - phase) * eg_score * pst_scale) / self.total_phase
+        return score + material_score
+
+    def _pawn_files(self, planes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # (N, 8 ranks, 8 files) pawn boards for white and black
+        white = planes[:, plane_index(chess.PAWN, chess.WHITE)].reshape(-1, 8, 8)
+        black = planes[:, plane_index(chess.PAWN, chess.BLACK)].reshape(-1, 8, 8)
+        return white, black
+
+    @staticmethod
+    def _neighbour_files(values: np.ndarray, fill: int, reduce) -> np.ndarray:
+        # reduce over the file itself and the two adjacent files
+        padded = np.pad(values, ((0, 0), (1, 1)), constant_values=fill)
+        return reduce(reduce(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+
+    def evaluate_pawn_structure(self, planes: np.ndarray) -> np.ndarray:
+        planes = planes.astype(np.int64, copy=False)
+        white, black = self._pawn_files(planes)
+        ranks = np.arange(8)[None, :, None]
+
+        white_counts = white.sum(axis=1)
+        black_counts = black.sum(axis=1)
+        white_files = white_counts > 0
+        black_files = black_counts > 0
+
+        doubled = (white_counts.sum(axis=1) - white_files.sum(axis=1)) - \
+            (black_counts.sum(axis=1) - black_files.sum(axis=1))
+
+        def isolated(files):
+            padded = np.pad(files, ((0, 0), (1, 1)))
+            return (files & ~padded[:, :-2] & ~padded[:, 2:]).sum(axis=1)
+
+        isolated_ = isolated(white_files) - isolated(black_files)
+
+        # a white pawn is passed when no black pawn on the same or adjacent files is on a higher rank,
+        # a black pawn when no white pawn on the same or adjacent files is on a lower rank
+        black_max_rank = np.where(black > 0, ranks, -1).max(axis=1)
+        white_min_rank = np.where(white > 0, ranks, 8).min(axis=1)
+        black_front = self._neighbour_files(black_max_rank, -1, np.maximum)
+        white_front = self._neighbour_files(white_min_rank, 8, np.minimum)
+        white_passed = ((white > 0) & (black_front[:, None, :] <= ranks)).sum(axis=(1, 2))
+        black_passed = ((black > 0) & (white_front[:, None, :] >= ranks)).sum(axis=(1, 2))
+        passed = white_passed - black_passed
+
+        # everything above is from white's point of view
+        sign = 1 if self.engine_color == chess.WHITE else -1
+        return sign * (-doubled * self.weights['doubled_pawn']
+                       - isolated_ * self.weights['isolated_pawn']
+                       + passed * self.weights['passed_pawn'])
+
+    def evaluate_rook_files(self, planes: np.ndarray) -> np.ndarray:
+        planes = planes.astype(np.int64, copy=False)
+        white, black = self._pawn_files(planes)
+        white_counts = white.sum(axis=1)
+        black_counts = black.sum(axis=1)
+        white_rooks = planes[:, plane_index(chess.ROOK, chess.WHITE)].reshape(-1, 8, 8).sum(axis=1)
+        black_rooks = planes[:, plane_index(chess.ROOK, chess.BLACK)].reshape(-1, 8, 8).sum(axis=1)
+
+        open_files = (white_counts == 0) & (black_counts == 0)
+        white_semi_open = (white_counts == 0) & (black_counts > 0)
+        black_semi_open = (black_counts == 0) & (white_counts > 0)
+
+        open_ = ((white_rooks - black_rooks) * open_files).sum(axis=1)
+        semi_open = (white_rooks * white_semi_open).sum(axis=1) - (black_rooks * black_semi_open).sum(axis=1)
+
+        sign = 1 if self.engine_color == chess.WHITE else -1
+        return sign * (open_ * self.weights['rook_open_file'] + semi_open * self.weights['rook_semi_open_file'])
@@ -1,11 +1,20 @@
 import chess
-from engine import consts
+from engine import attacks, consts, kernels
+from engine.weights import WEIGHTS
+from engine.EvalCache import EvalCache, EARLY_GAME_SALT
+from engine.NodeStatus import NodeStatus
 
 
 class Eval:
-    def __init__(self, engine_color: chess.Color = chess.WHITE, board: chess.Board | None = None):
+    def __init__(self, engine_color: chess.Color = chess.WHITE, board: chess.Board | None = None,
+                 cache: EvalCache | None = None, weights: dict[str, float] | None = None, contempt: int = 0):
         self.piece_scores = consts.piece_scores
         self.engine_color = engine_color
+        # ref https://www.chessprogramming.org/Contempt_Factor
+        # a positive contempt makes the engine avoid draws, draws are scored as slightly lost for it
+        self.draw_score = -contempt
+        self.cache = cache
+        self.weights = weights if weights is not None else WEIGHTS
         self.mg_tables = consts.MG_TABLES
         self.eg_tables = consts.EG_TABLES
         self.phase_weights = consts.PHASE_WEIGHT
@@ -15,7 +24,10 @@ class Eval:
             self.piece_map = board.piece_map()
             self.white_pawns = board.pieces(chess.PAWN, chess.WHITE)
             self.black_pawns = board.pieces(chess.PAWN, chess.BLACK)
+            # piece bitboards for the compiled kernels, see engine/kernels.py
+            self.masks = kernels.board_masks(board) if kernels.ENABLED else None
         else:
+            self.masks = None
             self.white_pawns: chess.SquareSet | None = None
             self.black_pawns: chess.SquareSet | None = None
             self.piece_map: dict[chess.Square, chess.Piece] | None = None
@@ -23,23 +35,47 @@ class Eval:
     def evaluate_(self, board: chess.Board):
         return 0
 
-    def evaluate(self, board: chess.Board, depth: int) -> float:
+    def evaluate(self, board: chess.Board, ply: int, key: int | None = None, status: NodeStatus | None = None) \
+            -> float:
+        # key is the zobrist hash of the position, when given the static part of the evaluation is cached.
+        # status is the node status already computed by the search, it saves regenerating the legal moves.
         side_to_evaluate = self.engine_color
+        if status is None:
+            status = NodeStatus(board)
 
-        if board.is_checkmate():
+        if status.checkmate:
             # if it is the engine's turn, and it is checkmate, it means the engine has lost
             # give priority to mates that appear earlier in the search
-            return -consts.MATE_SCORE + depth if board.turn == side_to_evaluate \
-                else consts.MATE_SCORE + depth
+            return -(consts.MATE - ply) if board.turn == side_to_evaluate else consts.MATE - ply
 
-        if board.is_game_over():
+        if status.is_game_over:
             # if the game is over and there is no checkmate then it must be a draw
-            return 0
+            return self.draw_score
+
+        if key is None or self.cache is None:
+            return self.evaluate_static(board)
+
+        if board.fullmove_number <= 16:
+            key ^= EARLY_GAME_SALT
+
+        score = self.cache.probe(key)
+        if score is None:
+            score = self.evaluate_static(board)
+            self.cache.store(key, score)
+        return score
+
+    def push(self, board: chess.Board):
+        # nothing is updated incrementally
+        pass
 
+    def pop(self):
+        pass
+
+    def evaluate_static(self, board: chess.Board) -> float:
         score = 0
         subclasses = Eval.__subclasses__()
         for sub in subclasses:
-            eval_ = sub(self.engine_color, board)
+            eval_ = sub(self.engine_color, board, weights=self.weights)
             score += eval_.evaluate_(board)
 
         return score
@@ -64,9 +100,9 @@ class EvalRooks(Eval):
             for rook_square in board.pieces(chess.ROOK, color_):
                 file = chess.square_file(rook_square)
                 if pawn_files[file]['white'] == 0 and pawn_files[file]['black'] == 0:
-                    score += 20 * sign  # open
+                    score += self.weights['rook_open_file'] * sign  # open
                 elif pawn_files[file][chess.COLOR_NAMES[color_]] == 0:
-                    score += 10 * sign  # semi open
+                    score += self.weights['rook_semi_open_file'] * sign  # semi open
 
         return score
 
@@ -90,10 +126,10 @@ class EvalPieces(Eval):
         center_squares = [chess.D4, chess.D5, chess.E4, chess.E5]
         score = 0
         for square in center_squares:
-            attackers = board.attackers(self.engine_color, square)
-            defenders = board.attackers(not self.engine_color, square)
-            score += len(attackers) - len(defenders)
-        return score * 5
+            attackers = attacks.attackers_mask(board, self.engine_color, square)
+            defenders = attacks.attackers_mask(board, not self.engine_color, square)
+            score += attackers.bit_count() - defenders.bit_count()
+        return score * self.weights['center_control']
 
     def evaluate_development(self, board: chess.Board) -> int:
         # evaluates knights, bishops, rooks
@@ -111,7 +147,7 @@ class EvalPieces(Eval):
             for sq in undeveloped_squares[color_]:
                 piece = board.piece_at(sq)
                 if piece and piece.piece_type in [chess.BISHOP, chess.KNIGHT]:
-                    score -= 20 * sign
+                    score -= self.weights['undeveloped_minor'] * sign
 
         bad_rook_squares = {
             chess.WHITE: {chess.B1, chess.G1},
@@ -123,7 +159,7 @@ class EvalPieces(Eval):
             for sq in bad_rook_squares[color_]:
                 piece = board.piece_at(sq)
                 if piece and piece.piece_type == chess.ROOK:
-                    score -= 30 * sign
+                    score -= self.weights['undeveloped_rook'] * sign
 
         return score
 
@@ -136,26 +172,35 @@ class EvalPieces(Eval):
 
     def evaluate_board(self) -> float:
         # ref https://www.chessprogramming.org/PeSTO%27s_Evaluation_Function
-        mg_score = 0
-        eg_score = 0
-        material_score = 0
-        phase = 0
+        if self.masks is not None:
+            mg_score, eg_score, material_score, phase = kernels.pst_sums(
+                self.masks, kernels.MG_TABLES, kernels.EG_TABLES, kernels.PIECE_VALUES, kernels.PHASE_WEIGHTS)
+            if self.engine_color == chess.BLACK:
+                mg_score, eg_score, material_score = -mg_score, -eg_score, -material_score
+        else:
+            mg_score = 0
+            eg_score = 0
+            material_score = 0
+            phase = 0
 
-        for square, piece in self.piece_map.items():
-            piece_type = piece.piece_type
-            piece_color = piece.color
+            for square, piece in self.piece_map.items():
+                piece_type = piece.piece_type
+                piece_color = piece.color
 
-            index = square if piece_color == chess.WHITE else chess.square_mirror(square)
-            sign = 1 if piece_color == self.engine_color else -1
-            material_score += sign * self.piece_scores[piece_type]
+                index = square if piece_color == chess.WHITE else chess.square_mirror(square)
+                sign = 1 if piece_color == self.engine_color else -1
+                material_score += sign * self.piece_scores[piece_type]
 
-            mg_score += sign * self.mg_tables[piece_type][index] * 0.2
-            eg_score += sign * self.eg_tables[piece_type][index] * 0.2
+                mg_score += sign * self.mg_tables[piece_type][index]
+                eg_score += sign * self.eg_tables[piece_type][index]
 
-            phase += self.phase_weights[piece_type]
+                phase += self.phase_weights[piece_type]
 
+        # the table sums are kept as integers and scaled once, this keeps the result independent of the
+        # order of the pieces
+        pst_scale = self.weights['pst_scale']
         phase = min(phase, self.total_phase)
-        score = ((phase * mg_score + (24 - phase) * eg_score) / self.total_phase)
+        score = ((phase * mg_score * pst_scale + (24 - phase) * eg_score * pst_scale) / self.total_phase)
         total_score = score + material_score
         return total_score
 
@@ -232,11 +277,19 @@ class EvalPawns(Eval):
                         is_passed = False
                         break
             if is_passed:
-                score += 30 * sign
+                score += self.weights['passed_pawn'] * sign
 
         return score
 
     def evaluate_pawn_structure(self) -> int:
+        if self.masks is not None:
+            doubled_white, doubled_black, isolated_white, isolated_black, passed_white, passed_black = \
+                kernels.pawn_counts(int(self.white_pawns), int(self.black_pawns))
+            score = (doubled_black - doubled_white) * self.weights['doubled_pawn'] \
+                + (isolated_black - isolated_white) * self.weights['isolated_pawn'] \
+                + (passed_white - passed_black) * self.weights['passed_pawn']
+            return score if self.engine_color == chess.WHITE else -score
+
         score = 0
         if self.engine_color == chess.WHITE:
             pawns = self.white_pawns
@@ -252,16 +305,16 @@ class EvalPawns(Eval):
         opp_files_set = set(opp_files)
 
         # doubled pawns
-        score -= (len(pawns) - len(files_set)) * 20
-        score += (len(opp_pawns) - len(opp_files_set)) * 20
+        score -= (len(pawns) - len(files_set)) * self.weights['doubled_pawn']
+        score += (len(opp_pawns) - len(opp_files_set)) * self.weights['doubled_pawn']
 
         # isolated pawn
         for file in files_set:
             if (file - 1) not in files_set and (file + 1) not in files_set:
-                score -= 15
+                score -= self.weights['isolated_pawn']
         for file in opp_files_set:
             if (file - 1) not in opp_files_set and (file + 1) not in opp_files_set:
-                score += 15
+                score += self.weights['isolated_pawn']
 
         score += self._passed_pawn_for_color(pawns, opp_pawns, self.engine_color)
         score += self._passed_pawn_for_color(opp_pawns, pawns, not self.engine_color)
@@ -289,18 +342,18 @@ class EvalPawns(Eval):
                 rank = chess.square_rank(square)
                 if file in important_files:
                     if rank == second_rank:
-                        score -= 15 * sign
+                        score -= self.weights['center_pawn_unmoved'] * sign
                     elif rank == third_rank:
-                        score += 10 * sign
+                        score += self.weights['center_pawn_third_rank'] * sign
                     elif rank == fourth_rank:
-                        score += 20 * sign
+                        score += self.weights['center_pawn_fourth_rank'] * sign
                 elif file in less_important_files:
                     if rank == second_rank:
-                        score -= 5 * sign
+                        score -= self.weights['flank_pawn_unmoved'] * sign
                     elif rank == third_rank:
-                        score += 5 * sign
+                        score += self.weights['flank_pawn_third_rank'] * sign
                     elif rank == fourth_rank:
-                        score += 10 * sign
+                        score += self.weights['flank_pawn_fourth_rank'] * sign
         return score
 
 
@@ -347,10 +400,10 @@ class EvalKing(Eval):
         king_rank = chess.square_rank(king)
 
         if self._king_has_pawn_shield(board, color) and king_rank == (0 if color == chess.WHITE else 7):
-            return 50
+            return self.weights['king_pawn_shield']
 
         if not board.has_castling_rights(color):
-            return -75
+            return -self.weights['king_no_castling']
 
         return 0
     def evaluate_king_safety(self, board: chess.Board) -> int:
@@ -359,3 +412,56 @@ class EvalKing(Eval):
 
         return engine_ks_score - opp_ks_score
 
+
+class EvalMobility(Eval):
+    def evaluate_(self, board: chess.Board):
+        return self.evaluate_mobility(board)
+
+    def mobility_counts(self, board: chess.Board) -> tuple[int, int]:
+        # white minus black safe mobility (in MOBILITY_UNITS) and attacks on the squares around the enemy king.
+        # the squares come from the pseudo-legal attacks of every knight, bishop, rook and queen, without the
+        # squares of own pieces and the squares enemy pawns attack. no moves are generated or made
+        if self.masks is not None:
+            return kernels.mobility(self.masks, kernels.MOBILITY_UNITS, kernels.KNIGHT_ATTACKS, kernels.KING_ATTACKS)
+
+        occupied = board.occupied
+        units = consts.MOBILITY_UNITS
+        mobility, king_zone = 0, 0
+        for color in chess.COLORS:
+            own = board.occupied_co[color]
+            area = ~(own | attacks.pawn_attacks_mask(board.pawns & board.occupied_co[not color], not color))
+            enemy_king = board.king(not color)
+            zone = attacks.KING_ATTACKS[enemy_king] | chess.BB_SQUARES[enemy_king] if enemy_king is not None else 0
+            color_mobility, color_zone = 0, 0
+            for square in chess.scan_forward(board.knights & own):
+                targets = attacks.KNIGHT_ATTACKS[square]
+                color_mobility += (targets & area).bit_count() * units[chess.KNIGHT]
+                color_zone += (targets & zone).bit_count()
+            for square in chess.scan_forward(board.bishops & own):
+                targets = attacks.bishop_attacks(square, occupied)
+                color_mobility += (targets & area).bit_count() * units[chess.BISHOP]
+                color_zone += (targets & zone).bit_count()
+            for square in chess.scan_forward(board.rooks & own):
+                targets = attacks.rook_attacks(square, occupied)
+                color_mobility += (targets & area).bit_count() * units[chess.ROOK]
+                color_zone += (targets & zone).bit_count()
+            for square in chess.scan_forward(board.queens & own):
+                targets = attacks.queen_attacks(square, occupied)
+                color_mobility += (targets & area).bit_count() * units[chess.QUEEN]
+                color_zone += (targets & zone).bit_count()
+            sign = 1 if color == chess.WHITE else -1
+            mobility += sign * color_mobility
+            king_zone += sign * color_zone
+        return mobility, king_zone
+
+    def evaluate_mobility(self, board: chess.Board) -> float:
+        # tapered like the piece square tables: mobility is worth more in the endgame, king attacks only count
+        # while there is material on the board
+        mobility, king_zone = self.mobility_counts(board)
+        phase = min(board.knights.bit_count() * self.phase_weights[chess.KNIGHT]
+                    + board.bishops.bit_count() * self.phase_weights[chess.BISHOP]
+                    + board.rooks.bit_count() * self.phase_weights[chess.ROOK]
+                    + board.queens.bit_count() * self.phase_weights[chess.QUEEN], self.total_phase)
+        score = ((phase * self.weights['mobility_mg'] + (self.total_phase - phase) * self.weights['mobility_eg'])
+                 * mobility + phase * self.weights['king_zone_attack'] * king_zone) / self.total_phase
+        return score if self.engine_color == chess.WHITE else -score
@@ -0,0 +1,65 @@
+DEFAULT_EVAL_CACHE_BITS = 16
+
+# the development terms in the evaluation are only active up to move 16, so the same position can have
+# two different static evaluations. the key is salted with this value while those terms still apply.
+EARLY_GAME_SALT = 0x9E3779B97F4A7C15
+
+
+class EvalCache:
+    # ref https://www.chessprogramming.org/Evaluation_Hash_Table
+    # fixed size table indexed by the low bits of the zobrist key, the full key is stored next to the
+    # value to detect collisions. a newer entry always replaces an older one in the same slot.
+    # only static evaluations are stored; mate and draw scores depend on the distance from the root
+    # and are never cached.
+    def __init__(self, size_bits: int = DEFAULT_EVAL_CACHE_BITS):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.keys: list[int | None] = [None] * self.size
+        self.values: list[float] = [0] * self.size
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def probe(self, key: int) -> float | None:
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.values[index]
+        return None
+
+    def store(self, key: int, value: float):
+        index = key & self.mask
+        stored_key = self.keys[index]
+        if stored_key is not None and stored_key != key:
+            self.replacements += 1
+        self.keys[index] = key
+        self.values[index] = value
+        self.stores += 1
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.values = [0] * self.size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'size': self.size,
+            'probes': self.probes,
+            'hits': self.hits,
+            'stores': self.stores,
+            'replacements': self.replacements,
+            'hit_rate': self.hit_rate,
+        }
@@ -0,0 +1,180 @@
+import os
+import zlib
+
+import chess
+import numpy as np
+
+from engine import consts
+from engine.EvalCache import EvalCache
+from engine.NodeStatus import NodeStatus
+
+# ref https://www.chessprogramming.org/NNUE
+# small efficiently updatable network: 768 inputs (piece type and color x square) seen from each side's
+# perspective, a shared first layer into an accumulator of HIDDEN values per perspective, clipped relu and one
+# output from the side to move's accumulator followed by the opponent's.
+#
+# perspective index 0 is white's view, 1 is black's view. a feature is (own/their piece type, square), black's view
+# mirrors the board vertically, so both perspectives see their own pieces in planes 0-5 from their own side.
+#
+# the weights are quantized: the first layer by QA into int16, the output layer by QB, the output bias by QA * QB.
+# the accumulator is int16, the output is summed in int32 and scaled back to centipawns by OUTPUT_SCALE.
+
+NNUE_VERSION = 1
+NNUE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nnue.npz')
+
+FEATURES = 768
+QA = 255
+QB = 64
+OUTPUT_SCALE = 400
+
+PIECE_SLOTS = [(piece_type, color) for color in [chess.WHITE, chess.BLACK] for piece_type in chess.PIECE_TYPES]
+
+
+def feature_index(piece_type: chess.PieceType, color: chess.Color, square: chess.Square,
+                  perspective: chess.Color) -> int:
+    own = 0 if color == perspective else 6
+    if perspective == chess.BLACK:
+        square ^= 56
+    return (own + piece_type - 1) * 64 + square
+
+
+def active_features(board: chess.Board) -> tuple[list[int], list[int]]:
+    # feature indices of every piece from white's and from black's perspective
+    white, black = [], []
+    for square, piece in board.piece_map().items():
+        white.append(feature_index(piece.piece_type, piece.color, square, chess.WHITE))
+        black.append(feature_index(piece.piece_type, piece.color, square, chess.BLACK))
+    return white, black
+
+
+def piece_masks(board: chess.Board) -> tuple[int, ...]:
+    # the 12 piece bitboards in PIECE_SLOTS order, they identify the position the accumulator belongs to
+    black, white = board.occupied_co  # indexed by color, chess.BLACK is 0
+    return (board.pawns & white, board.knights & white, board.bishops & white,
+            board.rooks & white, board.queens & white, board.kings & white,
+            board.pawns & black, board.knights & black, board.bishops & black,
+            board.rooks & black, board.queens & black, board.kings & black)
+
+
+def load_network(path: str | None = None) -> dict[str, np.ndarray]:
+    path = path or os.environ.get('FICHESS_NNUE', NNUE_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path}: no network, train one with python3 -m tuning.nnue_train")
+    with np.load(path) as data:
+        network = {name: data[name] for name in data.files}
+    if int(network.get('version', -1)) != NNUE_VERSION:
+        raise ValueError(f"{path}: network version {network.get('version')} is not {NNUE_VERSION}")
+    hidden = network['feature_bias'].shape[0]
+    if network['feature_weights'].shape != (FEATURES, hidden) or network['output_weights'].shape != (2 * hidden,):
+        raise ValueError(f"{path}: network layers don't fit together")
+    return network
+
+
+def save_network(path: str, feature_weights: np.ndarray, feature_bias: np.ndarray, output_weights: np.ndarray,
+                 output_bias: int, meta: dict | None = None):
+    np.savez(path, version=NNUE_VERSION,
+             feature_weights=feature_weights.astype(np.int16), feature_bias=feature_bias.astype(np.int16),
+             output_weights=output_weights.astype(np.int16), output_bias=np.int32(output_bias),
+             **{f"meta_{name}": value for name, value in (meta or {}).items()})
+
+
+class EvalNNUE:
+    # plugs into the agent like Eval: evaluate(board, ply, key, status) for the search, evaluate_static(board).
+    # the agent calls push(board) after every move it makes and pop() after taking it back. the accumulators of
+    # the positions on the search path are kept on a stack, a new one is the previous one plus the weights of the
+    # pieces that appeared and minus those of the pieces that left, found by comparing the piece bitboards.
+    # a position that doesn't match the top of the stack (a new root, a board changed outside the search) gets
+    # its accumulator computed from scratch.
+    def __init__(self, engine_color: chess.Color = chess.WHITE, cache: EvalCache | None = None, contempt: int = 0,
+                 network: dict[str, np.ndarray] | None = None):
+        self.piece_scores = consts.piece_scores
+        self.engine_color = engine_color
+        self.cache = cache
+        self.draw_score = -contempt
+
+        network = network if network is not None else load_network()
+        self.feature_weights = network['feature_weights'].astype(np.int16)
+        self.feature_bias = network['feature_bias'].astype(np.int16)
+        output_weights = network['output_weights'].astype(np.int32)
+        self.hidden = self.feature_bias.shape[0]
+        self.output_own = output_weights[:self.hidden]
+        self.output_their = output_weights[self.hidden:]
+        self.output_bias = int(network['output_bias'])
+        self.network_id = zlib.crc32(self.feature_weights.tobytes() + output_weights.tobytes())
+
+        # (piece masks, accumulator) of the positions on the search path, the accumulator is (2, hidden) int16
+        self.stack: list[tuple[tuple[int, ...], np.ndarray]] = []
+
+    def refresh(self, board: chess.Board) -> np.ndarray:
+        white, black = active_features(board)
+        accumulator = np.empty((2, self.hidden), dtype=np.int16)
+        accumulator[0] = self.feature_bias + self.feature_weights[white].sum(axis=0, dtype=np.int16)
+        accumulator[1] = self.feature_bias + self.feature_weights[black].sum(axis=0, dtype=np.int16)
+        return accumulator
+
+    def update(self, accumulator: np.ndarray, old_masks: tuple[int, ...], new_masks: tuple[int, ...]) -> np.ndarray:
+        accumulator = accumulator.copy()
+        weights = self.feature_weights
+        for (piece_type, color), old, new in zip(PIECE_SLOTS, old_masks, new_masks):
+            if old == new:
+                continue
+            for square in chess.scan_forward(new & ~old):
+                accumulator[0] += weights[feature_index(piece_type, color, square, chess.WHITE)]
+                accumulator[1] += weights[feature_index(piece_type, color, square, chess.BLACK)]
+            for square in chess.scan_forward(old & ~new):
+                accumulator[0] -= weights[feature_index(piece_type, color, square, chess.WHITE)]
+                accumulator[1] -= weights[feature_index(piece_type, color, square, chess.BLACK)]
+        return accumulator
+
+    def accumulator(self, board: chess.Board) -> np.ndarray:
+        masks = piece_masks(board)
+        if self.stack and self.stack[-1][0] == masks:
+            return self.stack[-1][1]
+        accumulator = self.refresh(board)
+        self.stack = [(masks, accumulator)]
+        return accumulator
+
+    def push(self, board: chess.Board):
+        # board already has the new move on it
+        masks = piece_masks(board)
+        if not self.stack:
+            self.stack.append((masks, self.refresh(board)))
+            return
+        old_masks, accumulator = self.stack[-1]
+        self.stack.append((masks, self.update(accumulator, old_masks, masks)))
+
+    def pop(self):
+        # the bottom entry stays, it is the root of the next search more often than not
+        if len(self.stack) > 1:
+            self.stack.pop()
+
+    def forward(self, accumulator: np.ndarray, turn: chess.Color) -> int:
+        # score in centipawns from the side to move's point of view
+        hidden = np.clip(accumulator, 0, QA)
+        own, their = (hidden[0], hidden[1]) if turn == chess.WHITE else (hidden[1], hidden[0])
+        output = int(own @ self.output_own) + int(their @ self.output_their) + self.output_bias
+        return output * OUTPUT_SCALE // (QA * QB)
+
+    def evaluate_static(self, board: chess.Board) -> float:
+        score = self.forward(self.accumulator(board), board.turn)
+        return score if board.turn == self.engine_color else -score
+
+    def evaluate(self, board: chess.Board, ply: int, key: int | None = None, status: NodeStatus | None = None) \
+            -> float:
+        if status is None:
+            status = NodeStatus(board)
+
+        if status.checkmate:
+            return -(consts.MATE - ply) if board.turn == self.engine_color else consts.MATE - ply
+
+        if status.is_game_over:
+            return self.draw_score
+
+        if key is None or self.cache is None:
+            return self.evaluate_static(board)
+
+        score = self.cache.probe(key)
+        if score is None:
+            score = self.evaluate_static(board)
+            self.cache.store(key, score)
+        return score
@@ -1,8 +1,8 @@
-import time
-
 import chess
 
 from engine import consts
+from engine.EvalCache import EvalCache, EARLY_GAME_SALT
+from engine.NodeStatus import NodeStatus
 
 
 class EvalHelper:
@@ -64,9 +64,11 @@ class EvalHelper:
 
 
 class EvalOld:
-    def __init__(self, engine_color: chess.Color = chess.WHITE):
+    def __init__(self, engine_color: chess.Color = chess.WHITE, cache: EvalCache | None = None, contempt: int = 0):
         # self.max_depth = 3
         self.engine_color = engine_color
+        self.draw_score = -contempt
+        self.cache = cache
         self.mg_tables = consts.MG_TABLES
         self.eg_tables = consts.EG_TABLES
         self.phase_weights = consts.PHASE_WEIGHT
@@ -74,19 +76,6 @@ class EvalOld:
         self.piece_scores = consts.piece_scores
         self.helper = EvalHelper()
 
-        self.eval_ps = 0
-        self.eval_board = 0
-        self.eval_dev = 0
-        self.eval_king = 0
-        self.eval_pd = 0
-        self.eval_lm = 0
-        self.eval_cc = 0
-        self.eval_rf = 0
-        self.eval_pww = 0
-        self.total = 0
-
-        self.counter = 0
-
     def evaluate_rook_files(self, board: chess.Board, color: chess.Color, white_pawns: chess.SquareSet,
                             black_pawns: chess.SquareSet) -> int:
         # open file is when there are no pawns on the file
@@ -351,54 +340,58 @@ class EvalOld:
 
         return score
 
-    def evaluate(self, board: chess.Board, depth: int) -> float:
+    def evaluate(self, board: chess.Board, ply: int, key: int | None = None, status: NodeStatus | None = None) \
+            -> float:
         side_to_evaluate = self.engine_color
+        if status is None:
+            status = NodeStatus(board)
 
-        if board.is_checkmate():
+        if status.checkmate:
             # if it is the engine's turn and it is checkmate, it means the engine has lost
             # give priority to mates that appear earlier in the search
-            return -consts.MATE_SCORE + depth if board.turn == side_to_evaluate \
-                else consts.MATE_SCORE + depth
+            return -(consts.MATE - ply) if board.turn == side_to_evaluate else consts.MATE - ply
 
-        if board.is_game_over():
+        if status.is_game_over:
             # if the game is over and there is no checkmate then it must be a draw
-            return 0
+            return self.draw_score
+
+        if key is None or self.cache is None:
+            return self.evaluate_static(board)
+
+        # the board term is only used after move 10 and the development terms until move 16
+        if board.fullmove_number <= 10:
+            key ^= EARLY_GAME_SALT >> 1
+        elif board.fullmove_number <= 16:
+            key ^= EARLY_GAME_SALT
 
+        score = self.cache.probe(key)
+        if score is None:
+            score = self.evaluate_static(board)
+            self.cache.store(key, score)
+        return score
+
+    def push(self, board: chess.Board):
+        pass
+
+    def pop(self):
+        pass
+
+    def evaluate_static(self, board: chess.Board) -> float:
+        side_to_evaluate = self.engine_color
         piece_map = board.piece_map()
         white_pawns = board.pieces(chess.PAWN, chess.WHITE)
         black_pawns = board.pieces(chess.PAWN, chess.BLACK)
 
-        # TODO: lol
-
-        off_start = time.perf_counter()
+        # the time spent in each term can be measured with engine/Profiler.py
         e = self.evaluate_board(piece_map, side_to_evaluate) if board.fullmove_number > 10 else self.evaluate_material(
             piece_map, side_to_evaluate)
-        end = time.perf_counter()
-        self.eval_board += end - off_start
         c = self.evaluate_pawn_structure(side_to_evaluate, white_pawns, black_pawns)
-        start = time.perf_counter()
-        self.eval_ps += start - end
         d = self.evaluate_development(board, side_to_evaluate)
-        end = time.perf_counter()
-        self.eval_dev += end - start
         k = self.evaluate_king_safety(board, side_to_evaluate)
-        start = time.perf_counter()
-        self.eval_king += start - end
         p = self.evaluate_pawn_development(board, side_to_evaluate, white_pawns, black_pawns)
-        end = time.perf_counter()
-        self.eval_pd += end - start
-        start = time.perf_counter()
-        self.eval_lm += start - end
         cc = self.evaluate_center_control(board, side_to_evaluate)
-        end = time.perf_counter()
-        self.eval_cc += end - start
         r = self.evaluate_rook_files(board, side_to_evaluate, white_pawns, black_pawns)
-        start = time.perf_counter()
-        self.eval_rf += start - end
         w = self.evaluate_progress_when_winning(board, piece_map, side_to_evaluate)
-        end = time.perf_counter()
-        self.eval_pww += end - start
-        self.total += end - off_start
         score = e + c + d + k + p + cc + r + w
 
         return score
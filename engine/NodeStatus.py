@@ -0,0 +1,68 @@
+import chess
+
+
+def count_repetitions(key: int, key_history: list[int], halfmove_clock: int) -> int:
+    # ref https://www.chessprogramming.org/Repetitions
+    # key_history holds the zobrist keys of all earlier positions, the most recent one last.
+    # only positions since the last capture or pawn move can repeat, and only every second ply
+    # has the same side to move, so the scan is short.
+    count = 1
+    end = max(len(key_history) - halfmove_clock - 1, -1)
+    for i in range(len(key_history) - 2, end, -2):
+        if key_history[i] == key:
+            count += 1
+    return count
+
+
+def is_repetition(key: int, key_history: list[int], halfmove_clock: int, search_start: int) -> bool:
+    # draw by repetition inside the search. the first repetition of a position from the search path is already a
+    # draw, the side that repeated could have played something else there. positions from before the search
+    # (key_history[:search_start]) need two earlier occurrences, as for a threefold claim
+    seen = 0
+    end = max(len(key_history) - halfmove_clock - 1, -1)
+    for i in range(len(key_history) - 2, end, -2):
+        if key_history[i] == key:
+            if i >= search_start:
+                return True
+            seen += 1
+            if seen >= 2:
+                return True
+    return False
+
+
+class NodeStatus:
+    # terminal state of a node, computed once and shared between the search and the evaluation
+    # instead of calling board.is_game_over() and board.is_checkmate() several times per node.
+    # legal moves are generated only once here and reused by the search.
+    __slots__ = ('in_check', 'legal_moves', 'insufficient_material', 'halfmove_clock', 'repetitions')
+
+    def __init__(self, board: chess.Board, key: int | None = None, key_history: list[int] | None = None):
+        self.in_check = board.is_check()
+        self.legal_moves = list(board.generate_legal_moves())
+        self.insufficient_material = board.is_insufficient_material()
+        self.halfmove_clock = board.halfmove_clock
+        if key is not None and key_history is not None:
+            self.repetitions = count_repetitions(key, key_history, board.halfmove_clock)
+        else:
+            self.repetitions = 1
+
+    @property
+    def checkmate(self) -> bool:
+        return self.in_check and not self.legal_moves
+
+    @property
+    def stalemate(self) -> bool:
+        return not self.in_check and not self.legal_moves
+
+    @property
+    def fifty_moves(self) -> bool:
+        return self.halfmove_clock >= 100
+
+    @property
+    def is_game_over(self) -> bool:
+        # same rules as board.is_game_over() without claiming a draw:
+        # fivefold repetition and the seventy-five move rule end the game automatically
+        return not self.legal_moves \
+            or self.insufficient_material \
+            or self.halfmove_clock >= 150 \
+            or self.repetitions >= 5
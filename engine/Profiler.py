@@ -0,0 +1,164 @@
+import functools
+import time
+from collections import defaultdict
+
+import chess
+
+from engine import attacks
+from engine.Agent import Agent
+from engine.Eval import Eval
+from engine.EvalOld import EvalOld
+from engine.NodeStatus import NodeStatus
+
+# opt-in profiling of the search and the evaluation.
+# nothing in the engine knows about the profiler, while it is enabled the profiled methods are replaced on their
+# classes by timing wrappers and put back when it is disabled, so a disabled profiler costs nothing.
+# every wrapped call records its count, its own time (without profiled callees) and the stack of profiled
+# functions it was called from, which is written as collapsed stacks for flamegraph.pl / speedscope.
+# the profiler keeps one stack, so only profile one search at a time. the wrappers are installed process wide,
+# chess.Board.push and pop included, so any other thread that uses python-chess meanwhile is profiled too and its
+# time ends up in the same stacks.
+# the agent's node count and transposition table counters (tt_probes, tt_hits, tt_stores) are kept on every search,
+# also with the profiler disabled.
+
+
+def default_targets() -> list[tuple[str, object, str]]:
+    # (name, class or module, method name)
+    targets = [
+        ('search.root', Agent, 'find_best_move'),  # iterative deepening, multipv and pv lookups
+        ('search', Agent, 'alpha_beta'),
+        ('quiescence', Agent, 'quiescence_minimax'),
+        ('movegen', NodeStatus, '__init__'),
+        ('movegen.push', chess.Board, 'push'),
+        ('movegen.pop', chess.Board, 'pop'),
+        ('movegen.gives_check', attacks, 'gives_check'),
+        ('ordering', Agent, 'score_moves'),
+        ('see', Agent, 'see_capture'),
+        ('tt.hash', Agent, 'zobrist_hash'),
+        ('tt.probe', Agent, 'tt_probe'),
+        ('tt.store', Agent, 'tt_store'),
+        ('eval', Eval, 'evaluate'),
+        ('eval.static', Eval, 'evaluate_static'),
+        ('eval', EvalOld, 'evaluate'),
+        ('eval.static', EvalOld, 'evaluate_static'),
+    ]
+    # every evaluation term
+    for sub in Eval.__subclasses__():
+        targets.append((f'eval.{sub.__name__}', sub, 'evaluate_'))
+        targets += [(f'eval.{name}', sub, name) for name in vars(sub)
+                    if name.startswith('evaluate_') and name != 'evaluate_']
+    targets += [(f'eval.{name}', EvalOld, name) for name in vars(EvalOld)
+                if name.startswith('evaluate_') and name != 'evaluate_static']
+    return targets
+
+
+class FunctionStats:
+    __slots__ = ('calls', 'self_time', 'total_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.self_time = 0.0
+        self.total_time = 0.0  # only counted for the outermost call of recursive functions
+
+
+class Profiler:
+    def __init__(self, targets: list[tuple[str, object, str]] | None = None):
+        self.targets = targets if targets is not None else default_targets()
+        self.stats: dict[str, FunctionStats] = defaultdict(FunctionStats)
+        self.stacks: dict[tuple[str, ...], float] = defaultdict(float)
+        self.originals: list[tuple[object, str, object]] = []
+        self.enabled = False
+
+        # stack of the profiled calls in progress. recursive calls are folded into one frame
+        self.frames: list[str] = []
+        self.child_times: list[float] = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def enable(self):
+        if self.enabled:
+            return
+        for name, owner, attr in self.targets:
+            original = owner.__dict__.get(attr)
+            if original is None:
+                continue
+            if isinstance(original, staticmethod):
+                wrapper = staticmethod(self._wrap(name, original.__func__))
+            else:
+                wrapper = self._wrap(name, original)
+            self.originals.append((owner, attr, original))
+            setattr(owner, attr, wrapper)
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for owner, attr, original in reversed(self.originals):
+            setattr(owner, attr, original)
+        self.originals = []
+        self.enabled = False
+
+    def reset(self):
+        self.stats.clear()
+        self.stacks.clear()
+
+    def _wrap(self, name: str, func):
+        frames = self.frames
+        child_times = self.child_times
+        stats = self.stats
+        stacks = self.stacks
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recursive = name in frames
+            pushed = not frames or frames[-1] != name
+            if pushed:
+                frames.append(name)
+            child_times.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self_time = elapsed - child_times.pop()
+                stacks[tuple(frames)] += self_time
+                if pushed:
+                    frames.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+
+                entry = stats[name]
+                entry.calls += 1
+                entry.self_time += self_time
+                if not recursive:
+                    entry.total_time += elapsed
+
+        return wrapper
+
+    def report(self) -> list[dict]:
+        # functions ranked by their own time
+        total = sum(entry.self_time for entry in self.stats.values()) or 1.0
+        rows = [{
+            'name': name,
+            'calls': entry.calls,
+            'self': entry.self_time,
+            'total': entry.total_time,
+            'share': entry.self_time / total,
+            'per_call_us': entry.self_time / entry.calls * 1e6 if entry.calls else 0.0,
+        } for name, entry in self.stats.items()]
+        rows.sort(key=lambda row: row['self'], reverse=True)
+        return rows
+
+    def collapsed_stacks(self) -> list[str]:
+        # one line per stack, "search;quiescence;eval.static 1234", the value is in microseconds
+        return [f"{';'.join(stack)} {round(self_time * 1e6)}"
+                for stack, self_time in sorted(self.stacks.items()) if round(self_time * 1e6) > 0]
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.collapsed_stacks()) + '\n')
@@ -0,0 +1,189 @@
+import sqlite3
+from collections import namedtuple
+from collections.abc import Iterable
+
+import chess
+
+from engine.Agent import Agent, MAX_SEARCH_DEPTH, mate_in
+from engine.consts import MAX_PLY, MATE
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+# score from the point of view of the side to move, like uci. depth is the last completed depth and nodes the
+# nodes the search used
+AnalysisResult = namedtuple('AnalysisResult', ['best_move', 'score', 'pv', 'depth', 'nodes'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    epd TEXT NOT NULL,
+    config TEXT NOT NULL,
+    best_move TEXT NOT NULL,
+    score REAL NOT NULL,
+    pv TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    nodes INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (epd, config)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+class ResultStore:
+    # finished analyses in an sqlite database, so positions that are asked for again (openings, puzzles) are
+    # answered without searching. a position is keyed by its epd (the fen without the move counters) and the
+    # search configuration, e.g. the evaluator. the game history isn't part of the key, so repetition draws
+    # aren't told apart.
+    # only the deepest result of a position is kept. it answers every request for the same or a smaller depth,
+    # and node limited requests when it used at least as many nodes.
+    # the store holds at most max_entries positions, the least recently used ones are evicted first.
+    def __init__(self, path: str = ':memory:', max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.max_entries = max_entries
+        self.entries, last_used = self.connection.execute("SELECT COUNT(*), MAX(last_used) FROM results").fetchone()
+        self.clock = last_used or 0  # counts the uses, the least recently used entries have the lowest values
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, board: chess.Board, depth: int | None = None, nodes: int | None = None, config: str = 'eval') \
+            -> AnalysisResult | None:
+        epd = board.epd()
+        row = self.connection.execute(
+            "SELECT best_move, score, pv, depth, nodes FROM results WHERE epd = ? AND config = ?",
+            (epd, config)).fetchone()
+        if row is None or (depth is not None and row[3] < depth) or (nodes is not None and row[4] < nodes):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        with self.connection:
+            self.connection.execute("UPDATE results SET last_used = ? WHERE epd = ? AND config = ?",
+                                    (self.clock, epd, config))
+        best_move, score, pv, stored_depth, stored_nodes = row
+        pv = [chess.Move.from_uci(move) for move in pv.split()]
+        return AnalysisResult(chess.Move.from_uci(best_move), score, pv, stored_depth, stored_nodes)
+
+    def put(self, board: chess.Board, result: AnalysisResult, config: str = 'eval'):
+        with self.connection:
+            self._store([(board.epd(), result)], config)
+
+    def _store(self, results: list[tuple[str, AnalysisResult]], config: str) -> int:
+        # keeps the deeper of the stored and the new result, must run inside a transaction
+        stored = 0
+        for epd, result in results:
+            row = self.connection.execute("SELECT depth, nodes FROM results WHERE epd = ? AND config = ?",
+                                          (epd, config)).fetchone()
+            if row is not None and (row[0], row[1]) >= (result.depth, result.nodes):
+                continue
+            self.clock += 1
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (epd, config, result.best_move.uci(), result.score, " ".join(move.uci() for move in result.pv),
+                 result.depth, result.nodes, self.clock))
+            self.entries += row is None
+            stored += 1
+        self.stores += stored
+        self._evict()
+        return stored
+
+    def _evict(self):
+        excess = self.entries - self.max_entries
+        if excess <= 0:
+            return
+        self.connection.execute(
+            "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)", (excess,))
+        self.entries -= excess
+        self.evictions += excess
+
+    def analyse(self, board: chess.Board, depth: int | None = None, nodes: int | None = None,
+                evaluator: str = 'eval') -> AnalysisResult:
+        # the stored result when there is one that is good enough, otherwise searches and stores the result.
+        # without a node limit the search goes to depth, or MAX_SEARCH_DEPTH when neither is given
+        result = self.get(board, depth, nodes, evaluator)
+        if result is not None:
+            return result
+        agent = Agent(engine_color=board.turn, evaluator=evaluator)
+        max_depth = depth if depth is not None else MAX_PLY // 2 if nodes is not None else MAX_SEARCH_DEPTH
+        move, score = agent.find_best_move(board.copy(), max_depth, node_limit=nodes)
+        pv = agent.principal_variation(board, max(agent.completed_depth, 1))
+        if not pv or pv[0] != move:
+            pv = [move]
+        result = AnalysisResult(move, score, pv, agent.completed_depth, agent.nodes)
+        if move is not None:
+            self.put(board, result, evaluator)
+        return result
+
+    def import_epd(self, lines: Iterable[str], config: str = 'eval') -> tuple[int, int]:
+        # bulk import of batch analysis output in epd, one transaction for all of it. a line needs the best move
+        # (bm or pv), the depth (acd) and the score (ce or dm), the nodes are read from acn.
+        # returns the number of stored results and of skipped lines, malformed ones and those missing something
+        results = []
+        skipped = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                board, ops = chess.Board.from_epd(line)
+                pv = list(ops.get('pv', []))
+                best_move = ops['bm'][0] if ops.get('bm') else pv[0] if pv else None
+                if best_move is None or 'acd' not in ops or ('ce' not in ops and 'dm' not in ops):
+                    skipped += 1
+                    continue
+                if 'dm' in ops:
+                    mate = int(ops['dm'])
+                    score = MATE - (2 * mate - 1) if mate > 0 else -(MATE + 2 * mate)
+                else:
+                    score = float(ops['ce'])
+                results.append((board.epd(), AnalysisResult(best_move, score, pv or [best_move], int(ops['acd']),
+                                                            int(ops.get('acn', 0)))))
+            except (ValueError, TypeError, IndexError):
+                skipped += 1
+        with self.connection:
+            return self._store(results, config), skipped
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+        self.entries = 0
+        self.reset_stats()
+
+    def close(self):
+        self.connection.close()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'entries': self.entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+
+def format_epd(board: chess.Board, result: AnalysisResult) -> str:
+    # the line import_epd reads back
+    ops = {'bm': [result.best_move], 'acd': result.depth, 'acn': result.nodes, 'pv': result.pv}
+    mate = mate_in(result.score)
+    if mate is not None:
+        ops['dm'] = mate
+    else:
+        ops['ce'] = round(result.score)
+    return board.epd(**ops)
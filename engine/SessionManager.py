@@ -0,0 +1,133 @@
+import heapq
+import time
+from collections import OrderedDict
+
+import chess
+
+from engine.Agent import Agent, MAX_SEARCH_DEPTH, SearchLine
+
+SESSION_TT_ENTRIES = 20_000  # a session's transposition table is trimmed to its deepest entries above this
+TOTAL_TT_ENTRIES = 1_000_000  # above this the idle sessions lose their search state, least recently used first
+SESSION_EVAL_CACHE_BITS = 12
+MAX_SESSIONS = 10_000
+
+
+class GameSession:
+    # one game against the engine. the zobrist keys, piece square tables and attack tables are module level and
+    # shared by every session, a session only owns the search state of its game: the agent with its
+    # transposition table, eval cache, killers and history. the agent is created on the first search and
+    # dropped again when the session is evicted, the next search then starts cold.
+    def __init__(self, session_id: str, engine_color: chess.Color, evaluator: str = 'eval'):
+        self.session_id = session_id
+        self.engine_color = engine_color
+        self.evaluator = evaluator
+        self.agent: Agent | None = None
+        self.searching = False
+        self.searches = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def tt_entries(self) -> int:
+        return len(self.agent.transposition_table) if self.agent is not None else 0
+
+    def get_agent(self) -> Agent:
+        if self.agent is None:
+            self.agent = Agent(engine_color=self.engine_color, evaluator=self.evaluator,
+                               eval_cache_bits=SESSION_EVAL_CACHE_BITS)
+        return self.agent
+
+    def trim(self, max_entries: int):
+        # keeps the deepest half, they saved the most work and the shallow ones are quickly searched again
+        table = self.agent.transposition_table if self.agent is not None else {}
+        if len(table) > max_entries:
+            kept = heapq.nlargest(max_entries // 2, table.items(), key=lambda item: item[1].depth)
+            table.clear()
+            table.update(kept)
+
+    def release(self):
+        self.agent = None
+
+
+class SessionManager:
+    # many concurrent games in one process. every game gets a session with its own search state, so games don't
+    # share killers or history and a search of one game can't see another game's half finished state. the
+    # memory is capped per session (the transposition table is trimmed after every search) and overall: when
+    # all transposition tables together pass total_tt_entries, the least recently used idle sessions lose their
+    # agent. past max_sessions the least recently used sessions are closed.
+    def __init__(self, max_sessions: int = MAX_SESSIONS, session_tt_entries: int = SESSION_TT_ENTRIES,
+                 total_tt_entries: int = TOTAL_TT_ENTRIES):
+        self.max_sessions = max_sessions
+        self.session_tt_entries = session_tt_entries
+        self.total_tt_entries = total_tt_entries
+        self.sessions: OrderedDict[str, GameSession] = OrderedDict()  # least recently used first
+        self.tt_entries = 0  # of all sessions, as of the end of their last search
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def open(self, session_id: str, engine_color: chess.Color, evaluator: str = 'eval') -> GameSession:
+        # returns the session, a new one if the id is unknown or the game changed its engine color or evaluator
+        session = self.sessions.get(session_id)
+        if session is not None and (session.engine_color, session.evaluator) != (engine_color, evaluator):
+            self.close(session_id)
+            session = None
+        if session is None:
+            session = self.sessions[session_id] = GameSession(session_id, engine_color, evaluator)
+            while len(self.sessions) > self.max_sessions:
+                oldest = next(iter(self.sessions))
+                if self.sessions[oldest].searching:
+                    break
+                self.close(oldest)
+        self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            if not session.searching:  # a search takes its table out of the count until it ends
+                self.tt_entries -= session.tt_entries
+            session.release()
+
+    def search(self, session_id: str, board: chess.Board, engine_color: chess.Color | None = None,
+               evaluator: str = 'eval', multipv: int = 1, max_depth: int = MAX_SEARCH_DEPTH,
+               time_limit: float | None = None, node_limit: int | None = None) -> tuple[GameSession, list[SearchLine]]:
+        # the board holds the game's moves, for repetition detection. the engine plays the side to move unless
+        # engine_color says otherwise, scores are from the engine's side like the agent's
+        session = self.open(session_id, board.turn if engine_color is None else engine_color, evaluator)
+        self.tt_entries -= session.tt_entries
+        session.searching = True
+        try:
+            lines = session.get_agent().find_best_lines(board, multipv, max_depth, time_limit=time_limit,
+                                                        node_limit=node_limit)
+        finally:
+            session.searching = False
+            session.searches += 1
+            session.last_used = time.monotonic()
+            session.trim(self.session_tt_entries)
+            if self.sessions.get(session_id) is session:  # unless it was closed meanwhile
+                self.tt_entries += session.tt_entries
+            self.evict()
+        return session, lines
+
+    def evict(self):
+        for session in self.sessions.values():
+            if self.tt_entries <= self.total_tt_entries:
+                return
+            if session.agent is None or session.searching:
+                continue
+            self.tt_entries -= session.tt_entries
+            session.release()
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'sessions': len(self.sessions),
+            'active': sum(session.agent is not None for session in self.sessions.values()),
+            'tt_entries': self.tt_entries,
+            'evictions': self.evictions,
+        }
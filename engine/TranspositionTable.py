@@ -0,0 +1,119 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+from enum import Enum
+
+import chess
+
+
+class NodeType(Enum):
+    EXACT = 1
+    LOWER_BOUND = 2
+    UPPER_BOUND = 3
+
+TTEntry = namedtuple('TTEntry', ['value', 'depth', 'flag', 'best_move'])
+
+DEFAULT_TT_BITS = 20
+
+TT_MAGIC = b'FTTB'
+TT_VERSION = 1
+# magic, version, entry size, size bits, fingerprint
+HEADER = struct.Struct('<4sHHB3xQ')
+HEADER_SIZE = 64
+# key, value, depth, flag, best move. flag 0 is an empty slot
+ENTRY = struct.Struct('<QdhBHxxx')
+NO_MOVE = 0xFFFF
+
+
+def encode_move(move: chess.Move | None) -> int:
+    if move is None:
+        return NO_MOVE
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code: int) -> chess.Move | None:
+    if code == NO_MOVE:
+        return None
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+class TranspositionTable:
+    # ref https://www.chessprogramming.org/Transposition_Table
+    # transposition table in a memory mapped file, used in place of the dict the agent keeps in memory so a long
+    # analysis survives the process. probing reads the slot straight from the mapping, nothing is parsed when
+    # the file is opened, and flush() only writes the pages that changed since the last one.
+    # like the eval cache the slot is chosen by the low bits of the key and the full key is kept to verify
+    # the entry. a slot holding another position is only replaced by an entry searched at least as deep.
+    # the header records the format and a fingerprint of the zobrist keys and the evaluation, a file written
+    # by a different version or configuration is rejected with a ValueError instead of returning wrong scores.
+    # scores are stored from the engine's side like in the search. the evaluation isn't symmetric between the
+    # colors (contempt, the winning bonus), so the engine color is part of the fingerprint.
+    def __init__(self, path: str, fingerprint: int, size_bits: int = DEFAULT_TT_BITS):
+        self.path = path
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        try:
+            if exists:
+                size_bits = self._check_header(fingerprint)
+            self.size = 1 << size_bits
+            self.mask = self.size - 1
+            length = HEADER_SIZE + self.size * ENTRY.size
+            if not exists:
+                self.file.truncate(length)
+                self.file.write(HEADER.pack(TT_MAGIC, TT_VERSION, ENTRY.size, size_bits, fingerprint))
+                self.file.flush()
+            elif os.path.getsize(path) != length:
+                raise ValueError(f"{path}: truncated transposition table file")
+            self.map = mmap.mmap(self.file.fileno(), length)
+        except BaseException:
+            self.file.close()
+            raise
+
+    def _check_header(self, fingerprint: int) -> int:
+        data = self.file.read(HEADER.size)
+        if len(data) < HEADER.size:
+            raise ValueError(f"{self.path}: not a transposition table file")
+        magic, version, entry_size, size_bits, stored_fingerprint = HEADER.unpack(data)
+        if magic != TT_MAGIC:
+            raise ValueError(f"{self.path}: not a transposition table file")
+        if version != TT_VERSION or entry_size != ENTRY.size:
+            raise ValueError(f"{self.path}: transposition table version {version}, expected {TT_VERSION}")
+        if stored_fingerprint != fingerprint:
+            raise ValueError(f"{self.path}: transposition table written with different keys or evaluation")
+        return size_bits
+
+    def get(self, key: int) -> TTEntry | None:
+        offset = HEADER_SIZE + (key & self.mask) * ENTRY.size
+        stored_key, value, depth, flag, move = ENTRY.unpack_from(self.map, offset)
+        if flag == 0 or stored_key != key:
+            return None
+        return TTEntry(value, depth, NodeType(flag), decode_move(move))
+
+    def __setitem__(self, key: int, entry: TTEntry):
+        offset = HEADER_SIZE + (key & self.mask) * ENTRY.size
+        stored_key, _, stored_depth, flag, _ = ENTRY.unpack_from(self.map, offset)
+        if flag != 0 and stored_key != key and stored_depth > entry.depth:
+            return
+        ENTRY.pack_into(self.map, offset, key, entry.value, entry.depth, entry.flag.value,
+                        encode_move(entry.best_move))
+
+    def __contains__(self, key: int) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        # used slots, scans the whole table
+        return sum(1 for i in range(self.size) if self.map[HEADER_SIZE + i * ENTRY.size + 18])
+
+    def clear(self):
+        self.map[HEADER_SIZE:] = bytes(self.size * ENTRY.size)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        if not self.map.closed:
+            self.map.flush()
+            self.map.close()
+        self.file.close()
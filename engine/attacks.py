@@ -0,0 +1,247 @@
+import os
+import struct
+import sys
+from array import array
+
+import chess
+
+# precomputed attack tables, all squares sets are bitboards (ints, bit n = square n like python-chess).
+# the tables are generated once and cached in attacks.bin next to this file, later imports only read them back.
+#
+# ref https://www.chessprogramming.org/Magic_Bitboards
+# sliders are looked up by the relevant occupancy bits (the blockers on the ray without the edge squares), like
+# magic bitboards or pext indexing. in python a dict keyed by the masked occupancy is faster than the magic
+# multiply and shift, so each square has its own dict.
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attacks.bin')
+CACHE_MAGIC = b'FATK'
+CACHE_VERSION = 2
+HEADER = struct.Struct('<4sII')  # magic, version, number of entries
+
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+KNIGHT_OFFSETS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_OFFSETS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+def _offset_attacks(square: int, offsets: list[tuple[int, int]]) -> int:
+    attacks = 0
+    file, rank = chess.square_file(square), chess.square_rank(square)
+    for df, dr in offsets:
+        if 0 <= file + df < 8 and 0 <= rank + dr < 8:
+            attacks |= 1 << chess.square(file + df, rank + dr)
+    return attacks
+
+
+def _ray_attacks(square: int, occupied: int, directions: list[tuple[int, int]]) -> int:
+    # walks every ray until it leaves the board or hits a blocker, the blocker is attacked
+    attacks = 0
+    for df, dr in directions:
+        file, rank = chess.square_file(square) + df, chess.square_rank(square) + dr
+        while 0 <= file < 8 and 0 <= rank < 8:
+            bb = 1 << chess.square(file, rank)
+            attacks |= bb
+            if occupied & bb:
+                break
+            file, rank = file + df, rank + dr
+    return attacks
+
+
+def _relevant_mask(square: int, directions: list[tuple[int, int]]) -> int:
+    # the squares whose occupancy changes the attacks, the last square of each ray never does
+    mask = 0
+    for df, dr in directions:
+        file, rank = chess.square_file(square) + df, chess.square_rank(square) + dr
+        while 0 <= file + df < 8 and 0 <= rank + dr < 8:
+            mask |= 1 << chess.square(file, rank)
+            file, rank = file + df, rank + dr
+    return mask
+
+
+def _subsets(mask: int) -> list[int]:
+    # ref https://www.chessprogramming.org/Traversing_Subsets_of_a_Set (carry rippler)
+    subsets = [0]
+    subset = (0 - mask) & mask
+    while subset:
+        subsets.append(subset)
+        subset = (subset - mask) & mask
+    return subsets
+
+
+def _generate() -> array:
+    # every table in one flat array, in the order _unpack reads them back
+    data = array('Q')
+    for square in chess.SQUARES:
+        data.append(_offset_attacks(square, KNIGHT_OFFSETS))
+    for square in chess.SQUARES:
+        data.append(_offset_attacks(square, KING_OFFSETS))
+    for color in [chess.BLACK, chess.WHITE]:
+        direction = 1 if color == chess.WHITE else -1
+        for square in chess.SQUARES:
+            data.append(_offset_attacks(square, [(-1, direction), (1, direction)]))
+
+    for directions in [ROOK_DIRECTIONS, BISHOP_DIRECTIONS]:
+        masks = [_relevant_mask(square, directions) for square in chess.SQUARES]
+        data.extend(masks)
+        for square in chess.SQUARES:
+            # the occupancies are stored too, so loading doesn't have to enumerate them again
+            subsets = _subsets(masks[square])
+            data.extend(subsets)
+            data.extend(_ray_attacks(square, subset, directions) for subset in subsets)
+
+    between, line = [], []
+    for a in chess.SQUARES:
+        for b in chess.SQUARES:
+            between_ab, line_ab = 0, 0
+            for directions in [ROOK_DIRECTIONS, BISHOP_DIRECTIONS]:
+                if a != b and _ray_attacks(a, 0, directions) & (1 << b):
+                    between_ab = _ray_attacks(a, 1 << b, directions) & _ray_attacks(b, 1 << a, directions)
+                    line_ab = (_ray_attacks(a, 0, directions) & _ray_attacks(b, 0, directions)) | (1 << a) | (1 << b)
+            between.append(between_ab)
+            line.append(line_ab)
+    data.extend(between)
+    data.extend(line)
+    data.extend(chess.square_distance(a, b) for a in chess.SQUARES for b in chess.SQUARES)
+    return data
+
+
+def _read_cache(path: str) -> array | None:
+    try:
+        with open(path, 'rb') as f:
+            magic, version, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                return None
+            data = array('Q')
+            data.fromfile(f, count)
+    except (OSError, EOFError, struct.error):
+        return None
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def _write_cache(path: str, data: array):
+    # written to a temporary file first so a half written cache is never read
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(data)))
+            if sys.byteorder == 'big':
+                data = array('Q', data)
+                data.byteswap()
+            data.tofile(f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # a read only install just generates the tables on every import
+        pass
+
+
+def load_tables(path: str = CACHE_PATH) -> array:
+    data = _read_cache(path)
+    if data is None:
+        data = _generate()
+        _write_cache(path, data)
+    return data
+
+
+def _unpack(data: array) -> tuple:
+    values = data.tolist()
+    position = 0
+
+    def take(n: int) -> list[int]:
+        nonlocal position
+        position += n
+        return values[position - n:position]
+
+    knight, king, pawn = take(64), take(64), [take(64), take(64)]
+    slider_tables = []
+    for _ in range(2):
+        masks = take(64)
+        tables = []
+        for square in chess.SQUARES:
+            size = 1 << chess.popcount(masks[square])
+            tables.append(dict(zip(take(size), take(size))))
+        slider_tables.append((masks, tables))
+    between = [take(64) for _ in chess.SQUARES]
+    line = [take(64) for _ in chess.SQUARES]
+    distance = [take(64) for _ in chess.SQUARES]
+    return knight, king, pawn, *slider_tables[0], *slider_tables[1], between, line, distance
+
+
+(KNIGHT_ATTACKS, KING_ATTACKS,
+ PAWN_ATTACKS,  # indexed by the color of the pawn, chess.BLACK = 0
+ ROOK_MASKS, ROOK_TABLE, BISHOP_MASKS, BISHOP_TABLE,
+ BETWEEN,  # squares strictly between two aligned squares
+ LINE,  # the whole line through two aligned squares
+ DISTANCE,  # king moves between two squares
+ ) = _unpack(load_tables())
+
+
+def rook_attacks(square: chess.Square, occupied: int) -> int:
+    return ROOK_TABLE[square][occupied & ROOK_MASKS[square]]
+
+
+def bishop_attacks(square: chess.Square, occupied: int) -> int:
+    return BISHOP_TABLE[square][occupied & BISHOP_MASKS[square]]
+
+
+def queen_attacks(square: chess.Square, occupied: int) -> int:
+    return ROOK_TABLE[square][occupied & ROOK_MASKS[square]] | BISHOP_TABLE[square][occupied & BISHOP_MASKS[square]]
+
+
+def pawn_attacks_mask(pawns: int, color: chess.Color) -> int:
+    # squares attacked by all the pawns of color in the mask at once, pawns never stand on the last rank so the
+    # shifts can't leave the board
+    if color == chess.WHITE:
+        return (pawns & ~chess.BB_FILE_A) << 7 | (pawns & ~chess.BB_FILE_H) << 9
+    return (pawns & ~chess.BB_FILE_A) >> 9 | (pawns & ~chess.BB_FILE_H) >> 7
+
+
+def attackers_mask(board: chess.Board, color: chess.Color, square: chess.Square, occupied: int | None = None) -> int:
+    # pieces of color attacking square, the same as board.attackers_mask.
+    # with a different occupancy (pieces taken off the board in SEE) the sliders see through the missing pieces
+    if occupied is None:
+        occupied = board.occupied
+    queens = board.queens
+    attackers = (KNIGHT_ATTACKS[square] & board.knights) \
+        | (KING_ATTACKS[square] & board.kings) \
+        | (PAWN_ATTACKS[not color][square] & board.pawns) \
+        | (ROOK_TABLE[square][occupied & ROOK_MASKS[square]] & (board.rooks | queens)) \
+        | (BISHOP_TABLE[square][occupied & BISHOP_MASKS[square]] & (board.bishops | queens))
+    return attackers & board.occupied_co[color] & occupied
+
+
+def gives_check(board: chess.Board, move: chess.Move) -> bool:
+    # same as board.gives_check for a legal move, without pushing it: the moved piece attacks the king from its
+    # new square or a slider behind it gets a free line to the king
+    if board.is_castling(move):
+        return board.gives_check(move)
+    king = board.king(not board.turn)
+    if king is None:
+        return False
+    from_bb, to_bb = 1 << move.from_square, 1 << move.to_square
+    occupied = (board.occupied ^ from_bb) | to_bb
+    piece_type = move.promotion or board.piece_type_at(move.from_square)
+    if piece_type == chess.PAWN:
+        if PAWN_ATTACKS[board.turn][move.to_square] & (1 << king):
+            return True
+        if move.to_square == board.ep_square:
+            occupied ^= 1 << (move.to_square - 8 if board.turn == chess.WHITE else move.to_square + 8)
+    elif piece_type == chess.KNIGHT:
+        if KNIGHT_ATTACKS[move.to_square] & (1 << king):
+            return True
+    elif piece_type == chess.BISHOP:
+        if bishop_attacks(move.to_square, occupied) & (1 << king):
+            return True
+    elif piece_type == chess.ROOK:
+        if rook_attacks(move.to_square, occupied) & (1 << king):
+            return True
+    elif piece_type == chess.QUEEN:
+        if queen_attacks(move.to_square, occupied) & (1 << king):
+            return True
+
+    # discovered checks
+    ours = board.occupied_co[board.turn] & ~from_bb
+    queens = board.queens
+    return bool((ROOK_TABLE[king][occupied & ROOK_MASKS[king]] & (board.rooks | queens) & ours)
+                or (BISHOP_TABLE[king][occupied & BISHOP_MASKS[king]] & (board.bishops | queens) & ours))
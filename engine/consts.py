@@ -9,8 +9,45 @@ piece_scores = {
     chess.KING: 20000
 }
 
-# score for a checkmate, used in evaluation
+# score for a checkmate, used in evaluation. scores above MATE_SCORE are mates:
+# a mate n plies from the root of the search scores MATE - n, being mated in n plies -(MATE - n)
 MATE_SCORE = 10000
+MAX_PLY = 128
+MATE = MATE_SCORE + MAX_PLY
+
+# weights of the evaluation terms in engine/Eval.py.
+# these are the hand picked defaults, a tuned weights file (see engine/weights.py) overrides them.
+EVAL_WEIGHTS = {
+    'pst_scale': 0.2,
+    'rook_open_file': 20,
+    'rook_semi_open_file': 10,
+    'doubled_pawn': 20,
+    'isolated_pawn': 15,
+    'passed_pawn': 30,
+    'center_control': 5,
+    'undeveloped_minor': 20,
+    'undeveloped_rook': 30,
+    'center_pawn_unmoved': 15,
+    'center_pawn_third_rank': 10,
+    'center_pawn_fourth_rank': 20,
+    'flank_pawn_unmoved': 5,
+    'flank_pawn_third_rank': 5,
+    'flank_pawn_fourth_rank': 10,
+    'king_pawn_shield': 50,
+    'king_no_castling': 75,
+    'mobility_mg': 1,
+    'mobility_eg': 2,
+    'king_zone_attack': 3,
+}
+
+# ref https://www.chessprogramming.org/Mobility
+# mobility is counted in units per reachable square, a knight or bishop gains more from a free square than a queen
+MOBILITY_UNITS = {
+    chess.KNIGHT: 4,
+    chess.BISHOP: 3,
+    chess.ROOK: 2,
+    chess.QUEEN: 1,
+}
 
 # ref https://www.chessprogramming.org/PeSTO%27s_Evaluation_Function
 MG_TABLES = {
@@ -0,0 +1,293 @@
+import os
+
+import chess
+
+from engine import attacks, consts
+
+# ref https://numba.readthedocs.io/en/stable/user/jit.html
+# compiled versions of the hottest integer loops of the evaluation and the search: the piece square table sums,
+# the pawn file scans, the mobility attack sets, the SEE swap list and the zobrist xors. numba is optional. when it
+# is installed (and FICHESS_NUMBA isn't 0) ENABLED is set and the engine calls these kernels, otherwise it keeps its
+# python code and nothing here imports numpy.
+#
+# the kernels work on the 12 piece bitboards in BatchEval's plane order (white pawn to white king, then black), as
+# int64 so bit 63 doesn't need unsigned arithmetic. they are plain python too, which the tests use to check them
+# against the engine when numba is missing.
+
+try:
+    if os.environ.get('FICHESS_NUMBA', '1') == '0':
+        raise ImportError("disabled with FICHESS_NUMBA=0")
+    import numpy as np
+    from numba import njit
+    ENABLED = True
+except ImportError:
+    ENABLED = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+FILE_A = chess.BB_FILE_A
+FILE_H = chess.BB_FILE_H
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def board_masks(board: chess.Board):
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+    masks = (board.pawns & white, board.knights & white, board.bishops & white,
+             board.rooks & white, board.queens & white, board.kings & white,
+             board.pawns & black, board.knights & black, board.bishops & black,
+             board.rooks & black, board.queens & black, board.kings & black)
+    if ENABLED:
+        return np.array(masks, dtype=np.uint64).view(np.int64)
+    return masks
+
+
+def table(rows):
+    # int64 array of bitboards or zobrist keys for the kernels, or the rows themselves without numba
+    if ENABLED:
+        return np.array(rows, dtype=np.uint64).view(np.int64)
+    return rows
+
+
+def values(rows):
+    # int64 array of scores for the kernels, or the rows themselves without numba
+    if ENABLED:
+        return np.array(rows, dtype=np.int64)
+    return rows
+
+
+@njit(cache=True)
+def pst_sums(masks, mg_tables, eg_tables, piece_values, phase_weights):
+    # white minus black piece square table sums and material, and the game phase.
+    # the tables are indexed [piece type][square from white's side]
+    mg, eg, material, phase = 0, 0, 0, 0
+    for slot in range(12):
+        mask = masks[slot]
+        if mask == 0:
+            continue
+        piece_type = slot % 6 + 1
+        for square in range(64):
+            if (mask >> square) & 1:
+                if slot < 6:
+                    mg += mg_tables[piece_type][square]
+                    eg += eg_tables[piece_type][square]
+                    material += piece_values[piece_type]
+                else:
+                    mg -= mg_tables[piece_type][square ^ 56]
+                    eg -= eg_tables[piece_type][square ^ 56]
+                    material -= piece_values[piece_type]
+                phase += phase_weights[piece_type]
+    return mg, eg, material, phase
+
+
+@njit(cache=True)
+def pawn_counts(white_pawns, black_pawns):
+    # doubled, isolated and passed pawns of white and black, counted like EvalPawns: doubled pawns are the pawns
+    # beyond the first on a file, isolated pawns count once per file, a pawn is passed without enemy pawns ahead
+    # of it on its own or the neighbouring files
+    white_files = [0] * 8
+    black_files = [0] * 8
+    white_count, black_count = 0, 0
+    for square in range(64):
+        if (white_pawns >> square) & 1:
+            white_files[square & 7] += 1
+            white_count += 1
+        if (black_pawns >> square) & 1:
+            black_files[square & 7] += 1
+            black_count += 1
+
+    doubled_white, doubled_black = white_count, black_count
+    isolated_white, isolated_black = 0, 0
+    for file in range(8):
+        left_white = file > 0 and white_files[file - 1] > 0
+        right_white = file < 7 and white_files[file + 1] > 0
+        left_black = file > 0 and black_files[file - 1] > 0
+        right_black = file < 7 and black_files[file + 1] > 0
+        if white_files[file]:
+            doubled_white -= 1
+            if not left_white and not right_white:
+                isolated_white += 1
+        if black_files[file]:
+            doubled_black -= 1
+            if not left_black and not right_black:
+                isolated_black += 1
+
+    passed_white, passed_black = 0, 0
+    for square in range(64):
+        if (white_pawns >> square) & 1:
+            passed = True
+            for other in range(64):
+                if (black_pawns >> other) & 1 and abs((other & 7) - (square & 7)) <= 1 and other >> 3 > square >> 3:
+                    passed = False
+                    break
+            if passed:
+                passed_white += 1
+        if (black_pawns >> square) & 1:
+            passed = True
+            for other in range(64):
+                if (white_pawns >> other) & 1 and abs((other & 7) - (square & 7)) <= 1 and other >> 3 < square >> 3:
+                    passed = False
+                    break
+            if passed:
+                passed_black += 1
+    return doubled_white, doubled_black, isolated_white, isolated_black, passed_white, passed_black
+
+
+@njit(cache=True)
+def _slider_attacks(square, occupied, diagonal):
+    result = 0
+    directions = BISHOP_DIRECTIONS if diagonal else ROOK_DIRECTIONS
+    for df, dr in directions:
+        file, rank = (square & 7) + df, (square >> 3) + dr
+        while 0 <= file < 8 and 0 <= rank < 8:
+            target = rank * 8 + file
+            result |= 1 << target
+            if (occupied >> target) & 1:
+                break
+            file, rank = file + df, rank + dr
+    return result
+
+
+@njit(cache=True)
+def _attackers(masks, color, square, occupied, knight_attacks, king_attacks, pawn_attacks):
+    # pieces of color (1 white, 0 black) attacking square with the given occupancy, like attacks.attackers_mask
+    base = 0 if color == 1 else 6
+    queens = masks[base + 4]
+    result = (knight_attacks[square] & masks[base + 1]) | (king_attacks[square] & masks[base + 5]) \
+        | (pawn_attacks[1 - color][square] & masks[base])
+    rooks = masks[base + 3] | queens
+    if rooks & occupied:
+        result |= _slider_attacks(square, occupied, False) & rooks
+    bishops = masks[base + 2] | queens
+    if bishops & occupied:
+        result |= _slider_attacks(square, occupied, True) & bishops
+    return result & occupied
+
+
+@njit(cache=True)
+def see(masks, from_square, to_square, turn, piece_values, knight_attacks, king_attacks, pawn_attacks):
+    # ref https://www.chessprogramming.org/SEE_-_The_Swap_Algorithm
+    # the swap algorithm of Agent.see_capture for a capture of the piece on to_square, turn is 1 for white
+    occupied = 0
+    victim, mover = 0, 0
+    for slot in range(12):
+        occupied |= masks[slot]
+        if (masks[slot] >> to_square) & 1:
+            victim = slot % 6 + 1
+        if (masks[slot] >> from_square) & 1:
+            mover = slot % 6 + 1
+    if victim == 0:
+        return 0
+
+    occupied ^= 1 << from_square
+    gain = [piece_values[victim]]
+    on_square = piece_values[mover]
+    color = 1 - turn
+    while True:
+        attackers = _attackers(masks, color, to_square, occupied, knight_attacks, king_attacks, pawn_attacks)
+        if attackers == 0:
+            break
+        base = 0 if color == 1 else 6
+        piece_type = 0
+        attacker = 0
+        for index in range(6):
+            attacker = attackers & masks[base + index]
+            if attacker:
+                piece_type = index + 1
+                break
+        if piece_type == 6 and _attackers(masks, 1 - color, to_square, occupied, knight_attacks, king_attacks,
+                                          pawn_attacks):
+            # the king can't recapture on a defended square
+            break
+        gain.append(on_square - gain[-1])
+        on_square = piece_values[piece_type]
+        occupied ^= attacker & -attacker
+        color = 1 - color
+
+    while len(gain) > 1:
+        last = gain.pop()
+        gain[-1] = -max(-gain[-1], last)
+    return gain[0]
+
+
+@njit(cache=True)
+def _popcount(mask):
+    count = 0
+    while mask:
+        mask &= mask - 1
+        count += 1
+    return count
+
+
+@njit(cache=True)
+def mobility(masks, units, knight_attacks, king_attacks):
+    # white minus black safe mobility and king zone attacks of EvalMobility.mobility_counts, units is indexed by
+    # piece type
+    occupied = 0
+    for slot in range(12):
+        occupied |= masks[slot]
+    mobility_score, king_zone = 0, 0
+    for side in range(2):  # 0 white, 1 black, as in the slots
+        base, enemy = 6 * side, 6 - 6 * side
+        own = masks[base] | masks[base + 1] | masks[base + 2] | masks[base + 3] | masks[base + 4] | masks[base + 5]
+        enemy_pawns = masks[enemy]
+        if side == 0:
+            pawn_attacks = ((enemy_pawns & ~FILE_A) >> 9) | ((enemy_pawns & ~FILE_H) >> 7)
+        else:
+            pawn_attacks = ((enemy_pawns & ~FILE_A) << 7) | ((enemy_pawns & ~FILE_H) << 9)
+        area = ~(own | pawn_attacks)
+        zone = 0
+        for square in range(64):
+            if (masks[enemy + 5] >> square) & 1:
+                zone = king_attacks[square] | (1 << square)
+        side_mobility, side_zone = 0, 0
+        for piece_type in range(2, 6):
+            mask = masks[base + piece_type - 1]
+            if mask == 0:
+                continue
+            for square in range(64):
+                if (mask >> square) & 1:
+                    if piece_type == 2:
+                        targets = knight_attacks[square]
+                    elif piece_type == 3:
+                        targets = _slider_attacks(square, occupied, True)
+                    elif piece_type == 4:
+                        targets = _slider_attacks(square, occupied, False)
+                    else:
+                        targets = _slider_attacks(square, occupied, True) | _slider_attacks(square, occupied, False)
+                    side_mobility += _popcount(targets & area) * units[piece_type]
+                    side_zone += _popcount(targets & zone)
+        if side == 0:
+            mobility_score += side_mobility
+            king_zone += side_zone
+        else:
+            mobility_score -= side_mobility
+            king_zone -= side_zone
+    return mobility_score, king_zone
+
+
+@njit(cache=True)
+def zobrist_pieces(masks, keys):
+    # xor of the keys of every piece, keys is indexed [slot][square]. the result is signed with numba, callers
+    # mask it to 64 bits
+    h = 0
+    for slot in range(12):
+        mask = masks[slot]
+        if mask == 0:
+            continue
+        for square in range(64):
+            if (mask >> square) & 1:
+                h ^= keys[slot][square]
+    return h
+
+
+KNIGHT_ATTACKS = table(attacks.KNIGHT_ATTACKS)
+KING_ATTACKS = table(attacks.KING_ATTACKS)
+PAWN_ATTACKS = table(attacks.PAWN_ATTACKS)
+# indexed by piece type, index 0 is unused
+MG_TABLES = values([[0] * 64] + [consts.MG_TABLES[piece_type] for piece_type in chess.PIECE_TYPES])
+EG_TABLES = values([[0] * 64] + [consts.EG_TABLES[piece_type] for piece_type in chess.PIECE_TYPES])
+PHASE_WEIGHTS = values([0] + [consts.PHASE_WEIGHT[piece_type] for piece_type in chess.PIECE_TYPES])
+PIECE_VALUES = values([0] + [consts.piece_scores[piece_type] for piece_type in chess.PIECE_TYPES])
+MOBILITY_UNITS = values([consts.MOBILITY_UNITS.get(piece_type, 0) for piece_type in range(7)])
@@ -0,0 +1,42 @@
+import json
+import os
+
+from engine import consts
+
+# bump when the meaning of the weights changes, older files are then rejected
+WEIGHTS_VERSION = 1
+
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+
+
+def load_weights(path: str | None = None) -> dict[str, float]:
+    # the defaults from consts, overridden by the tuned values in the weights file if there is one
+    path = path or os.environ.get('FICHESS_WEIGHTS', WEIGHTS_FILE)
+    weights = dict(consts.EVAL_WEIGHTS)
+    if not os.path.exists(path):
+        return weights
+
+    with open(path) as f:
+        data = json.load(f)
+
+    if data.get('version') != WEIGHTS_VERSION:
+        raise ValueError(f"{path}: weights version {data.get('version')} is not {WEIGHTS_VERSION}")
+
+    for name, value in data['weights'].items():
+        if name not in weights:
+            raise ValueError(f"{path}: unknown weight '{name}'")
+        weights[name] = value
+    return weights
+
+
+def save_weights(weights: dict[str, float], path: str = WEIGHTS_FILE, meta: dict | None = None):
+    data = {'version': WEIGHTS_VERSION, 'weights': weights}
+    if meta:
+        data['meta'] = meta
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+# loaded once when the engine starts
+WEIGHTS = load_weights()
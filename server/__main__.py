@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+
+from server.app import AnalysisServer
+from server.pool import EnginePool
+
+
+async def serve(args: argparse.Namespace):
+    server = AnalysisServer(EnginePool(args.workers, args.queue), timeout=args.timeout)
+    listener = await server.start(args.host, args.port)
+    print(f"fichess analysis server on http://{args.host}:{args.port} with {server.pool.size} engines", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="http analysis server backed by a pool of engine processes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help="engine processes, one per cpu by default")
+    parser.add_argument('--queue', type=int, default=64, help="requests that may wait for an engine")
+    parser.add_argument('--timeout', type=float, default=30.0, help="default deadline of a request, in seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
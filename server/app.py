@@ -0,0 +1,243 @@
+import asyncio
+import json
+import time
+import traceback
+from urllib.parse import parse_qsl, urlsplit
+
+import chess
+
+from server.metrics import Metrics
+from server.pool import DeadlineExceeded, EnginePool, PoolSaturated, WorkerFailed
+
+# a small http/1.1 server on asyncio streams, one request per connection:
+#   GET/POST /analyse   fen, moves, depth, movetime (ms), nodes, multipv, evaluator, timeout (s)
+#   GET/POST /bestmove  the same, answers only the best move and its score
+#   GET/POST /close     session, ends a game session
+#   GET /metrics        prometheus text
+# a search with a session (any string naming a game) and optionally the engine's color in that game reuses the
+# game's search state, see EnginePool
+# parameters come from the query string, or from a json object in the body of a POST
+
+MAX_BODY = 1 << 16
+MAX_MULTIPV = 16
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+CLIENT_CLOSED = 499  # only counted in the metrics, there is nobody to answer
+
+
+class BadRequest(Exception):
+    pass
+
+
+def format_score(line: dict) -> dict:
+    # the worker's scores are from the side to move
+    if line['mate'] is not None:
+        return {'mate': line['mate']}
+    return {'cp': round(line['score'])}
+
+
+class AnalysisServer:
+    def __init__(self, pool: EnginePool, timeout: float = 30.0):
+        self.pool = pool
+        self.timeout = timeout  # the default deadline of a search request, in seconds
+        self.metrics = Metrics()
+        self.routes = {'/analyse': self.analyse, '/bestmove': self.bestmove, '/close': self.close_session,
+                       '/metrics': self.render_metrics}
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.Server:
+        await self.pool.start()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        path = None
+        try:
+            method, path, params = await self.read_request(reader)
+            if path not in self.routes:
+                status, body = 404, {'error': f"unknown path {path}"}
+            elif method not in ('GET', 'POST') or (path == '/metrics' and method != 'GET'):
+                status, body = 405, {'error': f"{method} isn't allowed on {path}"}
+            else:
+                status, body = await self.routes[path](params, reader)
+        except BadRequest as e:
+            status, body = 400, {'error': str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception:
+            # a bug shouldn't leave the client without an answer
+            traceback.print_exc()
+            status, body = 500, {'error': "internal error"}
+
+        if path in self.routes:
+            self.metrics.request(path, status, time.perf_counter() - start)
+        if status != CLIENT_CLOSED:
+            await self.respond(writer, status, body)
+        writer.close()
+
+    @staticmethod
+    async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict]:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise BadRequest("malformed request line")
+        method, target, _ = request_line
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise BadRequest("content-length isn't a number") from None
+        if length < 0:
+            raise BadRequest("content-length can't be negative")
+        if length > MAX_BODY:
+            raise BadRequest("the body is too large")
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise BadRequest("the body isn't json") from None
+            if not isinstance(body, dict):
+                raise BadRequest("the body must be a json object")
+            params.update(body)
+        return method, url.path, params
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, body: dict | str):
+        if isinstance(body, str):
+            content, content_type = body.encode(), 'text/plain; version=0.0.4'
+        else:
+            content, content_type = json.dumps(body).encode(), 'application/json'
+        headers = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}",
+                   f"Content-Length: {len(content)}", "Connection: close"]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + content)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def parse_job(self, params: dict) -> tuple[dict, float]:
+        def number(name: str, kind, low, high=None):
+            value = params.get(name)
+            if value is None or value == '':
+                return None
+            try:
+                value = kind(value)
+            except (TypeError, ValueError):
+                raise BadRequest(f"{name} must be a number") from None
+            if value < low or (high is not None and value > high):
+                raise BadRequest(f"{name} must be between {low} and {high}" if high else f"{name} must be >= {low}")
+            return value
+
+        # a json body can hold any type, the query string only strings
+        fen = params.get('fen') or chess.STARTING_FEN
+        if not isinstance(fen, str):
+            raise BadRequest("fen must be a string")
+        moves = params.get('moves') or []
+        if isinstance(moves, str):
+            moves = moves.replace(',', ' ').split()
+        if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+            raise BadRequest("moves must be a string or a list of strings")
+        try:
+            board = chess.Board(fen)
+            for move in moves:
+                board.push_uci(move)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise BadRequest(str(e)) from None
+        if not board.is_valid():
+            raise BadRequest(f"illegal position: {fen}")
+
+        from engine.Agent import EVALUATORS  # only here, so the server process doesn't load the engine on start
+        evaluator = params.get('evaluator') or 'eval'
+        if not isinstance(evaluator, str) or evaluator not in EVALUATORS:
+            raise BadRequest(f"unknown evaluator {evaluator}")
+
+        movetime = number('movetime', int, 1)
+        job = {'fen': fen, 'moves': moves, 'depth': number('depth', int, 1, 64), 'nodes': number('nodes', int, 1),
+               'multipv': number('multipv', int, 1, MAX_MULTIPV) or 1,
+               'time_limit': movetime / 1000 if movetime else None,
+               'evaluator': evaluator}
+        if params.get('session'):
+            if not isinstance(params['session'], str):
+                raise BadRequest("session must be a string")
+            if params.get('color') not in (None, '', 'white', 'black'):
+                raise BadRequest("color must be white or black")
+            job['session'] = params['session']
+            job['color'] = params.get('color') or None
+        if job['depth'] is None and job['time_limit'] is None and job['nodes'] is None:
+            job['time_limit'] = 1.0
+        timeout = number('timeout', float, 0.001) or self.timeout
+        return job, asyncio.get_running_loop().time() + timeout
+
+    async def search(self, params: dict, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        job, deadline = self.parse_job(params)
+        search = asyncio.create_task(self.pool.search(job, deadline))
+        # the client doesn't send anything more, so reading returns b'' only when it has closed the connection
+        closed = asyncio.create_task(reader.read(1))
+        try:
+            while True:
+                await asyncio.wait({search, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if search.done():
+                    break
+                if closed.exception() is not None or not closed.result():
+                    search.cancel()
+                    return CLIENT_CLOSED, {}
+                closed = asyncio.create_task(reader.read(1))
+        finally:
+            closed.cancel()
+
+        try:
+            result = search.result()
+        except asyncio.CancelledError:
+            return CLIENT_CLOSED, {}
+        except PoolSaturated:
+            return 503, {'error': "all engines are busy"}
+        except DeadlineExceeded:
+            return 504, {'error': "no engine was free before the deadline"}
+        except WorkerFailed as e:
+            return 500, {'error': str(e)}
+        if 'error' in result:
+            return 400, {'error': result['error']}
+        self.metrics.search(result['nodes'], result['time'])
+        return 200, result
+
+    async def analyse(self, params: dict, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        status, result = await self.search(params, reader)
+        if status != 200:
+            return status, result
+        return 200, {
+            'bestmove': result['bestmove'],
+            'depth': result['depth'],
+            'seldepth': result['seldepth'],
+            'nodes': result['nodes'],
+            'time': round(result['time'], 3),
+            'nps': round(result['nodes'] / result['time']) if result['time'] else 0,
+            'lines': [{'move': line['move'], 'score': format_score(line), 'pv': line['pv']}
+                      for line in result['lines']],
+        }
+
+    async def bestmove(self, params: dict, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        params = dict(params, multipv=1)
+        status, result = await self.search(params, reader)
+        if status != 200:
+            return status, result
+        line = result['lines'][0] if result['lines'] else None
+        return 200, {'bestmove': result['bestmove'], 'score': format_score(line) if line else None,
+                     'ponder': line['pv'][1] if line and len(line['pv']) > 1 else None}
+
+    async def close_session(self, params: dict, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        if not params.get('session'):
+            raise BadRequest("session is missing")
+        if not isinstance(params['session'], str):
+            raise BadRequest("session must be a string")
+        self.pool.close_session(params['session'])
+        return 200, {}
+
+    async def render_metrics(self, params: dict, reader: asyncio.StreamReader) -> tuple[int, str]:
+        return 200, self.metrics.render(self.pool)
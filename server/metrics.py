@@ -0,0 +1,65 @@
+import bisect
+from collections import Counter
+
+# counters for the /metrics endpoint, in the prometheus text format
+# ref https://prometheus.io/docs/instrumenting/exposition_formats/
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        result = []
+        cumulative = 0
+        for bound, count in zip([*self.buckets, '+Inf'], self.counts):
+            cumulative += count
+            result.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        result.append(f'{name}_sum{{{labels}}} {self.sum}')
+        result.append(f'{name}_count{{{labels}}} {self.count}')
+        return result
+
+
+class Metrics:
+    def __init__(self):
+        self.requests: Counter[tuple[str, int]] = Counter()  # (endpoint, status) -> count
+        self.latency: dict[str, Histogram] = {}
+        self.nodes = 0
+        self.search_time = 0.0
+
+    def request(self, endpoint: str, status: int, seconds: float):
+        self.requests[(endpoint, status)] += 1
+        self.latency.setdefault(endpoint, Histogram()).observe(seconds)
+
+    def search(self, nodes: int, seconds: float):
+        self.nodes += nodes
+        self.search_time += seconds
+
+    def render(self, pool) -> str:
+        lines = ['# TYPE fichess_requests_total counter']
+        for (endpoint, status), count in sorted(self.requests.items()):
+            lines.append(f'fichess_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        lines.append('# TYPE fichess_request_seconds histogram')
+        for endpoint, histogram in sorted(self.latency.items()):
+            lines += histogram.lines('fichess_request_seconds', f'endpoint="{endpoint}"')
+        nps = self.nodes / self.search_time if self.search_time else 0.0
+        lines += [
+            '# TYPE fichess_queue_depth gauge', f'fichess_queue_depth {pool.waiting}',
+            '# TYPE fichess_workers gauge', f'fichess_workers {len(pool.workers)}',
+            '# TYPE fichess_workers_busy gauge', f'fichess_workers_busy {pool.busy}',
+            '# TYPE fichess_sessions gauge', f'fichess_sessions {len(pool.affinity)}',
+            '# TYPE fichess_nodes_total counter', f'fichess_nodes_total {self.nodes}',
+            '# TYPE fichess_search_seconds_total counter', f'fichess_search_seconds_total {self.search_time}',
+            '# TYPE fichess_nps gauge', f'fichess_nps {nps:.0f}',
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import json
+import os
+import sys
+from collections import OrderedDict, deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEADLINE_MARGIN = 0.05  # seconds a search ends before its deadline, for sending the answer back
+MAX_AFFINITIES = 100_000  # sessions whose worker is remembered, least recently used ones are forgotten
+
+
+class PoolSaturated(Exception):
+    # every worker is busy and the queue of waiting requests is full
+    pass
+
+
+class DeadlineExceeded(Exception):
+    # no worker became free before the request's deadline
+    pass
+
+
+class WorkerFailed(Exception):
+    # the worker process died during the search, it is replaced
+    pass
+
+
+class EngineProcess:
+    # one python -m server.worker process, messages are json lines (see server/worker.py)
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.searches = 0
+
+    @classmethod
+    async def start(cls) -> 'EngineProcess':
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'server.worker', cwd=ROOT,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=1 << 24)
+        engine = cls(process)
+        message = await engine.receive()
+        if not message.get('ready'):
+            raise WorkerFailed(f"unexpected first message from the worker: {message}")
+        return engine
+
+    def post(self, message: dict):
+        self.process.stdin.write((json.dumps(message) + "\n").encode())
+
+    async def send(self, message: dict):
+        self.post(message)
+        await self.process.stdin.drain()
+
+    async def receive(self) -> dict:
+        line = await self.process.stdout.readline()
+        if not line:
+            raise WorkerFailed(f"worker {self.process.pid} exited with {await self.process.wait()}")
+        return json.loads(line)
+
+    async def result(self, job_id: int) -> dict:
+        while True:
+            message = await self.receive()
+            if message.get('id') == job_id:
+                return message
+
+    async def close(self):
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+
+
+class EnginePool:
+    # a fixed number of warm engine processes shared by all requests. a request waits in a queue for a free
+    # worker until its deadline, at most max_queue requests wait at a time and later ones are refused, so a
+    # saturated server answers at once instead of piling up work. the search itself gets the time that is left
+    # before the deadline. a cancelled request (the client went away) stops its search, the worker goes back
+    # to the pool once it has answered.
+    # searches of a game session (the job's "session") go to the worker that holds the game's search state when
+    # it is free. otherwise any free worker takes the search and the game's state moves there, the old worker is
+    # told to drop it. so thousands of games share the workers while each keeps its transposition table warm.
+    def __init__(self, size: int | None = None, max_queue: int = 64):
+        self.size = size or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.idle: list[EngineProcess] = []
+        self.waiters: deque[tuple[asyncio.Future, str | None]] = deque()
+        self.workers: list[EngineProcess] = []
+        self.affinity: OrderedDict[str, EngineProcess] = OrderedDict()  # session -> worker with its state
+        self.busy = 0
+        self.job_ids = itertools.count(1)
+        self.background: set[asyncio.Task] = set()
+        self.closed = False
+
+    @property
+    def waiting(self) -> int:
+        return len(self.waiters)
+
+    async def start(self):
+        self.workers = list(await asyncio.gather(*(EngineProcess.start() for _ in range(self.size))))
+        self.idle = list(self.workers)
+
+    async def close(self):
+        self.closed = True
+        for task in list(self.background):
+            task.cancel()
+        await asyncio.gather(*(worker.close() for worker in self.workers))
+        self.workers = []
+
+    def close_session(self, session: str):
+        worker = self.affinity.pop(session, None)
+        if worker is not None and worker in self.workers:
+            worker.post({'close': session})
+
+    async def acquire(self, session: str | None, deadline: float) -> EngineProcess:
+        loop = asyncio.get_running_loop()
+        if self.idle and not self.waiters:
+            return self._assign(self._pick(session), session)
+        if len(self.waiters) >= self.max_queue:
+            raise PoolSaturated()
+        future = loop.create_future()
+        waiter = (future, session)
+        timer = loop.call_at(deadline, lambda: future.done() or future.set_exception(DeadlineExceeded()))
+        self.waiters.append(waiter)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(future.result())  # it was handed over as the request was cancelled
+            raise
+        finally:
+            timer.cancel()
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def _pick(self, session: str | None) -> EngineProcess:
+        worker = self.affinity.get(session)
+        if worker in self.idle:
+            self.idle.remove(worker)
+            return worker
+        return self.idle.pop()
+
+    def _assign(self, worker: EngineProcess, session: str | None) -> EngineProcess:
+        self.busy += 1
+        if session is not None:
+            previous = self.affinity.get(session)
+            if previous is not None and previous is not worker and previous in self.workers:
+                previous.post({'close': session})
+            self.affinity[session] = worker
+            self.affinity.move_to_end(session)
+            if len(self.affinity) > MAX_AFFINITIES:
+                self.affinity.popitem(last=False)
+        return worker
+
+    def _release(self, worker: EngineProcess):
+        # a free worker goes to the request that waited longest, or back to the idle ones
+        self.busy -= 1
+        while self.waiters:
+            future, session = self.waiters.popleft()
+            if not future.done():
+                future.set_result(self._assign(worker, session))
+                return
+        self.idle.append(worker)
+
+    async def search(self, job: dict, deadline: float) -> dict:
+        # deadline is in loop.time() seconds. job is a worker message without the id, the time limit is capped
+        # at the deadline
+        loop = asyncio.get_running_loop()
+        worker = await self.acquire(job.get('session'), deadline)
+        job_id = next(self.job_ids)
+        remaining = max(deadline - loop.time() - DEADLINE_MARGIN, 0.001)
+        job = dict(job, id=job_id, time_limit=min(job.get('time_limit') or remaining, remaining))
+        try:
+            await worker.send(job)
+            result = await worker.result(job_id)
+        except asyncio.CancelledError:
+            task = asyncio.create_task(self._stop(worker, job_id))
+            self.background.add(task)
+            task.add_done_callback(self.background.discard)
+            raise
+        except (WorkerFailed, OSError) as e:
+            await self._replace(worker)
+            raise WorkerFailed(str(e)) from e
+        worker.searches += 1
+        self._release(worker)
+        return result
+
+    async def _stop(self, worker: EngineProcess, job_id: int):
+        try:
+            await worker.send({'stop': job_id})
+            await worker.result(job_id)
+        except (WorkerFailed, OSError):
+            await self._replace(worker)
+            return
+        self._release(worker)
+
+    async def _replace(self, worker: EngineProcess):
+        self.busy -= 1
+        await worker.close()
+        if worker in self.workers:
+            self.workers.remove(worker)
+        for session in [session for session, holder in self.affinity.items() if holder is worker]:
+            del self.affinity[session]
+        if self.closed:
+            return
+        replacement = await EngineProcess.start()
+        self.workers.append(replacement)
+        self.busy += 1
+        self._release(replacement)
@@ -0,0 +1,133 @@
+import json
+import queue
+import sys
+import threading
+import time
+
+import chess
+
+from engine.Agent import Agent, MAX_SEARCH_DEPTH, mate_in
+from engine.SessionManager import SessionManager
+from engine.consts import MAX_PLY
+
+# engine process of the analysis server's pool (see server/pool.py), started with python -m server.worker.
+# it reads one json message per line from stdin and answers on stdout:
+#   {"id": 1, "fen": ..., "depth": ..., "time_limit": ..., "nodes": ..., "multipv": ..., "evaluator": ...}
+#       searches and answers {"id": 1, "bestmove": ..., "lines": [...], "depth": ..., "nodes": ..., "time": ...}
+#   {"stop": 1}  ends search 1 early, it still answers with the best result so far
+#   {"close": "game-7"}  drops the search state of a session, there is no answer
+# the agents are kept between searches, so their transposition tables stay warm. their scores are from the
+# engine's side, so there is one agent per evaluator and side to move. a search with a "session" (a game, see
+# engine/SessionManager.py) uses that game's own agent instead, "color" is the engine's side in the game.
+# scores in the answers are from the side to move.
+
+MAX_TT_ENTRIES = 2_000_000  # a worker's transposition table is cleared above this
+
+
+class Worker:
+    def __init__(self):
+        self.agents: dict[tuple[str, chess.Color], Agent] = {}
+        self.sessions = SessionManager()
+        self.jobs: queue.Queue[dict] = queue.Queue()
+        self.lock = threading.Lock()
+        self.current: tuple[int, Agent] | None = None
+        self.stopped: set[int] = set()
+
+    def agent(self, evaluator: str, color: chess.Color) -> Agent:
+        agent = self.agents.get((evaluator, color))
+        if agent is None:
+            agent = self.agents[(evaluator, color)] = Agent(engine_color=color, evaluator=evaluator)
+        if len(agent.transposition_table) > MAX_TT_ENTRIES:
+            agent.transposition_table.clear()
+        return agent
+
+    def read_messages(self):
+        # runs in a thread, so a stop can reach the search while it runs
+        for line in sys.stdin:
+            message = json.loads(line)
+            if 'stop' not in message:  # closes go through the queue too, after the searches sent before them
+                self.jobs.put(message)
+                continue
+            with self.lock:
+                self.stopped.add(message['stop'])
+                if self.current is not None and self.current[0] == message['stop']:
+                    self.current[1].stop()
+        # stdin closed, the server is gone
+        with self.lock:
+            if self.current is not None:
+                self.current[1].stop()
+        self.jobs.put({})
+
+    def search(self, job: dict) -> dict:
+        board = chess.Board(job['fen'])
+        for move in job.get('moves', []):
+            board.push_uci(move)
+        evaluator = job.get('evaluator', 'eval')
+        session_id = job.get('session')
+        if session_id is None:
+            agent = self.agent(evaluator, board.turn)
+        else:
+            color = {'white': chess.WHITE, 'black': chess.BLACK, None: board.turn}[job.get('color')]
+            agent = self.sessions.open(session_id, color, evaluator).get_agent()
+        sign = 1 if agent.evaluator.engine_color == board.turn else -1
+        depth = job.get('depth')
+        if depth is None:
+            depth = MAX_PLY // 2 if job.get('time_limit') is not None or job.get('nodes') is not None \
+                else MAX_SEARCH_DEPTH
+
+        with self.lock:
+            if job['id'] in self.stopped:
+                return {'id': job['id'], 'bestmove': None, 'lines': [], 'depth': 0, 'seldepth': 0, 'nodes': 0,
+                        'time': 0.0}
+            agent.stopped = False  # a stop for this job can come as soon as it is current
+            self.current = (job['id'], agent)
+        start = time.perf_counter()
+        try:
+            if session_id is None:
+                lines = agent.find_best_lines(board, job.get('multipv', 1), depth, time_limit=job.get('time_limit'),
+                                              node_limit=job.get('nodes'))
+            else:
+                _, lines = self.sessions.search(session_id, board, agent.evaluator.engine_color, evaluator,
+                                                job.get('multipv', 1), depth, time_limit=job.get('time_limit'),
+                                                node_limit=job.get('nodes'))
+        finally:
+            with self.lock:
+                self.current = None
+                self.stopped.discard(job['id'])
+        return {
+            'id': job['id'],
+            'bestmove': lines[0].move.uci() if lines else None,
+            'lines': [{'move': line.move.uci(), 'score': sign * line.score, 'mate': mate_in(sign * line.score),
+                       'pv': [move.uci() for move in line.pv]} for line in lines],
+            'depth': agent.completed_depth,
+            'seldepth': agent.seldepth,
+            'nodes': agent.nodes,
+            'time': time.perf_counter() - start,
+        }
+
+    def run(self):
+        threading.Thread(target=self.read_messages, daemon=True).start()
+        # a first search loads and compiles everything before the pool hands out work
+        self.search({'id': -1, 'fen': chess.STARTING_FEN, 'depth': 1})
+        self.send({'ready': True})
+        while True:
+            job = self.jobs.get()
+            if not job:
+                return
+            if 'close' in job:
+                self.sessions.close(job['close'])
+                continue
+            try:
+                result = self.search(job)
+            except (ValueError, KeyError, TypeError) as e:
+                result = {'id': job.get('id'), 'error': str(e)}
+            self.send(result)
+
+    @staticmethod
+    def send(message: dict):
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    Worker().run()
@@ -0,0 +1,14 @@
+import random
+import chess
+
+from tuning.positions import random_playout
+
+
+def random_positions(count: int, seed: int, min_plies: int, max_plies: int,
+                     boards: list[chess.Board] | None = None) -> list[chess.Board]:
+    # the given boards topped up with random playouts, the same ones for the same seed
+    rng = random.Random(seed)
+    boards = list(boards or [])
+    while len(boards) < count:
+        boards.append(random_playout(rng, min_plies, max_plies))
+    return boards
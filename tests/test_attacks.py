@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import chess
+
+from engine import attacks
+from engine.Agent import Agent
+from tests.positions import random_positions
+
+
+class TestAttacks(unittest.TestCase):
+    boards = random_positions(40, 3, 10, 79)
+
+    def test_attackers_match_python_chess(self):
+        for board in self.boards:
+            for square in chess.SQUARES:
+                for color in chess.COLORS:
+                    self.assertEqual(attacks.attackers_mask(board, color, square),
+                                     board.attackers_mask(color, square), f"{board.fen()} {chess.square_name(square)}")
+
+    def test_pawn_attacks_mask(self):
+        for board in self.boards:
+            for color in chess.COLORS:
+                expected = 0
+                for square in board.pieces(chess.PAWN, color):
+                    expected |= attacks.PAWN_ATTACKS[color][square]
+                self.assertEqual(attacks.pawn_attacks_mask(board.pieces_mask(chess.PAWN, color), color), expected,
+                                 board.fen())
+
+    def test_slider_attacks(self):
+        for board in self.boards:
+            for square, piece in board.piece_map().items():
+                if piece.piece_type == chess.ROOK:
+                    expected = attacks.rook_attacks(square, board.occupied)
+                elif piece.piece_type == chess.BISHOP:
+                    expected = attacks.bishop_attacks(square, board.occupied)
+                elif piece.piece_type == chess.QUEEN:
+                    expected = attacks.queen_attacks(square, board.occupied)
+                else:
+                    continue
+                self.assertEqual(expected, board.attacks_mask(square), board.fen())
+
+    def test_gives_check(self):
+        fens = [
+            "4k3/8/8/2KPp2r/8/8/8/8 w - e6 0 2",  # discovered check through en passant
+            "4k3/1P6/8/8/8/8/8/4K3 w - - 0 1",  # promotion checks
+            "4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1",  # castling into a check
+            "4k3/8/8/8/4N3/8/4R3/4K3 w - - 0 1",  # discovered check by the knight
+        ]
+        for board in self.boards + [chess.Board(fen) for fen in fens]:
+            for move in board.legal_moves:
+                self.assertEqual(attacks.gives_check(board, move), board.gives_check(move), f"{board.fen()} {move}")
+
+    def test_between_line_distance(self):
+        for a in chess.SQUARES:
+            for b in chess.SQUARES:
+                self.assertEqual(attacks.BETWEEN[a][b], chess.between(a, b))
+                self.assertEqual(attacks.LINE[a][b], chess.ray(a, b) if a != b else 0)
+                self.assertEqual(attacks.DISTANCE[a][b], chess.square_distance(a, b))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'attacks.bin')
+            generated = attacks.load_tables(path)
+            self.assertTrue(os.path.exists(path), "the tables should be cached.")
+            self.assertEqual(attacks.load_tables(path), generated, "the cached tables should be read back unchanged.")
+
+            with open(path, 'r+b') as f:
+                f.write(b'XXXX')
+            self.assertEqual(attacks.load_tables(path), generated, "a broken cache should be generated again.")
+
+    def test_see(self):
+        agent = Agent(engine_color=chess.WHITE)
+        cases = [
+            ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),  # free pawn
+            ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -220),  # knight for a pawn
+            ("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1", "e4d5", 100),
+            ("4k3/8/2p5/3p4/4P3/8/8/3QK3 w - - 0 1", "e4d5", 100),  # the queen takes back last
+            ("3rk3/8/8/3p4/8/8/8/3RK3 w - - 0 1", "d1d5", -400),
+            ("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", 100),  # the second rook x-rays through the first
+        ]
+        for fen, uci, expected in cases:
+            board = chess.Board(fen)
+            self.assertEqual(agent.see_capture(board, chess.Move.from_uci(uci)), expected, f"{fen} {uci}")
+        self.assertEqual(agent.see_capture(chess.Board(), chess.Move.from_uci("e2e4")), 0)
@@ -0,0 +1,44 @@
+import unittest
+
+import chess
+
+from engine.BatchEval import BatchEval, encode_boards
+from engine.Eval import EvalPawns, EvalPieces, EvalRooks
+from tests.positions import random_positions
+
+
+class TestBatchEval(unittest.TestCase):
+    boards = random_positions(300, 2025, 10, 120, [
+        chess.Board(),
+        chess.Board("N2K3N/8/8/4n3/2n5/8/8/3k4 w - - 0 1"),
+        chess.Board("8/5k2/3p4/1P6/8/8/3P4/4K3 w - - 0 1"),
+        chess.Board("r1bqkb2/pppppp1p/7r/n7/8/N7/P1PP1P2/R2QK2R w - - 0 1"),
+        chess.Board("8/pp3p2/2p2kp1/2P5/1P1P4/P5PP/5K2/8 b - - 0 40"),
+    ])
+    planes = encode_boards(boards)
+
+    def test_matches_scalar_eval(self):
+        for color in chess.COLORS:
+            batch = BatchEval(color)
+            material = batch.evaluate_material(self.planes)
+            board_scores = batch.evaluate_board(self.planes)
+            pawn_structure = batch.evaluate_pawn_structure(self.planes)
+            rook_files = batch.evaluate_rook_files(self.planes)
+            total = batch.evaluate(self.planes)
+            for i, board in enumerate(self.boards):
+                with self.subTest(fen=board.fen(), color=color):
+                    pieces = EvalPieces(color, board)
+                    pawns = EvalPawns(color, board)
+                    rooks = EvalRooks(color, board)
+                    self.assertEqual(material[i], pieces.evaluate_material())
+                    self.assertEqual(board_scores[i], pieces.evaluate_board())
+                    self.assertEqual(pawn_structure[i], pawns.evaluate_pawn_structure())
+                    self.assertEqual(rook_files[i], rooks.evaluate_rook_files(board))
+                    self.assertEqual(total[i], material[i] + board_scores[i] + pawn_structure[i] + rook_files[i])
+
+    def test_encoding(self):
+        board = chess.Board()
+        planes = encode_boards([board])
+        self.assertEqual(planes.shape, (1, 12, 64))
+        self.assertEqual(planes[0, 0].sum(), 8, "white should have eight pawns.")
+        self.assertEqual(planes[0, 11, chess.E8], 1, "black king should be on e8.")
@@ -1,9 +1,11 @@
+import time
 import unittest
 import chess
 from chess import STARTING_FEN
 import chess.engine
 
-from engine.Agent import Agent
+from engine.Agent import Agent, EVALUATORS, SINGULAR_MARGIN, mate_in, score_from_tt, score_to_tt
+from engine.consts import MATE
 
 class TestEngine(unittest.TestCase):
     agent_black = Agent(engine_color=chess.BLACK)
@@ -64,4 +66,145 @@ class TestEngine(unittest.TestCase):
         best_move1 = agent.alpha_beta(board, depth=4, alpha=float('-inf'), beta=float('inf'), maximizing_player=True)[1]
         board = chess.Board(fen="rnb1kbnr/pppp1ppp/4p3/8/6Pq/P1N5/1PPPPP1P/R1BQKBNR b KQkq - 0 1")
         best_move2 = agent.alpha_beta(board, depth=3, alpha=float('-inf'), beta=float('inf'), maximizing_player=True)[1]
-        self.assertEqual(best_move1, best_move2, "quiescence gives wrong result on either odd or even depths")
\ No newline at end of file
+        self.assertEqual(best_move1, best_move2, "quiescence gives wrong result on either odd or even depths")
+
+    def test_evaluators_m1(self):
+        for name in EVALUATORS:
+            with self.subTest(evaluator=name):
+                board = chess.Board(fen="3q2k1/8/8/8/8/1P6/P6r/K7 b - - 0 1")
+                agent = Agent(engine_color=chess.BLACK, evaluator=name)
+                move = agent.find_best_move(board, 2)[0]
+                self.assertIsNotNone(move)
+                if move: board.push(move)
+                self.assertTrue(board.is_checkmate(), f"{name} can't find trivial mate in 1")
+
+    def test_time_limit(self):
+        board = chess.Board(fen="r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+        fen = board.fen()
+        agent = Agent(engine_color=chess.WHITE)
+        start = time.perf_counter()
+        move, _ = agent.find_best_move(board, 10, time_limit=0.5)
+        self.assertLess(time.perf_counter() - start, 1.5, "search doesn't stop when the time is up.")
+        self.assertIn(move, board.legal_moves)
+        self.assertEqual(board.fen(), fen, "the board isn't restored after an interrupted search.")
+
+    def test_mate_scores(self):
+        # mate in 2 with king and rook, the search stops once the mate is found within the full width search
+        board = chess.Board(fen="6k1/8/6K1/8/8/8/8/7R w - - 0 1")
+        agent = Agent(engine_color=chess.WHITE)
+        infos = []
+        move, score = agent.find_best_move(board, 8, info_callback=infos.append)
+        self.assertEqual(mate_in(score), 2, "should report mate in 2.")
+        self.assertEqual(score, MATE - 3)
+        self.assertLess(agent.completed_depth, 8, "the search should stop once the mate is proven.")
+        self.assertEqual(infos[-1]['mate'], 2)
+
+        board.push(move)
+        board.push_uci("g8f8")
+        self.assertEqual(agent.find_best_move(board, 8)[1], MATE - 1,
+                         "the mate found through the transposition table should be one move closer.")
+
+    def test_tt_mate_adjustment(self):
+        for score in [MATE - 5, -(MATE - 4), 123.5, -40]:
+            for ply in [0, 3, 7]:
+                self.assertEqual(score_from_tt(score_to_tt(score, ply), ply), score)
+        self.assertEqual(score_from_tt(score_to_tt(MATE - 5, 3), 1), MATE - 3,
+                         "a mate stored 2 plies deeper is 2 plies closer to the root than when probed nearer.")
+        self.assertIsNone(mate_in(500))
+        self.assertEqual(mate_in(-(MATE - 2)), -1)
+
+    def test_check_extensions(self):
+        # smothered mate in 4, seven plies deep, only reachable at depth 3 by extending the checks
+        board = chess.Board(fen="r6k/6pp/8/6N1/2Q5/8/8/6K1 w - - 0 1")
+        agent = Agent(engine_color=chess.WHITE)
+        move, score = agent.find_best_move(board, 3)
+        self.assertEqual(move, chess.Move.from_uci("g5f7"), "can't find the smothered mate at depth 3")
+        self.assertEqual(mate_in(score), 4)
+        self.assertGreater(agent.seldepth, 3, "seldepth should include the extended plies.")
+
+    def test_singular_search_uses_tt_score(self):
+        # the singular search's window is placed a multiple of the margin below (above) the node's stored score,
+        # also when that entry was only just written by internal iterative deepening
+        board = chess.Board(fen="r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3")
+        agent = Agent(engine_color=chess.BLACK)
+        search = agent.alpha_beta
+        offsets = []
+
+        def alpha_beta(board, depth, alpha, beta, maximizing_player, ply=0, excluded_move=None, **kwargs):
+            if excluded_move is not None:
+                tt_value = score_from_tt(agent.transposition_table.get(agent.zobrist_hash(board)).value, ply)
+                offsets.append(tt_value - beta if maximizing_player else alpha - tt_value)
+            return search(board, depth, alpha, beta, maximizing_player, ply, excluded_move, **kwargs)
+
+        agent.alpha_beta = alpha_beta
+        agent.find_best_move(board, 5)
+        self.assertTrue(offsets, "the search should try singular extensions.")
+        for offset in offsets:
+            self.assertAlmostEqual(offset % SINGULAR_MARGIN, 0, msg="a singular search used a stale tt score.")
+
+    def test_pruning_keeps_mates(self):
+        # tactical regression set: (fen, depth, best move, mate in), every mate has to survive the shallow pruning
+        tactics = [
+            ("3q2k1/8/8/8/8/1P6/P6r/K7 b - - 0 1", 3, "d8d1", 1),
+            ("8/8/8/8/8/1r6/K7/3k4 b - - 0 1", 4, "d1c2", 2),
+            ("6k1/8/6K1/8/8/8/8/7R w - - 0 1", 3, "g6f6", 2),
+            ("r6k/6pp/8/6N1/2Q5/8/8/6K1 w - - 0 1", 3, "g5f7", 4),
+            ("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 0", 3, "d5f6", 2),
+        ]
+        for fen, depth, best_move, mate in tactics:
+            with self.subTest(fen=fen):
+                board = chess.Board(fen=fen)
+                pruned = Agent(engine_color=board.turn)
+                move, score = pruned.find_best_move(board, depth)
+                self.assertEqual(move, chess.Move.from_uci(best_move), f"pruning lost the mate, fen: {fen}")
+                self.assertEqual(mate_in(score), mate)
+
+                full = Agent(engine_color=board.turn, pruning_margins={})
+                full.find_best_move(board, depth)
+                self.assertLessEqual(pruned.nodes, full.nodes, "pruning shouldn't search more nodes.")
+
+    def test_draws_and_contempt(self):
+        # f6g8 repeats the starting position for the third time
+        board = chess.Board()
+        for move in ["g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"]:
+            board.push_uci(move)
+        draw = chess.Move.from_uci("f6g8")
+        move, score = Agent(engine_color=chess.BLACK, contempt=-500).find_best_move(board, 2)
+        self.assertEqual((move, score), (draw, 500), "an engine with negative contempt should take the draw.")
+        move, score = Agent(engine_color=chess.BLACK, contempt=500).find_best_move(board, 2)
+        self.assertNotEqual(move, draw, "an engine with positive contempt should avoid the draw.")
+
+        # every move reaches the fifty move limit without mating
+        board = chess.Board(fen="7k/8/8/8/8/8/1Q6/K7 w - - 99 80")
+        self.assertEqual(Agent(engine_color=chess.WHITE).find_best_move(board, 2)[1], 0,
+                         "the fifty move rule should end the game.")
+
+    def test_multipv(self):
+        fen = "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 3"
+        board = chess.Board(fen)
+        all_moves = board.legal_moves.count()
+        for color in chess.COLORS:
+            sign = 1 if color == chess.WHITE else -1
+            agent = Agent(engine_color=color)
+            infos = []
+            lines = agent.find_best_lines(board, 3, 3, info_callback=infos.append)
+            self.assertEqual(board.fen(), fen)
+            self.assertEqual(len(lines), 3)
+            self.assertEqual(lines[0].move, chess.Move.from_uci("f3f7"), "the mate should be the first line.")
+            self.assertEqual(lines[0].score, sign * (MATE - 1))
+            self.assertEqual([sign * line.score for line in lines], sorted((sign * line.score for line in lines),
+                                                                          reverse=True),
+                             "the lines should be ranked from the side to move's point of view.")
+            self.assertEqual([info['multipv'] for info in infos[-3:]], [1, 2, 3])
+            self.assertEqual([info['move'] for info in infos[-3:]], [line.move for line in lines])
+
+            # every move searched with a full window gives the same scores for the best three
+            every_line = Agent(engine_color=color).find_best_lines(board, all_moves, 3)
+            self.assertEqual(len(every_line), all_moves)
+            self.assertEqual([line.score for line in every_line[:3]], [line.score for line in lines],
+                             "the null window searches should keep the scores of the lines exact.")
+
+        board = chess.Board(fen="6k1/8/6K1/8/8/8/8/7R w - - 0 1")
+        lines = Agent(engine_color=chess.WHITE).find_best_lines(board, 2, 4)
+        self.assertEqual(mate_in(lines[0].score), 2)
+        self.assertGreaterEqual(len(lines[0].pv), 3, "the line should continue to the mate.")
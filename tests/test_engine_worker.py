@@ -0,0 +1,86 @@
+import time
+import unittest
+import chess
+
+from engine.Agent import Agent
+from ui.EngineWorker import EngineWorker
+
+
+class TestEngineWorker(unittest.TestCase):
+    def wait(self, worker: EngineWorker):
+        while worker.is_thinking():
+            time.sleep(0.01)
+
+    def test_search_in_background(self):
+        board = chess.Board()
+        board.push_uci("e2e4")
+        worker = EngineWorker(Agent(engine_color=chess.BLACK), max_depth=2)
+        worker.start(board)
+        self.wait(worker)
+        result = worker.poll()
+        self.assertIsNotNone(result, "a finished search should hand back its result.")
+        self.assertIn(result.move, board.legal_moves)
+        self.assertEqual(board.fen(), chess.Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1").fen(),
+                         "the worker should not touch the gui's board.")
+
+    def test_force_and_cancel(self):
+        board = chess.Board()
+        worker = EngineWorker(Agent(engine_color=chess.WHITE), max_depth=20)
+        worker.start(board)
+        time.sleep(0.2)
+        worker.force_move()
+        self.wait(worker)
+        result = worker.poll()
+        self.assertIn(result.move, board.legal_moves, "a forced search should still return a legal move.")
+
+        worker.start(board)
+        time.sleep(0.2)
+        worker.cancel()
+        self.wait(worker)
+        self.assertIsNone(worker.poll(), "a cancelled search should not return a move.")
+
+    def test_cancel_before_the_search_starts(self):
+        # a stop sent before the thread gets to the search still ends it
+        agent = Agent(engine_color=chess.WHITE)
+        agent.stop()
+        move, _ = agent.find_best_move(chess.Board(), 20)
+        self.assertIsNotNone(move)
+        self.assertLessEqual(agent.nodes, 1, "a stopped agent shouldn't search until the stop is cleared.")
+
+        worker = EngineWorker(agent, max_depth=20)
+        worker.ponder(chess.Board(), None)
+        worker.stop_background()
+        worker.thread.join(5)
+        self.assertFalse(worker.is_thinking(), "a ponder search stopped right away should end.")
+        self.assertIsNone(worker.poll())
+
+    def test_ponder_hit(self):
+        board = chess.Board()
+        board.push_uci("e2e4")
+        worker = EngineWorker(Agent(engine_color=chess.WHITE), max_depth=2)
+        expected = chess.Move.from_uci("e7e5")
+        worker.ponder(board, expected)
+        self.wait(worker)
+        self.assertIsNone(worker.poll(), "a ponder result should be held back until the expected move is played.")
+        worker.ponder_hit()
+        result = worker.poll()
+        board.push(expected)
+        self.assertIsNotNone(result, "after a ponder hit the finished search should be used right away.")
+        self.assertIn(result.move, board.legal_moves)
+
+    def test_ponder_miss(self):
+        board = chess.Board()
+        board.push_uci("e2e4")
+        worker = EngineWorker(Agent(engine_color=chess.WHITE), max_depth=2)
+        worker.ponder(board, chess.Move.from_uci("e7e5"))
+        worker.stop_background()
+        self.wait(worker)
+        self.assertIsNone(worker.poll(), "the result of a missed ponder search should be thrown away.")
+
+    def test_analysis_of_opponent_position(self):
+        # black to move can mate with Qh4#, the engine plays white
+        board = chess.Board("rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2")
+        agent = Agent(engine_color=chess.WHITE)
+        move, _ = agent.find_best_move(board, 2)
+        self.assertEqual(move, chess.Move.from_uci("d8h4"), "the search should find the opponent's best move.")
+        self.assertEqual(agent.principal_variation(board, 1), [move])
@@ -1,8 +1,9 @@
 import unittest
 import chess
 from chess import STARTING_FEN
+from engine import consts
 from engine.Agent import Eval
-from engine.Eval import EvalPawns, EvalRooks, EvalKing, EvalPieces
+from engine.Eval import EvalPawns, EvalRooks, EvalKing, EvalPieces, EvalMobility
 
 
 class TestEval(unittest.TestCase):
@@ -94,6 +95,35 @@ class TestEval(unittest.TestCase):
         score = pieces_eval.evaluate_center_control(board)
         self.assertGreater(score, 0, "center control advantage isn't evaluated properly.")
 
+    def test_mobility(self):
+        board = chess.Board(fen=STARTING_FEN)
+        self.assertEqual(EvalMobility(chess.WHITE, board).evaluate_mobility(board), 0,
+                         "the mobility of both sides is the same in the start.")
+
+        # the bishop on b2 sees the long diagonal, the one on f8 is blocked by its own pawns
+        board = chess.Board(fen="4kb2/4pp2/8/8/8/8/1B6/4K3 w - - 0 1")
+        self.assertGreater(EvalMobility(chess.WHITE, board).evaluate_mobility(board), 0,
+                           "a free bishop should be worth more than a blocked one.")
+        self.assertEqual(EvalMobility(chess.BLACK, board).evaluate_mobility(board),
+                         -EvalMobility(chess.WHITE, board).evaluate_mobility(board),
+                         "the mobility score should be symmetric.")
+        mirrored = board.mirror()
+        self.assertEqual(EvalMobility(chess.BLACK, mirrored).evaluate_mobility(mirrored),
+                         EvalMobility(chess.WHITE, board).evaluate_mobility(board),
+                         "the mobility of a mirrored position should be the same for the other side.")
+
+    def test_mobility_safe_squares(self):
+        # the knight's squares d6 and f6 are attacked by the pawn on e7, they aren't counted
+        board = chess.Board(fen="4k3/4p3/8/8/4N3/8/8/4K3 w - - 0 1")
+        mobility, king_zone = EvalMobility(chess.WHITE, board).mobility_counts(board)
+        self.assertEqual(mobility, 6 * consts.MOBILITY_UNITS[chess.KNIGHT],
+                         "squares attacked by enemy pawns shouldn't count as mobility.")
+        self.assertEqual(king_zone, 0)
+
+        board = chess.Board(fen="4k3/8/8/8/8/8/8/3RK3 w - - 0 1")
+        _, king_zone = EvalMobility(chess.WHITE, board).mobility_counts(board)
+        self.assertEqual(king_zone, 2, "the rook attacks d7 and d8 next to the enemy king.")
+
     def test_winning_progress(self):
         board = chess.Board(fen="2p3k1/3p4/4b3/8/8/2PP1N1P/1K6/3R4 w - - 0 1")
         score1 = EvalPieces(chess.WHITE, board).evaluate_progress_when_winning(board)
@@ -0,0 +1,51 @@
+import unittest
+import chess
+from chess import STARTING_FEN
+
+from engine.Agent import Agent
+from engine.Eval import Eval
+from engine.EvalCache import EvalCache
+
+
+class TestEvalCache(unittest.TestCase):
+    def test_probe_and_store(self):
+        cache = EvalCache(size_bits=4)
+        self.assertIsNone(cache.probe(5))
+        cache.store(5, 42.5)
+        self.assertEqual(cache.probe(5), 42.5)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.probes, 2)
+        self.assertEqual(cache.hit_rate, 0.5)
+
+    def test_replacement(self):
+        cache = EvalCache(size_bits=4)
+        cache.store(3, 1.0)
+        cache.store(3 + cache.size, 2.0)  # same slot, different key
+        self.assertIsNone(cache.probe(3), "older entry should have been replaced.")
+        self.assertEqual(cache.probe(3 + cache.size), 2.0)
+        self.assertEqual(cache.replacements, 1)
+
+    def test_cached_eval_matches(self):
+        agent = Agent(engine_color=chess.WHITE)
+        board = chess.Board(fen="r1bqkb2/ppp1pp1p/8/n2p3r/8/3Q1N2/P1PP1P2/R3K2R w - - 0 20")
+        key = agent.zobrist_hash(board)
+        uncached = Eval(chess.WHITE).evaluate(board, 0)
+        first = agent.evaluator.evaluate(board, 0, key)
+        second = agent.evaluator.evaluate(board, 0, key)
+        self.assertEqual(uncached, first)
+        self.assertEqual(first, second)
+        self.assertEqual(agent.eval_cache.hits, 1)
+
+    def test_terminal_scores_not_cached(self):
+        agent = Agent(engine_color=chess.WHITE)
+        board = chess.Board(fen="6k1/8/8/8/8/1P6/P6r/K2q4 w - - 1 2")
+        key = agent.zobrist_hash(board)
+        self.assertNotEqual(agent.evaluator.evaluate(board, 1, key), agent.evaluator.evaluate(board, 3, key),
+                            "mate scores should depend on the ply.")
+        self.assertEqual(agent.eval_cache.stores, 0, "terminal scores should never be stored.")
+
+    def test_search_uses_cache(self):
+        agent = Agent(engine_color=chess.WHITE)
+        board = chess.Board(fen=STARTING_FEN)
+        agent.find_best_move(board, 3)
+        self.assertGreater(agent.eval_cache.hits, 0)
@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import unittest
+import chess
+import numpy as np
+
+from engine.Agent import Agent
+from engine.EvalNNUE import FEATURES, EvalNNUE, feature_index, load_network, save_network
+
+
+def random_network(hidden: int = 16, seed: int = 0) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return {
+        'feature_weights': rng.integers(-200, 200, (FEATURES, hidden)).astype(np.int16),
+        'feature_bias': rng.integers(-100, 300, hidden).astype(np.int16),
+        'output_weights': rng.integers(-64, 64, 2 * hidden).astype(np.int16),
+        'output_bias': np.int32(100),
+    }
+
+
+class TestEvalNNUE(unittest.TestCase):
+    def test_incremental_matches_refresh(self):
+        evaluator = EvalNNUE(chess.WHITE, network=random_network())
+        # castling, en passant and promotions on the way
+        fens = [
+            chess.STARTING_FEN,
+            "r3k2r/pppq1ppp/2n2n2/3pp3/1b1PP3/2N2N2/PPPQ1PPP/R3K2R w KQkq - 0 1",
+            "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1",
+            "1n2k3/P7/8/8/8/8/7p/4K1N1 w - - 0 1",
+        ]
+        rng = random.Random(7)
+        for fen in fens:
+            for _ in range(5):
+                board = chess.Board(fen)
+                evaluator.evaluate_static(board)
+                for _ in range(60):
+                    moves = list(board.legal_moves)
+                    if not moves:
+                        break
+                    board.push(rng.choice(moves))
+                    evaluator.push(board)
+                    np.testing.assert_array_equal(evaluator.stack[-1][1], evaluator.refresh(board),
+                                                  f"incremental accumulator differs after {board.peek()} in "
+                                                  f"{board.fen()}")
+
+        board = chess.Board(fens[2])
+        evaluator.stack = []
+        evaluator.evaluate_static(board)
+        board.push(chess.Move.from_uci("e5d6"))
+        evaluator.push(board)
+        board.pop()
+        evaluator.pop()
+        self.assertEqual(len(evaluator.stack), 1, "pop should take the position after the move off the stack.")
+        np.testing.assert_array_equal(evaluator.accumulator(board), evaluator.refresh(board))
+
+    def test_perspectives(self):
+        self.assertEqual(feature_index(chess.PAWN, chess.WHITE, chess.E2, chess.WHITE),
+                         feature_index(chess.PAWN, chess.BLACK, chess.E7, chess.BLACK),
+                         "both sides should see their own pieces in the same features.")
+
+        evaluator = EvalNNUE(chess.WHITE, network=random_network())
+        board = chess.Board("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+        mirrored = board.mirror()
+        self.assertEqual(evaluator.evaluate_static(board), -evaluator.evaluate_static(mirrored),
+                         "the mirrored position should get the opposite score for white.")
+        self.assertEqual(EvalNNUE(chess.BLACK, network=random_network()).evaluate_static(board),
+                         -evaluator.evaluate_static(board), "the score should be from the engine's side.")
+
+    def test_save_and_load(self):
+        network = random_network()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nnue.npz')
+            save_network(path, network['feature_weights'], network['feature_bias'], network['output_weights'],
+                         int(network['output_bias']), {'positions': 10})
+            loaded = load_network(path)
+            for name in ['feature_weights', 'feature_bias', 'output_weights', 'output_bias']:
+                np.testing.assert_array_equal(loaded[name], network[name])
+            self.assertEqual(int(loaded['meta_positions']), 10)
+
+            save_network(path, network['feature_weights'][:, :8], network['feature_bias'], network['output_weights'],
+                         0)
+            with self.assertRaises(ValueError):
+                load_network(path)
+            with self.assertRaises(FileNotFoundError):
+                load_network(os.path.join(directory, 'missing.npz'))
+
+    def test_trained_network(self):
+        evaluator = EvalNNUE(chess.WHITE)
+        start = evaluator.evaluate_static(chess.Board())
+        without_queen = evaluator.evaluate_static(chess.Board("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNB1KBNR w KQkq - 0 1"))
+        self.assertLess(abs(start), 100, "the starting position should be about equal.")
+        self.assertLess(without_queen, start - 300, "a missing queen should be a big disadvantage.")
+
+        agent = Agent(engine_color=chess.WHITE, evaluator='nnue')
+        board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 3")
+        move, _ = agent.find_best_move(board, 3)
+        self.assertEqual(move, chess.Move.from_uci("f3f7"), "the nnue agent should find scholar's mate.")
+        self.assertEqual(len(agent.evaluator.stack), 1, "the search should leave only the root on the stack.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+import chess
+
+from engine import kernels
+from engine.Agent import Agent, ZOBRIST_KERNEL_KEYS, ZOBRIST_PIECE
+from engine.Eval import EvalMobility, EvalPawns, EvalPieces
+from tests.positions import random_positions
+
+
+class TestKernels(unittest.TestCase):
+    # the kernels (compiled when numba is installed) against the python code of the engine
+    boards = random_positions(60, 3, 2, 100, [
+        chess.Board("r3k2r/pp1q1ppp/2n1bn2/2bpp3/3PP3/2N1BN2/PPQ1BPPP/R3K2R w KQkq - 0 1"),
+        chess.Board("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1"),
+        chess.Board("7k/P7/8/8/8/8/1p6/K7 w - - 0 1"),
+    ])
+
+    def test_evaluation_kernels(self):
+        for board in self.boards:
+            for color in chess.COLORS:
+                compiled = EvalPieces(color, board).evaluate_board(), \
+                    EvalPawns(color, board).evaluate_pawn_structure(), EvalMobility(color, board).mobility_counts(board)
+                with mock.patch.object(kernels, 'ENABLED', False):
+                    python = EvalPieces(color, board).evaluate_board(), \
+                        EvalPawns(color, board).evaluate_pawn_structure(), \
+                        EvalMobility(color, board).mobility_counts(board)
+                self.assertAlmostEqual(compiled[0], python[0], msg=f"evaluate_board differs for {board.fen()}")
+                self.assertAlmostEqual(compiled[1], python[1], msg=f"pawn structure differs for {board.fen()}")
+                self.assertEqual(tuple(compiled[2]), python[2], f"mobility differs for {board.fen()}")
+
+    def test_search_kernels(self):
+        agent = Agent()
+        for board in self.boards:
+            captures = [move for move in board.legal_moves if board.is_capture(move)]
+            compiled = [agent.see_capture(board, move) for move in captures], agent.zobrist_hash(board)
+            with mock.patch.object(kernels, 'ENABLED', False):
+                python = [agent.see_capture(board, move) for move in captures], agent.zobrist_hash(board)
+            self.assertEqual(compiled, python, f"see or zobrist hash differs for {board.fen()}")
+
+    def test_kernels_directly(self):
+        # without going through the engine, without numba this runs the kernels as python
+        agent = Agent()
+        for board in self.boards:
+            masks = kernels.board_masks(board)
+            expected_key = 0
+            for square, piece in board.piece_map().items():
+                expected_key ^= ZOBRIST_PIECE[piece.piece_type - 1][0 if piece.color == chess.WHITE else 1][square]
+            self.assertEqual(int(kernels.zobrist_pieces(masks, ZOBRIST_KERNEL_KEYS)) & 0xFFFF_FFFF_FFFF_FFFF,
+                             expected_key)
+
+            with mock.patch.object(kernels, 'ENABLED', False):
+                see_scores = {move: agent.see_capture(board, move) for move in board.legal_moves
+                              if board.is_capture(move) and board.piece_type_at(move.to_square)}
+            for move, expected in see_scores.items():
+                self.assertEqual(kernels.see(masks, move.from_square, move.to_square, int(board.turn),
+                                             kernels.PIECE_VALUES, kernels.KNIGHT_ATTACKS, kernels.KING_ATTACKS,
+                                             kernels.PAWN_ATTACKS), expected, f"{board.fen()} {move}")
+
+
+if __name__ == '__main__':
+    unittest.main()
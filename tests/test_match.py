@@ -0,0 +1,26 @@
+import unittest
+
+from tools.match import Player, elo_estimate, play_game, sprt_bounds, sprt_llr
+
+
+class TestMatch(unittest.TestCase):
+    def test_sprt(self):
+        lower, upper = sprt_bounds(0.05, 0.05)
+        self.assertLess(lower, 0)
+        self.assertGreater(upper, 0)
+        self.assertGreater(sprt_llr(60, 30, 10, 0, 10), upper, "a clearly stronger engine should accept H1.")
+        self.assertLess(sprt_llr(10, 30, 60, 0, 10), lower, "a clearly weaker engine should accept H0.")
+        self.assertEqual(sprt_llr(0, 10, 0, 0, 10), 0.0)
+
+    def test_elo_estimate(self):
+        elo, margin = elo_estimate(50, 0, 50)
+        self.assertAlmostEqual(elo, 0)
+        self.assertGreater(margin, 0)
+        self.assertGreater(elo_estimate(60, 20, 20)[0], 0)
+
+    def test_play_game(self):
+        player = Player("fichess:depth=1")
+        result, pgn = play_game(player, Player("fichess:depth=1,evaluator=old"), "e2e4 e7e5", None, 1, max_plies=8)
+        self.assertEqual(result, '1/2-1/2')
+        self.assertIn('[Termination "adjudication"]', pgn)
+        self.assertIn('/1 ', pgn, "moves should be commented with score/depth and time.")
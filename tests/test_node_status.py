@@ -0,0 +1,60 @@
+import random
+import unittest
+import chess
+
+from engine.Agent import Agent
+from engine.NodeStatus import NodeStatus, is_repetition
+
+
+class TestNodeStatus(unittest.TestCase):
+    agent = Agent(engine_color=chess.WHITE)
+
+    def test_matches_board(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            board = chess.Board()
+            keys = []
+            while True:
+                key = self.agent.zobrist_hash(board)
+                status = NodeStatus(board, key, keys)
+                self.assertEqual(status.in_check, board.is_check(), board.fen())
+                self.assertEqual(status.checkmate, board.is_checkmate(), board.fen())
+                self.assertEqual(status.stalemate, board.is_stalemate(), board.fen())
+                self.assertEqual(set(status.legal_moves), set(board.legal_moves), board.fen())
+                if status.is_game_over:
+                    break
+                keys.append(key)
+                board.push(rng.choice(status.legal_moves))
+
+    def test_repetition(self):
+        board = chess.Board()
+        keys = []
+        for move in ["g1f3", "g8f6", "f3g1", "f6g8"] * 2:
+            keys.append(self.agent.zobrist_hash(board))
+            board.push_uci(move)
+        status = NodeStatus(board, self.agent.zobrist_hash(board), keys)
+        self.assertEqual(status.repetitions, 3, "the starting position has been repeated three times.")
+
+    def test_search_repetition(self):
+        board = chess.Board()
+        keys = []
+        for move in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+            keys.append(self.agent.zobrist_hash(board))
+            board.push_uci(move)
+        key = self.agent.zobrist_hash(board)
+        self.assertFalse(is_repetition(key, keys, board.halfmove_clock, len(keys)),
+                         "a twofold repetition of the game history isn't a draw yet.")
+        self.assertTrue(is_repetition(key, keys, board.halfmove_clock, 0),
+                        "repeating a position from the search path is a draw.")
+        for move in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+            keys.append(self.agent.zobrist_hash(board))
+            board.push_uci(move)
+        self.assertTrue(is_repetition(self.agent.zobrist_hash(board), keys, board.halfmove_clock, len(keys)),
+                        "a threefold repetition of the game history is a draw.")
+
+    def test_game_history_keys(self):
+        board = chess.Board()
+        for move in ["e2e4", "e7e5", "g1f3", "b8c6", "f3g1"]:
+            board.push_uci(move)
+        keys = self.agent.game_history_keys(board)
+        self.assertEqual(len(keys), board.halfmove_clock, "only positions since the last pawn move can repeat.")
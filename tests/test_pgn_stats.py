@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+from tools.pgn_stats import analyse, parse_comment
+
+PGN = """[Event "?"]
+[White "fichess_d3"]
+[Black "Stockfish"]
+[Result "0-1"]
+
+1. e4 {1.5s} e5 {+0.20/30 12s} 2. Nf3 {30s} Nc6 {-0.10/28 5.1s} 3. Bb5 {2.5s} a6 {+M3/40 0.040s} 0-1
+
+[Event "?"]
+[White "Stockfish"]
+[Black "fichess_d3"]
+[Result "1/2-1/2"]
+
+1. d4 {+0.30/30 10s} d5 {4s} 1/2-1/2
+"""
+
+
+class TestPgnStats(unittest.TestCase):
+    def test_parse_comment(self):
+        self.assertEqual(parse_comment("55s"), 55)
+        self.assertEqual(parse_comment("+0.26/32 30s"), 30)
+        self.assertEqual(parse_comment("+M1/32 24s, Black mates"), 24)
+        self.assertIsNone(parse_comment("book"))
+
+    def test_analyse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'fichess_d3_vs_stockfish_1800.pgn')
+            with open(path, 'w') as f:
+                f.write(PGN)
+            report = analyse([path], 'fichess', top=2)
+
+        stats = report['depths']['3']['all']
+        self.assertEqual(stats['moves'], 4, "only the engine's moves should be counted.")
+        self.assertEqual(stats['max'], 30)
+        self.assertEqual([record['san'] for record in report['slowest']], ['Nf3', 'd5'])
+        results = report['results'][0]
+        self.assertEqual((results['rating'], results['games'], results['draws'], results['losses']), (1800, 2, 1, 1))
@@ -0,0 +1,45 @@
+import unittest
+import chess
+
+from engine.Agent import Agent
+from engine.NodeStatus import NodeStatus
+from engine.Profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    fen = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+    def test_restores_methods(self):
+        originals = Agent.alpha_beta, NodeStatus.__init__, chess.Board.push
+        with Profiler():
+            self.assertIsNot(Agent.alpha_beta, originals[0], "the search should be wrapped while profiling.")
+        self.assertEqual((Agent.alpha_beta, NodeStatus.__init__, chess.Board.push), originals,
+                         "disabling the profiler should put the original methods back.")
+
+    def test_counters_without_profiler(self):
+        agent = Agent(engine_color=chess.WHITE)
+        agent.find_best_move(chess.Board(self.fen), 3)
+        self.assertGreater(agent.tt_probes, 0, "the table counters should be kept without the profiler.")
+        self.assertGreater(agent.tt_hits, 0)
+        self.assertLessEqual(agent.tt_hits, agent.tt_probes)
+        self.assertGreater(agent.tt_stores, 0)
+
+    def test_same_result(self):
+        board = chess.Board(self.fen)
+        expected = Agent(engine_color=chess.WHITE).find_best_move(board.copy(), 2)
+        profiler = Profiler()
+        with profiler:
+            result = Agent(engine_color=chess.WHITE).find_best_move(board.copy(), 2)
+        self.assertEqual(result, expected, "profiling should not change the search.")
+
+        rows = {row['name']: row for row in profiler.report()}
+        for name in ['search', 'quiescence', 'movegen', 'ordering', 'tt.probe', 'tt.store', 'eval',
+                     'eval.evaluate_pawn_structure']:
+            self.assertGreater(rows[name]['calls'], 0, f"{name} should have been profiled.")
+        self.assertAlmostEqual(sum(row['share'] for row in rows.values()), 1.0)
+
+        for line in profiler.collapsed_stacks():
+            stack, value = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('search'), line)
+            self.assertNotIn('search;search', stack, "recursive calls should be folded.")
+            self.assertGreater(int(value), 0)
@@ -0,0 +1,75 @@
+import unittest
+import chess
+
+from engine.Agent import mate_in
+from engine.consts import MATE
+from engine.ResultStore import AnalysisResult, ResultStore, format_epd
+
+
+class TestResultStore(unittest.TestCase):
+    fen = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+    def test_deeper_results_answer_shallower_requests(self):
+        store = ResultStore()
+        board = chess.Board(self.fen)
+        searched = store.analyse(board, depth=2)
+        self.assertEqual(searched.depth, 2)
+        self.assertEqual(store.stats()['misses'], 1)
+
+        self.assertEqual(store.analyse(board, depth=2), searched, "the stored result should be returned.")
+        self.assertEqual(store.get(board, depth=1), searched, "a deeper result should answer a shallower request.")
+        self.assertEqual(store.get(board, nodes=searched.nodes), searched)
+        self.assertIsNone(store.get(board, depth=3))
+        self.assertIsNone(store.get(board, nodes=searched.nodes + 1))
+        self.assertIsNone(store.get(board, depth=1, config='old'), "other evaluators have their own results.")
+
+        moved = chess.Board(self.fen.replace(" 2 3", " 4 9"))
+        self.assertEqual(store.get(moved), searched, "the move counters aren't part of the position.")
+
+        store.put(board, AnalysisResult(searched.best_move, 0, [searched.best_move], 1, 10))
+        self.assertEqual(store.get(board).depth, 2, "a shallower result shouldn't replace a deeper one.")
+        self.assertEqual(store.stats()['hits'], 5)
+
+    def test_node_limit(self):
+        store = ResultStore()
+        board = chess.Board(self.fen)
+        result = store.analyse(board, nodes=500)
+        self.assertIsNotNone(result.best_move)
+        self.assertGreaterEqual(result.nodes, 500)
+        self.assertLess(result.nodes, 600, "the search should stop at the node limit.")
+
+    def test_eviction(self):
+        store = ResultStore(max_entries=3)
+        move = chess.Move.from_uci("e2e4")
+        boards = []
+        for fen in ["8/8/8/8/8/8/4P3/k3K3 w - - 0 1", "8/8/8/8/8/8/4P3/1k2K3 w - - 0 1",
+                    "8/8/8/8/8/8/4P3/2k1K3 w - - 0 1", "8/8/8/8/8/8/4P3/k4K2 w - - 0 1"]:
+            boards.append(chess.Board(fen))
+        for board in boards[:3]:
+            store.put(board, AnalysisResult(move, 0, [move], 1, 1))
+        store.get(boards[0])
+        store.put(boards[3], AnalysisResult(move, 0, [move], 1, 1))
+        self.assertEqual(store.stats()['entries'], 3)
+        self.assertEqual(store.stats()['evictions'], 1)
+        self.assertIsNone(store.get(boards[1]), "the least recently used position should be evicted.")
+        self.assertIsNotNone(store.get(boards[0]))
+
+    def test_epd_import(self):
+        board = chess.Board("6k1/8/6K1/8/8/8/8/7R w - - 0 1")
+        mate = AnalysisResult(chess.Move.from_uci("g6f6"), MATE - 3,
+                              [chess.Move.from_uci(move) for move in ["g6f6", "g8f8", "h1h8"]], 3, 628)
+        board2 = chess.Board(self.fen)
+        result = AnalysisResult(chess.Move.from_uci("f1b5"), 35, [chess.Move.from_uci("f1b5")], 4, 9000)
+        lines = [format_epd(board, mate), "# comment", "", format_epd(board2, result),
+                 "8/8/8/8/8/8/8/k6K w - - c0 \"no analysis\";",
+                 # no score, not epd, an illegal best move and a depth that isn't a number
+                 "8/8/8/8/8/8/8/k6K w - - bm Kg2; acd 3;", "not an epd", "8/8/8/8/8/8/8/k6K w - - bm Qh8; acd 3; ce 0;",
+                 "8/8/8/8/8/8/8/k6K w - - bm Kg2; acd x; ce 0;"]
+
+        store = ResultStore()
+        self.assertEqual(store.import_epd(lines), (2, 5), "lines without a score and malformed ones should be skipped.")
+        self.assertIsNone(store.get(chess.Board("8/8/8/8/8/8/8/k6K w - - 0 1")))
+        self.assertEqual(store.get(board), mate)
+        self.assertEqual(mate_in(store.get(board).score), 2)
+        self.assertEqual(store.get(board2, depth=4), result)
+        self.assertEqual(store.import_epd(lines)[0], 0, "results that are already stored shouldn't be stored again.")
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import unittest
+import chess
+
+from server.app import AnalysisServer
+from server.pool import EnginePool
+
+SCHOLARS_MATE = "r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    # a real server with one engine process, so the saturation and disconnect cases are easy to set up
+    async def asyncSetUp(self):
+        self.server = AnalysisServer(EnginePool(1, max_queue=1))
+        self.listener = await self.server.start('127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+        await self.server.pool.close()
+
+    async def open(self, method: str, target: str, body: dict | None = None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        content = json.dumps(body).encode() if body is not None else b''
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(content)}\r\n\r\n"
+                     .encode() + content)
+        await writer.drain()
+        return reader, writer
+
+    async def request(self, method: str, target: str, body: dict | None = None) -> tuple[int, dict | str]:
+        reader, writer = await self.open(method, target, body)
+        response = await reader.read()
+        writer.close()
+        head, _, content = response.partition(b'\r\n\r\n')
+        status = int(head.split()[1])
+        if b'application/json' in head:
+            return status, json.loads(content)
+        return status, content.decode()
+
+    async def test_bestmove_and_analyse(self):
+        status, body = await self.request('POST', '/bestmove', {'fen': SCHOLARS_MATE, 'depth': 2})
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body['bestmove'], 'h5f7', "the server should find the mate in one.")
+        self.assertEqual(body['score'], {'mate': 1})
+
+        status, body = await self.request('GET', '/analyse?moves=e2e4,e7e5&depth=2&multipv=3')
+        self.assertEqual(status, 200, body)
+        self.assertEqual(len(body['lines']), 3, "multipv 3 should give three lines.")
+        self.assertEqual(len({line['move'] for line in body['lines']}), 3, "the lines should start differently.")
+        self.assertEqual(body['bestmove'], body['lines'][0]['move'])
+        self.assertGreater(body['nodes'], 0)
+
+    async def test_bad_requests(self):
+        status, body = await self.request('GET', '/analyse?fen=not+a+fen')
+        self.assertEqual(status, 400, body)
+        status, body = await self.request('GET', '/analyse?moves=e2e5')
+        self.assertEqual(status, 400, body)
+        status, body = await self.request('GET', '/analyse?depth=zero')
+        self.assertEqual(status, 400, body)
+        for params in ({'fen': 5}, {'moves': [1]}, {'session': [1]}, {'evaluator': [1]}, {'evaluator': 'bogus'}):
+            status, body = await self.request('POST', '/analyse', params)
+            self.assertEqual(status, 400, f"{params} should be refused, not {body}.")
+        self.assertEqual(body['error'], "unknown evaluator bogus")
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(b"POST /analyse HTTP/1.1\r\nHost: localhost\r\nContent-Length: abc\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "), response)
+        status, _ = await self.request('GET', '/nowhere')
+        self.assertEqual(status, 404)
+        status, _ = await self.request('POST', '/metrics')
+        self.assertEqual(status, 405)
+
+    async def test_saturation_and_disconnect(self):
+        # the only engine is busy with a long search and one request waits for it, the next one is refused
+        busy = await self.open('GET', '/analyse?movetime=20000')
+        await asyncio.sleep(0.2)
+        waiting = asyncio.create_task(self.request('GET', '/bestmove?depth=1'))
+        await asyncio.sleep(0.2)
+        status, _ = await self.request('GET', '/bestmove?depth=1')
+        self.assertEqual(status, 503, "a saturated pool should refuse requests.")
+
+        # closing the connection stops the long search, so the waiting request gets the engine
+        busy[1].close()
+        status, body = await asyncio.wait_for(waiting, 5)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(self.server.pool.busy, 0)
+
+        status, text = await self.request('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertIn('fichess_requests_total{endpoint="/bestmove",status="503"} 1', text)
+        self.assertIn('fichess_requests_total{endpoint="/analyse",status="499"} 1', text)
+        self.assertIn('fichess_queue_depth 0', text)
+
+    async def test_deadline(self):
+        # a movetime longer than the deadline is cut short, a request that can't get an engine in time fails
+        status, body = await self.request('GET', '/analyse?movetime=20000&timeout=0.5')
+        self.assertEqual(status, 200, body)
+        self.assertLess(body['time'], 0.5)
+
+        busy = await self.open('GET', '/analyse?movetime=20000')
+        await asyncio.sleep(0.2)
+        status, _ = await self.request('GET', '/bestmove?depth=1&timeout=0.2')
+        self.assertEqual(status, 504, "a request should give up when its deadline passes in the queue.")
+        busy[1].close()
+
+
+class TestSessions(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = EnginePool(2)
+        await self.pool.start()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    async def test_session_affinity(self):
+        loop = asyncio.get_running_loop()
+        job = {'fen': chess.STARTING_FEN, 'moves': ['e2e4'], 'depth': 2, 'session': 'game-1', 'color': 'black'}
+        result = await self.pool.search(job, loop.time() + 10)
+        home = self.pool.affinity['game-1']
+        board = chess.Board()
+        board.push_uci('e2e4')
+        self.assertIn(chess.Move.from_uci(result['bestmove']), board.legal_moves)
+        await self.pool.search(dict(job, moves=['e2e4', 'e7e5', 'g1f3']), loop.time() + 10)
+        self.assertIs(self.pool.affinity['game-1'], home, "a game should stay on the worker with its state.")
+
+        # with its worker busy the game moves to the other one
+        self.pool.idle.remove(home)
+        self.pool.idle.append(home)
+        busy = asyncio.create_task(self.pool.search({'fen': chess.STARTING_FEN, 'depth': 3}, loop.time() + 10))
+        await asyncio.sleep(0)
+        result = await self.pool.search(dict(job, moves=['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1b5']),
+                                        loop.time() + 10)
+        self.assertIsNot(self.pool.affinity['game-1'], home)
+        self.assertIsNotNone(result['bestmove'])
+        await busy
+
+        # scores are from the side to move, also when the engine plays the other side
+        result = await self.pool.search(dict(job, fen=SCHOLARS_MATE, moves=[], color='black'), loop.time() + 10)
+        self.assertEqual((result['bestmove'], result['lines'][0]['mate']), ('h5f7', 1))
+        self.pool.close_session('game-1')
+        self.assertNotIn('game-1', self.pool.affinity)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import chess
+
+from engine.SessionManager import SessionManager
+
+
+def game_board(index: int) -> chess.Board:
+    # a different short opening for every game
+    board = chess.Board()
+    for _ in range(2):
+        moves = sorted(board.legal_moves, key=chess.Move.uci)
+        board.push(moves[index % len(moves)])
+        index //= len(moves)
+    return board
+
+
+class TestSessionManager(unittest.TestCase):
+    def assert_counted(self, manager: SessionManager):
+        self.assertEqual(manager.tt_entries, sum(session.tt_entries for session in manager.sessions.values()),
+                         "the manager's count of transposition table entries should match the sessions.")
+
+    def test_sessions_keep_their_own_state(self):
+        manager = SessionManager()
+        first, lines = manager.search('a', game_board(1), max_depth=2)
+        self.assertIn(lines[0].move, game_board(1).legal_moves)
+        agent = first.agent
+        manager.search('b', game_board(2), max_depth=2)
+        self.assertIsNot(manager.sessions['b'].agent, agent, "every game should get its own agent.")
+
+        board = game_board(1)
+        board.push(lines[0].move)
+        board.push(next(iter(board.legal_moves)))
+        self.assertIs(manager.search('a', board, max_depth=2)[0].agent, agent,
+                      "the next move of a game should reuse its agent.")
+        self.assertEqual(first.searches, 2)
+
+        manager.search('a', board, engine_color=chess.BLACK, max_depth=1)
+        self.assertIsNot(manager.sessions['a'].agent, agent, "a game with a new engine color starts over.")
+        self.assert_counted(manager)
+
+        manager.close('a')
+        self.assertNotIn('a', manager)
+        self.assert_counted(manager)
+
+    def test_memory_caps(self):
+        manager = SessionManager(max_sessions=20, session_tt_entries=50, total_tt_entries=400)
+        for index in range(60):
+            manager.search(f'game-{index}', game_board(index), max_depth=3)
+            self.assertLessEqual(manager.sessions[f'game-{index}'].tt_entries, 50,
+                                 "a session's table should be trimmed to its cap.")
+            self.assertLessEqual(manager.tt_entries, 400, "idle sessions should be evicted above the total.")
+        self.assert_counted(manager)
+        self.assertEqual(len(manager), 20, "the least recently used sessions should be closed.")
+        self.assertIn('game-59', manager)
+        self.assertNotIn('game-0', manager)
+        self.assertGreater(manager.evictions, 0)
+
+        # evicted sessions lose only their search state, the oldest ones go first
+        stats = manager.stats()
+        self.assertLess(stats['active'], stats['sessions'])
+        self.assertIsNotNone(manager.sessions['game-59'].agent)
+        self.assertIsNone(manager.sessions['game-40'].agent)
+        _, lines = manager.search('game-40', game_board(40), max_depth=2)
+        self.assertIn(lines[0].move, game_board(40).legal_moves, "an evicted session should search again.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+import chess
+
+from engine.Agent import Agent
+from engine.TranspositionTable import NodeType, TTEntry, TranspositionTable, HEADER_SIZE
+
+
+class TestTranspositionTable(unittest.TestCase):
+    fen = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tt.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries_persist(self):
+        entries = {
+            0x1234: TTEntry(37.5, 4, NodeType.EXACT, chess.Move.from_uci("e2e4")),
+            0xABCD00: TTEntry(-9990, 2, NodeType.LOWER_BOUND, chess.Move.from_uci("a7a8n")),
+            0xFFFF_FFFF_FFFF_FFFF: TTEntry(0, 0, NodeType.UPPER_BOUND, None),
+        }
+        table = TranspositionTable(self.path, 42, size_bits=8)
+        for key, entry in entries.items():
+            table[key] = entry
+        table.close()
+
+        table = TranspositionTable(self.path, 42)
+        self.assertEqual(table.size, 256, "the size should be read from the file.")
+        for key, entry in entries.items():
+            self.assertEqual(table.get(key), entry)
+        self.assertIsNone(table.get(0x1234 + 256), "a key from another position in the same slot should miss.")
+        self.assertEqual(len(table), 3)
+        table.close()
+
+        table = TranspositionTable(self.path, 42)
+        self.assertEqual(table.get(0x1234).value, 37.5, "the scores should be stored as they were given.")
+        table.close()
+
+    def test_replacement(self):
+        table = TranspositionTable(self.path, 42, size_bits=4)
+        table[1] = TTEntry(10, 5, NodeType.EXACT, None)
+        table[17] = TTEntry(20, 3, NodeType.EXACT, None)
+        self.assertIsNotNone(table.get(1), "a shallower entry shouldn't replace a deeper one.")
+        table[1] = TTEntry(30, 2, NodeType.EXACT, None)
+        self.assertEqual(table.get(1).value, 30, "the same position is always replaced.")
+        table.close()
+
+    def test_rejects_foreign_files(self):
+        TranspositionTable(self.path, 42, size_bits=4).close()
+        with self.assertRaises(ValueError):
+            TranspositionTable(self.path, 43)
+
+        with open(self.path, 'r+b') as f:
+            f.write(b'NOPE')
+        with self.assertRaises(ValueError):
+            TranspositionTable(self.path, 42)
+
+        with open(os.path.join(self.directory.name, 'short.bin'), 'wb') as f:
+            f.write(b'FT')
+        with self.assertRaises(ValueError):
+            TranspositionTable(f.name, 42)
+
+        TranspositionTable(self.path + '2', 42, size_bits=4).close()
+        with open(self.path + '2', 'r+b') as f:
+            f.truncate(HEADER_SIZE + 10)
+        with self.assertRaises(ValueError):
+            TranspositionTable(self.path + '2', 42)
+
+    def test_agent_fingerprint(self):
+        Agent(engine_color=chess.WHITE, tt_path=self.path, tt_bits=10).close()
+        with self.assertRaises(ValueError, msg="a table from another evaluator should be rejected."):
+            Agent(engine_color=chess.WHITE, evaluator='old', tt_path=self.path)
+        with self.assertRaises(ValueError, msg="a table with another contempt should be rejected."):
+            Agent(engine_color=chess.WHITE, contempt=20, tt_path=self.path)
+        with self.assertRaises(ValueError, msg="a table from the other color should be rejected."):
+            Agent(engine_color=chess.BLACK, tt_path=self.path)
+
+    def test_resume(self):
+        board = chess.Board(self.fen)
+        agent = Agent(engine_color=chess.WHITE, tt_path=self.path, tt_bits=16)
+        expected = agent.find_best_move(board, 3)
+        agent.close()
+
+        agent = Agent(engine_color=chess.WHITE, tt_path=self.path)
+        self.assertEqual(agent.find_best_move(board, 3), expected, "the stored result should be returned.")
+        self.assertEqual(agent.nodes, 0, "a position searched to the depth already shouldn't be searched again.")
+        self.assertEqual(agent.completed_depth, 3)
+
+        depths = []
+        agent.find_best_move(board, 4, info_callback=lambda info: depths.append(info['depth']))
+        self.assertEqual(depths, [4], "the search should continue from the depth it reached.")
+        agent.close()
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+
+import chess
+import numpy as np
+
+from engine.Eval import Eval
+from engine.weights import WEIGHTS, load_weights, save_weights
+from tuning.features import TUNABLE_WEIGHTS, feature_vector
+from tuning.texel import fit, logistic_loss
+
+
+class TestTuning(unittest.TestCase):
+    def test_features_reconstruct_eval(self):
+        fens = [
+            "r1bqkb2/pppppp1p/7r/n7/8/N7/P1PP1P2/R2QK2R w - - 0 1",
+            "rnbq1bnr/ppppkppp/8/4p3/8/2NP4/PPP1PPPP/R1BQKBNR b KQ - 0 1",
+            "8/5k2/3p4/1P6/8/8/3P4/4K3 w - - 0 30",
+        ]
+        weights = np.array([WEIGHTS[name] for name in TUNABLE_WEIGHTS])
+        for fen in fens:
+            with self.subTest(fen=fen):
+                board = chess.Board(fen)
+                base, features = feature_vector(board)
+                self.assertAlmostEqual(base + features @ weights, Eval(chess.WHITE).evaluate_static(board), places=6)
+
+    def test_fit_reduces_loss(self):
+        rng = np.random.default_rng(1)
+        x = rng.normal(size=(500, 3))
+        true_weights = np.array([30.0, -20.0, 10.0])
+        results = (rng.random(500) < 1 / (1 + 10 ** (-(x @ true_weights) / 400))).astype(float)
+        initial = np.array([10.0, 10.0, 10.0])
+        base = np.zeros(500)
+        tuned = fit(x, base, results, initial, k=1.0, epochs=500, lr=0.05, l2=0)
+        self.assertLess(logistic_loss(x @ tuned, results, 1.0), logistic_loss(x @ initial, results, 1.0))
+
+    def test_weights_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'weights.json')
+            save_weights({'passed_pawn': 42}, path)
+            weights = load_weights(path)
+            self.assertEqual(weights['passed_pawn'], 42)
+            self.assertEqual(weights['doubled_pawn'], WEIGHTS['doubled_pawn'], "missing weights keep the defaults.")
+
+            with open(path, 'w') as f:
+                json.dump({'version': -1, 'weights': {}}, f)
+            with self.assertRaises(ValueError):
+                load_weights(path)
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+import chess
+
+from engine.Agent import Agent
+from uci.handle import handle, options
+
+
+class TestUci(unittest.TestCase):
+    def test_lazy_imports(self):
+        code = "import sys, uci.handle; print(' '.join(m for m in ['engine.Agent', 'numpy', 'pygame'] if m in sys.modules))"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "", "the uci handshake shouldn't import the engine, numpy or pygame.")
+
+    def test_handshake_and_search(self):
+        board = chess.Board()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for message in ["uci", "isready", "position startpos moves e2e4", "go depth 1"]:
+                handle(board, message)
+        lines = output.getvalue().splitlines()
+        self.assertIn("uciok", lines)
+        self.assertIn("readyok", lines)
+        self.assertTrue(lines[-1].startswith("bestmove "), lines[-1])
+        self.assertIn(chess.Move.from_uci(lines[-1].split()[1]), board.legal_moves)
+
+    def test_spin_options(self):
+        board = chess.Board()
+        try:
+            handle(board, "setoption name Contempt value 5000")
+            self.assertEqual(options['Contempt'], 1000, "contempt should be clamped to its range.")
+            handle(board, "setoption name Contempt value abc")
+            self.assertEqual(options['Contempt'], 1000, "a value that isn't a number should be ignored.")
+            handle(board, "setoption name MultiPV value abc")
+            self.assertEqual(options['MultiPV'], 1)
+            handle(board, "setoption name MultiPV value 1000")
+            self.assertEqual(options['MultiPV'], 256, "multipv should be clamped to its range.")
+        finally:
+            options.update(Contempt=0, MultiPV=1)
+
+    def test_stale_tt_file(self):
+        board = chess.Board()
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(output):
+            try:
+                handle(board, f"setoption name TTFile value {directory}/a.tt")
+                handle(board, "go depth 1")
+                handle(board, "setoption name Contempt value 20")
+                handle(board, "go depth 1")
+            finally:
+                options.update(Contempt=0, TTFile='')
+        lines = output.getvalue().splitlines()
+        self.assertTrue(any(line.startswith("info string") for line in lines),
+                        "a table written with another contempt should be reported.")
+        self.assertTrue(lines[-1].startswith("bestmove "), "the engine should still search without the file.")
+
+    def test_agent_keeps_global_random(self):
+        random.seed(7)
+        expected = random.random()
+        random.seed(7)
+        Agent()
+        self.assertEqual(random.random(), expected, "creating an agent shouldn't reseed the random module.")
+        self.assertEqual(Agent().zobrist_hash(chess.Board()), 0xdc2deda831f656a4,
+                         "the zobrist keys should stay the same, stored transposition tables depend on them.")
+
+
+if __name__ == '__main__':
+    unittest.main()
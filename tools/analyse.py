@@ -0,0 +1,65 @@
+import argparse
+import time
+
+import chess
+
+from engine.Agent import EVALUATORS
+from engine.ResultStore import ResultStore, DEFAULT_MAX_ENTRIES, format_epd
+
+# batch analysis of a file of positions (fen or epd, one per line) through the result store, positions that were
+# analysed before are answered from the store. the results are written as epd with bm, ce/dm, acd, acn and pv,
+# which --import reads back into a store.
+
+
+def read_positions(path: str) -> list[chess.Board]:
+    boards = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                boards.append(chess.Board(line))
+            except ValueError:
+                boards.append(chess.Board.from_epd(line)[0])
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyse positions with a persistent result store")
+    parser.add_argument('positions', nargs='?', help="file with one fen or epd per line")
+    parser.add_argument('--store', default='analysis.sqlite', help="sqlite file of the result store")
+    parser.add_argument('--max-entries', type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument('--depth', type=int, default=None)
+    parser.add_argument('--nodes', type=int, default=None, help="node limit instead of a depth")
+    parser.add_argument('--evaluator', default='eval', choices=list(EVALUATORS))
+    parser.add_argument('--output', default=None, help="epd file for the results, stdout by default")
+    parser.add_argument('--import', dest='import_paths', nargs='*', default=[],
+                        help="epd files of earlier batch analyses to add to the store")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store, args.max_entries)
+    for path in args.import_paths:
+        with open(path) as f:
+            imported, skipped = store.import_epd(f, args.evaluator)
+        print(f"imported {imported} results from {path}, skipped {skipped} lines")
+
+    if args.positions:
+        output = open(args.output, 'w') if args.output else None
+        start = time.perf_counter()
+        for board in read_positions(args.positions):
+            result = store.analyse(board, args.depth, args.nodes, args.evaluator)
+            if result.best_move is not None:
+                print(format_epd(board, result), file=output)
+        if output is not None:
+            output.close()
+        print(f"analysed in {time.perf_counter() - start:.2f}s")
+
+    stats = store.stats()
+    print(f"store: {stats['entries']} entries, {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.1%}), {stats['stores']} stored, {stats['evictions']} evicted")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
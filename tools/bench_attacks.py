@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import chess
+
+from engine import attacks
+from engine.Agent import Agent
+from tools.profile import PROFILE_POSITIONS
+
+# compares the attack table queries with the python-chess calls they replace, in queries per second
+
+
+def bench(name: str, queries: int, func) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    rate = queries / elapsed
+    print(f"{name:<40} {rate:12,.0f} /s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the attack tables against python-chess")
+    parser.add_argument('--repeat', type=int, default=20, help="passes over the positions")
+    args = parser.parse_args()
+
+    boards = [chess.Board(fen) for fen in PROFILE_POSITIONS]
+    squares = [(board, color, square) for board in boards for color in chess.COLORS for square in chess.SQUARES]
+    moves = [(board, move) for board in boards for move in board.legal_moves]
+    captures = [(board, move) for board, move in moves if board.is_capture(move)]
+    agent = Agent()
+
+    def python_chess_attackers():
+        for _ in range(args.repeat):
+            for board, color, square in squares:
+                board.attackers(color, square)
+
+    def python_chess_attackers_mask():
+        for _ in range(args.repeat):
+            for board, color, square in squares:
+                board.attackers_mask(color, square)
+
+    def table_attackers():
+        for _ in range(args.repeat):
+            for board, color, square in squares:
+                attacks.attackers_mask(board, color, square)
+
+    def python_chess_gives_check():
+        for _ in range(args.repeat):
+            for board, move in moves:
+                board.gives_check(move)
+
+    def table_gives_check():
+        for _ in range(args.repeat):
+            for board, move in moves:
+                attacks.gives_check(board, move)
+
+    def see():
+        for _ in range(args.repeat):
+            for board, move in captures:
+                agent.see_capture(board, move)
+
+    n = len(squares) * args.repeat
+    base = bench("board.attackers", n, python_chess_attackers)
+    bench("board.attackers_mask", n, python_chess_attackers_mask)
+    table = bench("attacks.attackers_mask", n, table_attackers)
+    print(f"{'':<40} {table / base:11.1f}x\n")
+
+    n = len(moves) * args.repeat
+    base = bench("board.gives_check", n, python_chess_gives_check)
+    table = bench("attacks.gives_check", n, table_gives_check)
+    print(f"{'':<40} {table / base:11.1f}x\n")
+
+    bench("see_capture", len(captures) * args.repeat, see)
+
+
+if __name__ == '__main__':
+    main()
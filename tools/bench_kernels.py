@@ -0,0 +1,91 @@
+import argparse
+import time
+
+import chess
+
+from engine import kernels
+from engine.Agent import Agent
+from engine.Eval import EvalPawns, EvalPieces
+from tools.profile import PROFILE_POSITIONS
+
+# compares the compiled kernels of engine/kernels.py with the python code they replace, per kernel and for a
+# whole search. the calls include building the bitboard arrays, like the engine does
+
+
+def rate(calls: int, func) -> float:
+    start = time.perf_counter()
+    func()
+    return calls / (time.perf_counter() - start)
+
+
+def measure(boards: list[chess.Board], repeat: int, depth: int) -> dict[str, float]:
+    agent = Agent(engine_color=chess.WHITE)
+    captures = [(board, move) for board in boards for move in board.legal_moves if board.is_capture(move)]
+
+    def evaluate_board():
+        for _ in range(repeat):
+            for board in boards:
+                EvalPieces(chess.WHITE, board).evaluate_board()
+
+    def pawn_structure():
+        for _ in range(repeat):
+            for board in boards:
+                EvalPawns(chess.WHITE, board).evaluate_pawn_structure()
+
+    def see():
+        for _ in range(repeat):
+            for board, move in captures:
+                agent.see_capture(board, move)
+
+    def zobrist():
+        for _ in range(repeat):
+            for board in boards:
+                agent.zobrist_hash(board)
+
+    def search():
+        nodes = 0
+        for board in boards:
+            searcher = Agent(engine_color=board.turn)
+            searcher.find_best_move(board.copy(), depth)
+            nodes += searcher.nodes
+        return nodes
+
+    results = {
+        'pst sums (evaluate_board)': rate(len(boards) * repeat, evaluate_board),
+        'pawn files (evaluate_pawn_structure)': rate(len(boards) * repeat, pawn_structure),
+        'see swap list (see_capture)': rate(len(captures) * repeat, see),
+        'zobrist xors (zobrist_hash)': rate(len(boards) * repeat, zobrist),
+    }
+    start = time.perf_counter()
+    nodes = search()
+    results[f'search nodes, depth {depth}'] = nodes / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the numba kernels against the python code")
+    parser.add_argument('--repeat', type=int, default=200, help="passes over the positions")
+    parser.add_argument('--depth', type=int, default=2)
+    args = parser.parse_args()
+
+    if not kernels.ENABLED:
+        print("numba isn't installed (or FICHESS_NUMBA=0), only the python code can be measured")
+        return
+
+    boards = [chess.Board(fen) for fen in PROFILE_POSITIONS]
+    measure(boards, 1, 1)  # compiles the kernels, or loads them from numba's cache
+
+    compiled = measure(boards, args.repeat, args.depth)
+    kernels.ENABLED = False
+    try:
+        python = measure(boards, args.repeat, args.depth)
+    finally:
+        kernels.ENABLED = True
+
+    print(f"{'':<40} {'python':>12} {'numba':>12} {'speedup':>8}")
+    for name in compiled:
+        print(f"{name:<40} {python[name]:10,.0f}/s {compiled[name]:10,.0f}/s {compiled[name] / python[name]:7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# measures the startup of the uci engine from spawning the process to uciok, to readyok (the engine is loaded by
+# then) and to the bestmove of a depth 1 search, over several fresh processes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_startup(command: list[str]) -> dict[str, float]:
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+    times = {}
+
+    def send(message: str):
+        process.stdin.write(message + "\n")
+        process.stdin.flush()
+
+    def wait_for(prefix: str, name: str):
+        for line in process.stdout:
+            if line.startswith(prefix):
+                times[name] = time.perf_counter() - start
+                return
+        raise RuntimeError(f"the engine exited before {prefix}")
+
+    try:
+        send("uci")
+        wait_for("uciok", 'uciok')
+        send("isready")
+        wait_for("readyok", 'readyok')
+        send("position startpos")
+        send("go depth 1")
+        wait_for("bestmove", 'bestmove')
+        send("quit")
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the startup time of the uci engine")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--python', default=sys.executable)
+    args = parser.parse_args()
+
+    command = [args.python, os.path.join(ROOT, 'uci.py')]
+    time_startup(command)  # warms the os file cache and the bytecode cache
+    runs = [time_startup(command) for _ in range(args.runs)]
+
+    print(f"{'':<10} {'median':>10} {'min':>10} {'max':>10}")
+    for name in ['uciok', 'readyok', 'bestmove']:
+        values = [run[name] * 1000 for run in runs]
+        print(f"{name:<10} {statistics.median(values):8.1f}ms {min(values):8.1f}ms {max(values):8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
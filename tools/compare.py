@@ -0,0 +1,100 @@
+import argparse
+import random
+import statistics
+import time
+
+import chess
+import chess.pgn
+
+from engine.Agent import Agent, EVALUATORS
+from tuning.positions import pgn_files, random_playout
+
+# a/b comparison of the evaluators in engine.Agent.EVALUATORS:
+# evaluation speed, score differences over a position corpus and fixed depth search effort
+
+
+def load_corpus(paths: list[str], limit: int, seed: int = 2025) -> list[chess.Board]:
+    # every position of the given games that isn't over, topped up with random playouts
+    boards = []
+    for path in pgn_files(paths):
+        with open(path) as f:
+            while len(boards) < limit:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                board = game.board()
+                for move in game.mainline_moves():
+                    board.push(move)
+                    if not board.is_game_over():
+                        boards.append(board.copy(stack=False))
+
+    rng = random.Random(seed)
+    while len(boards) < limit:
+        board = random_playout(rng, 4, 100)
+        if not board.is_game_over():
+            boards.append(board.copy(stack=False))
+
+    rng.shuffle(boards)
+    return boards[:limit]
+
+
+def evals_per_second(name: str, boards: list[chess.Board]) -> tuple[float, list[float]]:
+    evaluator = EVALUATORS[name](chess.WHITE)
+    start = time.perf_counter()
+    scores = [evaluator.evaluate_static(board) for board in boards]
+    elapsed = time.perf_counter() - start
+    return len(boards) / elapsed, scores
+
+
+def search_effort(name: str, boards: list[chess.Board], depth: int) -> tuple[int, float]:
+    nodes = 0
+    start = time.perf_counter()
+    for board in boards:
+        agent = Agent(engine_color=board.turn, evaluator=name)
+        agent.find_best_move(board.copy(), depth)
+        nodes += agent.nodes
+    return nodes, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare two evaluators")
+    parser.add_argument('a', nargs='?', default='eval', choices=list(EVALUATORS))
+    parser.add_argument('b', nargs='?', default='old', choices=list(EVALUATORS))
+    parser.add_argument('--pgn', nargs='*', default=['results'], help="pgn files or directories for the corpus")
+    parser.add_argument('--positions', type=int, default=5000)
+    parser.add_argument('--search-positions', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help="number of largest differences to show")
+    args = parser.parse_args()
+
+    boards = load_corpus(args.pgn, args.positions)
+    print(f"corpus: {len(boards)} positions")
+
+    speed_a, scores_a = evals_per_second(args.a, boards)
+    speed_b, scores_b = evals_per_second(args.b, boards)
+    print(f"\nevals/s    {args.a:>10} {speed_a:10.0f}")
+    print(f"evals/s    {args.b:>10} {speed_b:10.0f}")
+    print(f"speedup    {speed_a / speed_b:10.2f}x")
+
+    deltas = [a - b for a, b in zip(scores_a, scores_b)]
+    abs_deltas = [abs(d) for d in deltas]
+    same_sign = sum(1 for a, b in zip(scores_a, scores_b) if (a > 0) == (b > 0)) / len(boards)
+    print(f"\nscore delta ({args.a} - {args.b}), white's point of view")
+    print(f"mean       {statistics.fmean(deltas):10.2f}")
+    print(f"mean abs   {statistics.fmean(abs_deltas):10.2f}")
+    print(f"stdev      {statistics.pstdev(deltas):10.2f}")
+    print(f"max abs    {max(abs_deltas):10.2f}")
+    print(f"corr       {statistics.correlation(scores_a, scores_b):10.3f}")
+    print(f"same sign  {same_sign:10.1%}")
+    for i in sorted(range(len(boards)), key=lambda i: abs_deltas[i], reverse=True)[:args.top]:
+        print(f"  {deltas[i]:+9.1f}  {boards[i].fen()}")
+
+    search_boards = boards[:args.search_positions]
+    print(f"\nfixed depth {args.depth} search over {len(search_boards)} positions")
+    for name in (args.a, args.b):
+        nodes, elapsed = search_effort(name, search_boards, args.depth)
+        print(f"{name:>10} {nodes:10d} nodes {elapsed:8.2f}s {nodes / elapsed:8.0f} nps")
+
+
+if __name__ == '__main__':
+    main()
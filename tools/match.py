@@ -0,0 +1,318 @@
+import argparse
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.engine
+import chess.pgn
+
+from engine.Agent import Agent, mate_in
+from engine.consts import MATE
+
+# plays matches between fichess configurations and/or external uci engines in parallel processes,
+# writes the games to a pgn file and stops early once the sprt reaches a decision.
+#
+# players are given as
+#   fichess:depth=3,evaluator=old,contempt=20
+#   uci:/usr/bin/stockfish,Skill Level=3
+# time controls are base+increment in seconds (e.g. 10+0.1), without one fichess searches to its depth.
+
+DEFAULT_OPENINGS = [
+    "e2e4 e7e5 g1f3 b8c6",
+    "e2e4 c7c5 g1f3 d7d6",
+    "e2e4 e7e6 d2d4 d7d5",
+    "e2e4 c7c6 d2d4 d7d5",
+    "d2d4 d7d5 c2c4 e7e6",
+    "d2d4 g8f6 c2c4 g7g6",
+    "d2d4 d7d5 c2c4 c7c6",
+    "c2c4 e7e5 b1c3 g8f6",
+    "g1f3 d7d5 g2g3 g8f6",
+    "e2e4 d7d5 e4d5 d8d5",
+]
+
+MAX_PLIES = 300
+
+
+class Player:
+    def __init__(self, spec: str):
+        kind, _, rest = spec.partition(':')
+        if kind not in ('fichess', 'uci'):
+            raise ValueError(f"unknown player '{spec}', expected fichess:... or uci:...")
+        self.kind = kind
+        self.spec = spec
+        self.options: dict[str, str] = {}
+        parts = [part for part in rest.split(',') if part]
+        if kind == 'uci':
+            if not parts:
+                raise ValueError(f"'{spec}' is missing the path of the engine")
+            self.path = parts.pop(0)
+        for part in parts:
+            name, _, value = part.partition('=')
+            self.options[name] = value
+
+        self.name = self.options.pop('name', None) or (
+            f"fichess_d{self.options.get('depth', 4)}" if kind == 'fichess' else self.path.rsplit('/', 1)[-1])
+
+
+class TimeControl:
+    def __init__(self, spec: str | None):
+        self.spec = spec
+        if spec is None:
+            self.base, self.increment = None, 0.0
+        else:
+            base, _, increment = spec.partition('+')
+            self.base = float(base)
+            self.increment = float(increment or 0)
+
+    def budget(self, remaining: float) -> float:
+        # simple time management for fichess: a share of the remaining time plus most of the increment
+        return min(remaining / 30 + self.increment * 0.8, remaining / 2)
+
+    def pgn_header(self) -> str:
+        if self.base is None:
+            return '-'
+        return f"{self.base:g}+{self.increment:g}" if self.increment else f"{self.base:g}"
+
+
+class _Side:
+    # one player in one game, created inside the worker process
+    def __init__(self, player: Player, color: chess.Color):
+        self.player = player
+        self.color = color
+        self.agent = None
+        self.engine = None
+        if player.kind == 'fichess':
+            self.agent = Agent(engine_color=color, evaluator=player.options.get('evaluator', 'eval'),
+                               contempt=int(player.options.get('contempt', 0)))
+            self.depth = int(player.options.get('depth', 4))
+        else:
+            self.engine = chess.engine.SimpleEngine.popen_uci(player.path)
+            if player.options:
+                self.engine.configure(player.options)
+
+    def play(self, board: chess.Board, tc: TimeControl, clocks: dict[chess.Color, float]) \
+            -> tuple[chess.Move | None, float | None, int | None]:
+        # returns the move, the score in centipawns from the mover's point of view and the depth
+        if self.agent is not None:
+            time_limit = tc.budget(clocks[self.color]) if tc.base is not None else None
+            move, score = self.agent.find_best_move(board, self.depth, time_limit=time_limit)
+            return move, score, self.agent.completed_depth
+
+        if tc.base is None:
+            limit = chess.engine.Limit(depth=int(self.player.options.get('depth', 10)))
+        else:
+            limit = chess.engine.Limit(white_clock=clocks[chess.WHITE], black_clock=clocks[chess.BLACK],
+                                       white_inc=tc.increment, black_inc=tc.increment)
+        result = self.engine.play(board, limit, info=chess.engine.INFO_SCORE | chess.engine.INFO_BASIC)
+        score = result.info.get('score')
+        if score is not None:
+            score = score.pov(self.color)
+            if score.is_mate():
+                # same scale as fichess, mate n moves away is n * 2 - 1 plies for the winner and n * 2 for the loser
+                mate = score.mate()
+                score = MATE - (mate * 2 - 1) if mate > 0 else -(MATE + mate * 2)
+            else:
+                score = score.score()
+        return result.move, score, result.info.get('depth')
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.quit()
+
+
+def _format_comment(score: float | None, depth: int | None, elapsed: float) -> str:
+    if score is None:
+        return f"{elapsed:.2f}s"
+    mate = mate_in(score)
+    if mate is not None:
+        return f"{'+' if mate > 0 else '-'}M{abs(mate)}/{depth or 0} {elapsed:.2f}s"
+    return f"{score / 100:+.2f}/{depth or 0} {elapsed:.2f}s"
+
+
+def play_game(white: Player, black: Player, opening: str, tc_spec: str | None, round_: int,
+              max_plies: int = MAX_PLIES) -> tuple[str, str]:
+    # plays one game, returns the result and the pgn. runs inside a worker process.
+    tc = TimeControl(tc_spec)
+    board = chess.Board()
+    for uci in opening.split():
+        board.push_uci(uci)
+
+    game = chess.pgn.Game()
+    game.headers['Event'] = 'fichess match'
+    game.headers['Round'] = str(round_)
+    game.headers['White'] = white.name
+    game.headers['Black'] = black.name
+    game.headers['TimeControl'] = tc.pgn_header()
+    node = game
+    for move in board.move_stack:
+        node = node.add_variation(move)
+        node.comment = 'book'
+
+    sides = {chess.WHITE: _Side(white, chess.WHITE), chess.BLACK: _Side(black, chess.BLACK)}
+    clocks = {chess.WHITE: tc.base or 0.0, chess.BLACK: tc.base or 0.0}
+    result, termination = None, None
+    try:
+        while result is None:
+            outcome = board.outcome(claim_draw=True)
+            if outcome is not None:
+                result, termination = outcome.result(), outcome.termination.name.lower()
+                break
+            if board.ply() >= max_plies:
+                result, termination = '1/2-1/2', 'adjudication'
+                break
+
+            side = sides[board.turn]
+            start = time.perf_counter()
+            move, score, depth = side.play(board.copy(), tc, clocks)
+            elapsed = time.perf_counter() - start
+
+            if tc.base is not None:
+                clocks[board.turn] += tc.increment - elapsed
+                if clocks[board.turn] < 0:
+                    result = '0-1' if board.turn == chess.WHITE else '1-0'
+                    termination = 'time forfeit'
+                    break
+            if move is None or move not in board.legal_moves:
+                result = '0-1' if board.turn == chess.WHITE else '1-0'
+                termination = 'illegal move'
+                break
+
+            board.push(move)
+            node = node.add_variation(move)
+            node.comment = _format_comment(score, depth, elapsed)
+    finally:
+        for side in sides.values():
+            side.close()
+
+    game.headers['Result'] = result
+    game.headers['Termination'] = termination
+    return result, str(game)
+
+
+# ref https://www.chessprogramming.org/Sequential_Probability_Ratio_Test
+def elo_to_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    # log likelihood ratio of elo1 against elo0, using the normal approximation of the trinomial model
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return (s1 - s0) * (2 * score - s0 - s1) * games / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> tuple[float, float]:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def elo_estimate(wins: int, draws: int, losses: int) -> tuple[float, float]:
+    # elo difference and its 95% error margin
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = min(max((wins + draws / 2) / games, 1e-3), 1 - 1e-3)
+    elo = -400 * math.log10(1 / score - 1)
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    high = min(score + margin, 1 - 1e-3)
+    return elo, -400 * math.log10(1 / high - 1) - elo
+
+
+def load_openings(path: str | None) -> list[str]:
+    # one opening per line, as uci moves (e2e4 e7e5 ...) or as a pgn file
+    if path is None:
+        return DEFAULT_OPENINGS
+    if path.endswith('.pgn'):
+        openings = []
+        with open(path) as f:
+            while (game := chess.pgn.read_game(f)) is not None:
+                openings.append(' '.join(move.uci() for move in game.mainline_moves()))
+        return openings
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="play a match between two engines")
+    parser.add_argument('a', help="player a, e.g. fichess:depth=3")
+    parser.add_argument('b', help="player b, e.g. fichess:depth=2 or uci:/usr/bin/stockfish")
+    parser.add_argument('--games', type=int, default=100, help="maximum number of games")
+    parser.add_argument('--tc', default=None, help="time control base+inc in seconds, e.g. 10+0.1")
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--openings', default=None, help="file with one opening per line or a pgn file")
+    parser.add_argument('--pgn', default='match.pgn', help="output pgn file")
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'), default=None)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    args = parser.parse_args()
+
+    a, b = Player(args.a), Player(args.b)
+    openings = load_openings(args.openings)
+    lower, upper = sprt_bounds(args.alpha, args.beta)
+
+    def schedule():
+        # every opening is played twice with colors reversed
+        for i in range(args.games):
+            opening = openings[(i // 2) % len(openings)]
+            yield (a, b, opening) if i % 2 == 0 else (b, a, opening)
+
+    wins = draws = losses = 0
+    decision = None
+    games = schedule()
+    with ProcessPoolExecutor(max_workers=args.concurrency) as executor, open(args.pgn, 'w') as pgn:
+        pending = {}
+        round_ = 0
+        finished = False
+        while not finished or pending:
+            while not finished and len(pending) < args.concurrency:
+                next_game = next(games, None)
+                if next_game is None:
+                    finished = True
+                    break
+                round_ += 1
+                white, black, opening = next_game
+                future = executor.submit(play_game, white, black, opening, args.tc, round_)
+                pending[future] = white is a
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                a_is_white = pending.pop(future)
+                result, game_pgn = future.result()
+                pgn.write(game_pgn + '\n\n')
+                pgn.flush()
+
+                if result == '1/2-1/2':
+                    draws += 1
+                elif (result == '1-0') == a_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+
+                elo, margin = elo_estimate(wins, draws, losses)
+                line = f"{wins + draws + losses:4d}  {a.name} vs {b.name}  +{wins} ={draws} -{losses}  " \
+                       f"elo {elo:+.1f} +/- {margin:.1f}"
+                if args.sprt:
+                    llr = sprt_llr(wins, draws, losses, *args.sprt)
+                    line += f"  llr {llr:.2f} ({lower:.2f}, {upper:.2f})"
+                    if decision is None and (llr <= lower or llr >= upper):
+                        # no new games are started, the ones still running are finished and counted
+                        finished = True
+                        decision = "H1 accepted" if llr >= upper else "H0 accepted"
+                print(line, flush=True)
+
+    if decision:
+        print(f"sprt: {decision}")
+    print(f"games written to {args.pgn}")
+
+
+if __name__ == '__main__':
+    main()
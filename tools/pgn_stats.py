@@ -0,0 +1,243 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import re
+import statistics
+from collections import defaultdict
+from collections.abc import Iterator
+
+import chess
+import chess.pgn
+
+from tuning.positions import pgn_files
+
+# think time and result statistics of an engine over pgn collections such as results/.
+# games are read one at a time and only the move times are kept in memory, the per-move
+# records are streamed to csv.
+
+# comments look like {55s}, {2.3s}, {+0.26/32 30s} or {+M7/245 6.3s}
+COMMENT_RE = re.compile(r'(?:(?P<score>[+-]?M?\d+(?:\.\d+)?)/(?P<depth>\d+)\s+)?(?P<time>\d+(?:\.\d+)?)s\b')
+DEPTH_RE = re.compile(r'_d(\d+)')
+RATING_RE = re.compile(r'(\d{3,4})')
+
+PHASES = ['opening', 'middlegame', 'endgame']
+
+MOVE_FIELDS = ['file', 'round', 'depth', 'opponent', 'rating', 'color', 'ply', 'phase', 'time', 'san', 'fen']
+
+
+def game_phase(board: chess.Board) -> str:
+    # same endgame rule as the evaluation: few pieces left or no queens
+    if board.fullmove_number <= 10:
+        return 'opening'
+    queens = board.pieces_mask(chess.QUEEN, chess.WHITE) | board.pieces_mask(chess.QUEEN, chess.BLACK)
+    if chess.popcount(board.occupied) <= 10 or not queens:
+        return 'endgame'
+    return 'middlegame'
+
+
+def parse_comment(comment: str) -> float | None:
+    match = COMMENT_RE.search(comment)
+    return float(match.group('time')) if match else None
+
+
+def opponent_rating(headers: chess.pgn.Headers, color: chess.Color, path: str) -> int | None:
+    # the opponent's elo header, otherwise the rating in the file name (fichess_d4_vs_stockfish_1600.pgn)
+    elo = headers.get('BlackElo' if color == chess.WHITE else 'WhiteElo')
+    if elo and elo.isdigit():
+        return int(elo)
+    _, _, opponent_part = os.path.basename(path).partition('_vs_')
+    match = RATING_RE.search(opponent_part)
+    return int(match.group(1)) if match else None
+
+
+def engine_moves(paths: list[str], engine: str) -> Iterator[tuple[dict, dict | None]]:
+    # yields (game, None) once per game of the engine, followed by (game, move) for each of its moves
+    # that has a think time in the comment
+    for path in pgn_files(paths):
+        with open(path) as f:
+            while (game := chess.pgn.read_game(f)) is not None:
+                headers = game.headers
+                if headers.get('White', '').startswith(engine):
+                    color = chess.WHITE
+                elif headers.get('Black', '').startswith(engine):
+                    color = chess.BLACK
+                else:
+                    continue
+
+                name = headers['White'] if color == chess.WHITE else headers['Black']
+                depth_match = DEPTH_RE.search(name) or DEPTH_RE.search(path)
+                result = headers.get('Result', '*')
+                if result == '1/2-1/2':
+                    score = 0.5
+                elif result in ('1-0', '0-1'):
+                    score = 1.0 if (result == '1-0') == (color == chess.WHITE) else 0.0
+                else:
+                    score = None
+
+                game_record = {
+                    'file': path,
+                    'round': headers.get('Round', '?'),
+                    'depth': int(depth_match.group(1)) if depth_match else None,
+                    'opponent': headers['Black'] if color == chess.WHITE else headers['White'],
+                    'rating': opponent_rating(headers, color, path),
+                    'color': chess.COLOR_NAMES[color],
+                    'score': score,
+                }
+                yield game_record, None
+
+                board = game.board()
+                for node in game.mainline():
+                    move = node.move
+                    if board.turn == color:
+                        think_time = parse_comment(node.comment)
+                        if think_time is not None:
+                            yield game_record, {
+                                **game_record,
+                                'ply': board.ply(),
+                                'phase': game_phase(board),
+                                'time': think_time,
+                                'san': board.san(move),
+                                'fen': board.fen(),
+                            }
+                    board.push(move)
+
+
+def distribution(times: list[float]) -> dict[str, float]:
+    if not times:
+        return {'moves': 0}
+    ordered = sorted(times)
+    if len(ordered) > 1:
+        percentiles = statistics.quantiles(ordered, n=100, method='inclusive')
+    else:
+        percentiles = [ordered[0]] * 99
+    return {
+        'moves': len(ordered),
+        'total': sum(ordered),
+        'mean': statistics.fmean(ordered),
+        'median': statistics.median(ordered),
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': ordered[-1],
+    }
+
+
+def outlier_threshold(times: list[float]) -> float:
+    # tukey's far out fence
+    if len(times) < 4:
+        return float('inf')
+    q1, _, q3 = statistics.quantiles(times, n=4, method='inclusive')
+    return q3 + 3 * (q3 - q1)
+
+
+def analyse(paths: list[str], engine: str, top: int, moves_csv: str | None = None) -> dict:
+    times_by_depth = defaultdict(list)
+    times_by_phase = defaultdict(list)
+    slowest_by_depth = defaultdict(list)  # bounded min-heaps of (time, counter, record)
+    results = defaultdict(lambda: {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0})
+    counter = 0
+
+    csv_file = open(moves_csv, 'w', newline='') if moves_csv else None
+    writer = csv.DictWriter(csv_file, MOVE_FIELDS, extrasaction='ignore') if csv_file else None
+    if writer:
+        writer.writeheader()
+
+    try:
+        for game, move in engine_moves(paths, engine):
+            if move is None:
+                row = results[(game['depth'], game['rating'])]
+                row['games'] += 1
+                if game['score'] == 1.0:
+                    row['wins'] += 1
+                elif game['score'] == 0.5:
+                    row['draws'] += 1
+                elif game['score'] == 0.0:
+                    row['losses'] += 1
+                continue
+
+            depth = move['depth']
+            times_by_depth[depth].append(move['time'])
+            times_by_phase[(depth, move['phase'])].append(move['time'])
+            if writer:
+                writer.writerow(move)
+
+            counter += 1
+            heap = slowest_by_depth[depth]
+            if len(heap) < top:
+                heapq.heappush(heap, (move['time'], counter, move))
+            else:
+                heapq.heappushpop(heap, (move['time'], counter, move))
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    report = {'engine': engine, 'depths': {}, 'results': [], 'slowest': []}
+    for depth in sorted(times_by_depth, key=lambda d: (d is None, d)):
+        times = times_by_depth[depth]
+        threshold = outlier_threshold(times)
+        slowest = sorted(slowest_by_depth[depth], reverse=True)
+        report['depths'][str(depth)] = {
+            'all': distribution(times),
+            'phases': {phase: distribution(times_by_phase[(depth, phase)]) for phase in PHASES},
+            'outlier_threshold': threshold,
+            'outliers': [record for time_, _, record in slowest if time_ > threshold],
+        }
+        report['slowest'].extend(record for _, _, record in slowest)
+
+    report['slowest'].sort(key=lambda record: record['time'], reverse=True)
+    report['slowest'] = report['slowest'][:top]
+
+    for (depth, rating), row in sorted(results.items(), key=lambda item: (item[0][0] or 0, item[0][1] or 0)):
+        decided = row['wins'] + row['draws'] + row['losses']
+        points = row['wins'] + row['draws'] / 2
+        report['results'].append({
+            'depth': depth, 'rating': rating, **row,
+            'points': points, 'score': points / decided if decided else None,
+        })
+    return report
+
+
+def print_report(report: dict):
+    print(f"think time per depth and phase ({report['engine']})")
+    print(f"{'depth':>5} {'phase':>10} {'moves':>6} {'mean':>7} {'median':>7} {'p90':>7} {'p99':>7} {'max':>7}")
+    for depth, data in report['depths'].items():
+        rows = [('all', data['all'])] + list(data['phases'].items())
+        for phase, stats in rows:
+            if not stats['moves']:
+                continue
+            print(f"{depth:>5} {phase:>10} {stats['moves']:6d} {stats['mean']:7.2f} {stats['median']:7.2f} "
+                  f"{stats['p90']:7.2f} {stats['p99']:7.2f} {stats['max']:7.2f}")
+        for record in data['outliers']:
+            print(f"{'':>5} {'outlier':>10} {record['time']:7.2f}s {record['san']:>7}  {record['fen']}")
+
+    print("\nresults per opponent rating")
+    print(f"{'depth':>5} {'rating':>6} {'games':>6} {'+':>4} {'=':>4} {'-':>4} {'score':>7}")
+    for row in report['results']:
+        score = f"{row['score']:.1%}" if row['score'] is not None else '-'
+        print(f"{str(row['depth']):>5} {str(row['rating']):>6} {row['games']:6d} {row['wins']:4d} {row['draws']:4d} "
+              f"{row['losses']:4d} {score:>7}")
+
+    print("\nslowest positions")
+    for record in report['slowest']:
+        print(f"{record['time']:7.2f}s  d{record['depth']}  {record['san']:>7}  {record['fen']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="think time and result statistics over pgn files")
+    parser.add_argument('paths', nargs='*', default=['results'], help="pgn files or directories")
+    parser.add_argument('--engine', default='fichess', help="prefix of the engine's player name")
+    parser.add_argument('--top', type=int, default=20, help="number of slowest positions to keep per depth")
+    parser.add_argument('--csv', default=None, help="write every engine move to this csv file")
+    parser.add_argument('--json', default=None, help="write the report to this json file")
+    args = parser.parse_args()
+
+    report = analyse(args.paths, args.engine, args.top, args.csv)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import time
+from collections import Counter
+
+import chess
+
+from engine.Agent import Agent, EVALUATORS
+from engine.Profiler import Profiler
+
+# searches a fixed set of positions with the profiler enabled and prints where the time goes.
+# the collapsed stacks can be turned into a flamegraph with flamegraph.pl or opened in speedscope.
+
+PROFILE_POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQK2R b KQkq - 0 5",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2Q1RK1 w - - 0 10",
+    "2r2rk1/1b2qppp/p3pn2/1p6/3N4/P1B1P3/1P2QPPP/2RR2K1 b - - 0 20",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "8/5pk1/6p1/7p/7P/5K2/6P1/6R1 w - - 0 45",
+]
+
+
+def run(positions: list[str], depth: int, evaluator: str, profiler: Profiler | None) -> tuple[int, float, Counter]:
+    # the agent's counters are kept with or without the profiler
+    nodes = 0
+    counters = Counter()
+    start = time.perf_counter()
+    for fen in positions:
+        board = chess.Board(fen)
+        agent = Agent(engine_color=board.turn, evaluator=evaluator)
+        if profiler is None:
+            agent.find_best_move(board, depth)
+        else:
+            with profiler:
+                agent.find_best_move(board, depth)
+        nodes += agent.nodes
+        counters.update(tt_probes=agent.tt_probes, tt_hits=agent.tt_hits, tt_stores=agent.tt_stores)
+    return nodes, time.perf_counter() - start, counters
+
+
+def print_counters(counters: Counter):
+    hit_rate = counters['tt_hits'] / counters['tt_probes'] if counters['tt_probes'] else 0.0
+    print(f"tt: {counters['tt_probes']} probes, {hit_rate:.1%} hits, {counters['tt_stores']} stores")
+
+
+def print_report(profiler: Profiler, top: int):
+    print(f"{'function':<40} {'calls':>9} {'self s':>8} {'self %':>7} {'total s':>8} {'us/call':>8}")
+    for row in profiler.report()[:top]:
+        print(f"{row['name']:<40} {row['calls']:9d} {row['self']:8.3f} {row['share']:7.1%} {row['total']:8.3f} "
+              f"{row['per_call_us']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="profile the search on a fixed set of positions")
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--evaluator', default='eval', choices=list(EVALUATORS))
+    parser.add_argument('--fen', nargs='*', default=None, help="positions to search instead of the built in set")
+    parser.add_argument('--top', type=int, default=25, help="number of functions to show")
+    parser.add_argument('--collapsed', default='profile.folded', help="output file for the collapsed stacks")
+    parser.add_argument('--overhead', action='store_true',
+                        help="also search without the profiler to show how much it slows the search down")
+    args = parser.parse_args()
+
+    positions = args.fen or PROFILE_POSITIONS
+    profiler = Profiler()
+    nodes, elapsed, counters = run(positions, args.depth, args.evaluator, profiler)
+    print(f"{len(positions)} positions, depth {args.depth}: {nodes} nodes in {elapsed:.2f}s "
+          f"({nodes / elapsed:.0f} nps with profiling)")
+    print_counters(counters)
+    print()
+    print_report(profiler, args.top)
+
+    if args.overhead:
+        plain_nodes, plain_elapsed, plain_counters = run(positions, args.depth, args.evaluator, None)
+        print(f"\nwithout profiling: {plain_nodes / plain_elapsed:.0f} nps")
+        print_counters(plain_counters)
+
+    profiler.write_collapsed(args.collapsed)
+    print(f"\ncollapsed stacks written to {args.collapsed}")
+
+
+if __name__ == '__main__':
+    main()
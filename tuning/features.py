@@ -0,0 +1,38 @@
+import chess
+import numpy as np
+
+from engine.Eval import Eval
+from engine.weights import WEIGHTS
+
+TUNABLE_WEIGHTS = list(WEIGHTS)
+
+
+def feature_vector(board: chess.Board, names: list[str] = TUNABLE_WEIGHTS,
+                   weights: dict[str, float] = WEIGHTS) -> tuple[float, np.ndarray]:
+    # every evaluation term is linear in its weight, so the static evaluation (from white's point of view)
+    # can be written as base + features @ w. the feature of a weight is the change in evaluation when only
+    # that weight is set to 1, base is everything that isn't tuned (material, the winning bonus, ...).
+    # computing it through Eval itself keeps the features in sync with the evaluation code.
+    base_weights = dict(weights)
+    for name in names:
+        base_weights[name] = 0
+    base = Eval(chess.WHITE, weights=base_weights).evaluate_static(board)
+
+    features = np.empty(len(names))
+    for i, name in enumerate(names):
+        unit_weights = dict(base_weights)
+        unit_weights[name] = 1
+        features[i] = Eval(chess.WHITE, weights=unit_weights).evaluate_static(board) - base
+    return base, features
+
+
+def feature_matrix(positions: list[tuple[str, float]], names: list[str] = TUNABLE_WEIGHTS,
+                   weights: dict[str, float] = WEIGHTS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # returns the feature matrix X (positions x weights), the untuned base scores and the game results
+    x = np.empty((len(positions), len(names)))
+    base = np.empty(len(positions))
+    results = np.empty(len(positions))
+    for i, (fen, result) in enumerate(positions):
+        base[i], x[i] = feature_vector(chess.Board(fen), names, weights)
+        results[i] = result
+    return x, base, results
@@ -0,0 +1,79 @@
+import argparse
+import random
+import time
+from collections.abc import Iterator
+
+import chess
+import numpy as np
+
+from engine.Agent import Agent
+from engine.EvalNNUE import FEATURES, active_features
+from tuning.positions import extract_positions, random_playout
+
+# training data for the network in engine/EvalNNUE.py: quiet positions from games plus random playouts.
+# every position is labelled with the quiescence search score of the hand written evaluation (the teacher) and,
+# for positions from games, the game result. both from the side to move's point of view.
+
+MAX_PIECES = 32
+TEACHER_CLIP = 3000
+
+
+def random_playouts(count: int, seed: int = 2025) -> Iterator[str]:
+    rng = random.Random(seed)
+    produced = 0
+    while produced < count:
+        board = random_playout(rng, 4, 120)
+        if not board.is_game_over() and chess.popcount(board.occupied) > 3:
+            produced += 1
+            yield board.fen()
+
+
+def teacher_score(board: chess.Board, agents: dict[chess.Color, Agent]) -> float:
+    agent = agents[board.turn]
+    agent.key_history = []
+    score = agent.quiescence_minimax(board, 0, 0, float('-inf'), float('inf'), True)
+    return max(-TEACHER_CLIP, min(TEACHER_CLIP, score))
+
+
+def encode(positions: list[tuple[str, float | None]]) -> dict[str, np.ndarray]:
+    # feature indices padded with FEATURES, which the trainer maps to a zero row
+    n = len(positions)
+    own = np.full((n, MAX_PIECES), FEATURES, dtype=np.int16)
+    their = np.full((n, MAX_PIECES), FEATURES, dtype=np.int16)
+    teacher = np.empty(n, dtype=np.float32)
+    result = np.full(n, np.nan, dtype=np.float32)
+    agents = {color: Agent(engine_color=color) for color in chess.COLORS}
+    for i, (fen, white_result) in enumerate(positions):
+        board = chess.Board(fen)
+        white, black = active_features(board)
+        own_features, their_features = (white, black) if board.turn == chess.WHITE else (black, white)
+        own[i, :len(own_features)] = own_features
+        their[i, :len(their_features)] = their_features
+        teacher[i] = teacher_score(board, agents)
+        if white_result is not None:
+            result[i] = white_result if board.turn == chess.WHITE else 1 - white_result
+    return {'fens': np.array([fen for fen, _ in positions]), 'own': own, 'their': their,
+            'teacher': teacher, 'result': result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="export training data for the nnue evaluator")
+    parser.add_argument('paths', nargs='*', default=['results'], help="pgn files or directories")
+    parser.add_argument('-o', '--output', default='nnue_data.npz')
+    parser.add_argument('--random', type=int, default=20000, help="positions from random playouts")
+    parser.add_argument('--skip-plies', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=2025)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    positions: list[tuple[str, float | None]] = list(extract_positions(args.paths, args.skip_plies))
+    games = len(positions)
+    positions += [(fen, None) for fen in random_playouts(args.random, args.seed)]
+    data = encode(positions)
+    np.savez_compressed(args.output, **data)
+    print(f"{len(positions)} positions ({games} from games) written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import time
+
+import chess
+import numpy as np
+
+from engine.Eval import Eval
+from engine.EvalNNUE import FEATURES, NNUE_FILE, OUTPUT_SCALE, QA, QB, EvalNNUE, save_network
+from tuning.texel import win_probability
+
+# trains the network of engine/EvalNNUE.py on the cpu with numpy, from the data of tuning/nnue_data.py.
+# the float network is the quantized one without the rounding: accumulator = bias + the first layer rows of the
+# active features, clipped to [0, 1], output = own and their clipped accumulators times the output weights.
+# the loss is the squared error between the predicted win probability and a blend of the teacher's win
+# probability and the game result, like texel tuning.
+
+FEATURE_CLIP = 32000 / QA / 33  # the bias and the rows of all 32 pieces add up in the int16 accumulator
+
+
+def one_hot(indices: np.ndarray) -> np.ndarray:
+    # (batch, pieces) padded indices -> (batch, FEATURES + 1) counts, the last column is the padding
+    x = np.zeros((len(indices), FEATURES + 1), dtype=np.float32)
+    np.add.at(x, (np.arange(len(indices))[:, None], indices), 1)
+    return x
+
+
+class Network:
+    def __init__(self, hidden: int, seed: int = 2025):
+        rng = np.random.default_rng(seed)
+        self.hidden = hidden
+        self.params = {
+            'feature_weights': rng.normal(0, 0.1, (FEATURES + 1, hidden)).astype(np.float32),
+            'feature_bias': np.full(hidden, 0.1, dtype=np.float32),
+            'output_weights': rng.normal(0, 1 / np.sqrt(2 * hidden), 2 * hidden).astype(np.float32),
+            'output_bias': np.zeros(1, dtype=np.float32),
+        }
+        self.params['feature_weights'][FEATURES] = 0
+        self.m = {name: np.zeros_like(value) for name, value in self.params.items()}
+        self.v = {name: np.zeros_like(value) for name, value in self.params.items()}
+        self.step = 0
+
+    def forward(self, x_own: np.ndarray, x_their: np.ndarray) -> tuple[np.ndarray, tuple]:
+        p = self.params
+        acc_own = x_own @ p['feature_weights'] + p['feature_bias']
+        acc_their = x_their @ p['feature_weights'] + p['feature_bias']
+        hidden = np.concatenate([np.clip(acc_own, 0, 1), np.clip(acc_their, 0, 1)], axis=1)
+        output = hidden @ p['output_weights'] + p['output_bias'][0]
+        return output * OUTPUT_SCALE, (acc_own, acc_their, hidden)
+
+    def backward(self, x_own: np.ndarray, x_their: np.ndarray, cache: tuple, grad_score: np.ndarray) \
+            -> dict[str, np.ndarray]:
+        p = self.params
+        acc_own, acc_their, hidden = cache
+        grad_output = grad_score * OUTPUT_SCALE
+        grad_hidden = grad_output[:, None] * p['output_weights'][None, :]
+        grad_own = grad_hidden[:, :self.hidden] * ((acc_own > 0) & (acc_own < 1))
+        grad_their = grad_hidden[:, self.hidden:] * ((acc_their > 0) & (acc_their < 1))
+        grads = {
+            'feature_weights': x_own.T @ grad_own + x_their.T @ grad_their,
+            'feature_bias': grad_own.sum(axis=0) + grad_their.sum(axis=0),
+            'output_weights': hidden.T @ grad_output,
+            'output_bias': np.array([grad_output.sum()], dtype=np.float32),
+        }
+        grads['feature_weights'][FEATURES] = 0
+        return grads
+
+    def adam(self, grads: dict[str, np.ndarray], lr: float):
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        self.step += 1
+        for name, grad in grads.items():
+            self.m[name] = beta1 * self.m[name] + (1 - beta1) * grad
+            self.v[name] = beta2 * self.v[name] + (1 - beta2) * grad * grad
+            m_hat = self.m[name] / (1 - beta1 ** self.step)
+            v_hat = self.v[name] / (1 - beta2 ** self.step)
+            self.params[name] -= lr * m_hat / (np.sqrt(v_hat) + eps)
+        np.clip(self.params['feature_weights'], -FEATURE_CLIP, FEATURE_CLIP, out=self.params['feature_weights'])
+        np.clip(self.params['feature_bias'], -FEATURE_CLIP, FEATURE_CLIP, out=self.params['feature_bias'])
+
+    def quantized(self) -> dict[str, np.ndarray | int]:
+        p = self.params
+        return {
+            'feature_weights': np.round(p['feature_weights'][:FEATURES] * QA),
+            'feature_bias': np.round(p['feature_bias'] * QA),
+            'output_weights': np.round(p['output_weights'] * QB),
+            'output_bias': int(np.round(p['output_bias'][0] * QA * QB)),
+        }
+
+
+def targets(teacher: np.ndarray, result: np.ndarray, result_weight: float) -> np.ndarray:
+    # positions without a known result only learn from the teacher
+    target = win_probability(teacher, 1.0)
+    known = ~np.isnan(result)
+    target[known] = (1 - result_weight) * target[known] + result_weight * result[known]
+    return target
+
+
+def loss_and_grad(scores: np.ndarray, target: np.ndarray) -> tuple[float, np.ndarray]:
+    p = win_probability(scores, 1.0)
+    loss = float(np.mean((p - target) ** 2))
+    grad = 2 * (p - target) * p * (1 - p) * np.log(10) / 400 / len(scores)
+    return loss, grad
+
+
+def train(data: dict[str, np.ndarray], hidden: int, epochs: int, batch_size: int, lr: float,
+          result_weight: float, validation: float, seed: int) -> tuple[Network, float, float]:
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(data['own']))
+    split = int(len(order) * (1 - validation))
+    train_idx, valid_idx = order[:split], order[split:]
+    own, their = data['own'].astype(np.int64), data['their'].astype(np.int64)
+    target = targets(data['teacher'], data['result'], result_weight)
+
+    network = Network(hidden, seed)
+    valid_own, valid_their = one_hot(own[valid_idx]), one_hot(their[valid_idx])
+    valid_loss = float('nan')
+    for epoch in range(1, epochs + 1):
+        rng.shuffle(train_idx)
+        losses = []
+        for start in range(0, len(train_idx), batch_size):
+            batch = train_idx[start:start + batch_size]
+            x_own, x_their = one_hot(own[batch]), one_hot(their[batch])
+            scores, cache = network.forward(x_own, x_their)
+            loss, grad = loss_and_grad(scores, target[batch])
+            network.adam(network.backward(x_own, x_their, cache, grad), lr)
+            losses.append(loss)
+        if len(valid_idx):
+            valid_loss, _ = loss_and_grad(network.forward(valid_own, valid_their)[0], target[valid_idx])
+        if epoch == 1 or epoch % 5 == 0 or epoch == epochs:
+            print(f"epoch {epoch:3d}  train loss {np.mean(losses):.5f}  validation loss {valid_loss:.5f}")
+    return network, float(np.mean(losses)), valid_loss
+
+
+def evals_per_second(boards: list[chess.Board], network: dict[str, np.ndarray | int]):
+    # full evaluations of unrelated positions, and incremental ones along random games
+    nnue = EvalNNUE(chess.WHITE, network=network)
+    hand_written = Eval(chess.WHITE)
+    for name, evaluate in [('eval', hand_written.evaluate_static), ('nnue', nnue.evaluate_static)]:
+        start = time.perf_counter()
+        for board in boards:
+            evaluate(board)
+        print(f"{name:>16} {len(boards) / (time.perf_counter() - start):10.0f} evals/s")
+
+    rng = np.random.default_rng(0)
+    evaluations = 0
+    start = time.perf_counter()
+    for board in boards[:50]:
+        board = board.copy(stack=False)
+        nnue.evaluate_static(board)
+        for _ in range(40):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(moves[rng.integers(len(moves))])
+            nnue.push(board)
+            nnue.evaluate_static(board)
+            evaluations += 1
+    elapsed = time.perf_counter() - start
+    print(f"{'nnue incremental':>16} {evaluations / elapsed:10.0f} evals/s (with move generation)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="train the nnue evaluator")
+    parser.add_argument('data', nargs='*', default=['nnue_data.npz'], help="files from tuning.nnue_data")
+    parser.add_argument('-o', '--output', default=NNUE_FILE)
+    parser.add_argument('--hidden', type=int, default=64)
+    parser.add_argument('--epochs', type=int, default=12)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=0.002)
+    parser.add_argument('--result-weight', type=float, default=0.3, help="share of the game result in the target")
+    parser.add_argument('--validation', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=2025)
+    args = parser.parse_args()
+
+    parts = [np.load(path) for path in args.data]
+    data = {name: np.concatenate([part[name] for part in parts]) for name in ['fens', 'own', 'their', 'teacher',
+                                                                              'result']}
+    print(f"{len(data['own'])} positions")
+
+    start = time.perf_counter()
+    network, train_loss, valid_loss = train(data, args.hidden, args.epochs, args.batch_size, args.lr,
+                                            args.result_weight, args.validation, args.seed)
+    print(f"trained in {time.perf_counter() - start:.1f}s")
+
+    quantized = network.quantized()
+    meta = {'positions': len(data['own']), 'train_loss': train_loss, 'validation_loss': valid_loss}
+    save_network(args.output, quantized['feature_weights'], quantized['feature_bias'], quantized['output_weights'],
+                 quantized['output_bias'], meta)
+    print(f"written to {args.output}")
+
+    boards = [chess.Board(fen) for fen in data['fens'][:2000]]
+    evals_per_second(boards, {name: np.asarray(value) for name, value in quantized.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+import random
+from collections.abc import Iterator
+
+import chess
+import chess.pgn
+
+RESULT_SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+
+def pgn_files(paths: list[str]) -> Iterator[str]:
+    # accepts both files and directories, directories are searched recursively
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    if name.endswith('.pgn'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def random_playout(rng: random.Random, min_plies: int, max_plies: int) -> chess.Board:
+    # a position after a random number of random moves from the start, the game may be over
+    board = chess.Board()
+    for _ in range(rng.randint(min_plies, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+    return board
+
+
+def is_quiet(board: chess.Board, next_move: chess.Move) -> bool:
+    # ref https://www.chessprogramming.org/Texel%27s_Tuning_Method
+    # the static evaluation is only meaningful when nothing is hanging, so positions in check and
+    # positions where the played move is tactical are skipped
+    if board.is_check():
+        return False
+    if board.is_capture(next_move) or next_move.promotion or board.gives_check(next_move):
+        return False
+    return True
+
+
+def extract_positions(paths: list[str], skip_plies: int = 8) -> Iterator[tuple[str, float]]:
+    # yields (fen, result) pairs of quiet positions, the result is from white's point of view.
+    # games are read one at a time so large collections never have to fit in memory.
+    seen = set()
+    for path in pgn_files(paths):
+        with open(path) as f:
+            while True:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                result = RESULT_SCORES.get(game.headers.get('Result'))
+                if result is None:
+                    continue
+
+                board = game.board()
+                last_was_capture = False
+                for ply, move in enumerate(game.mainline_moves()):
+                    if ply >= skip_plies and not last_was_capture and is_quiet(board, move):
+                        epd = board.epd()
+                        if epd not in seen:
+                            seen.add(epd)
+                            yield board.fen(), result
+                    last_was_capture = board.is_capture(move)
+                    board.push(move)
@@ -0,0 +1,96 @@
+import argparse
+import time
+
+import numpy as np
+
+from engine.weights import WEIGHTS, WEIGHTS_FILE, save_weights
+from tuning.features import TUNABLE_WEIGHTS, feature_matrix
+from tuning.positions import extract_positions
+
+# ref https://www.chessprogramming.org/Texel%27s_Tuning_Method
+
+
+def win_probability(scores: np.ndarray, k: float) -> np.ndarray:
+    return 1 / (1 + np.power(10, -k * scores / 400))
+
+
+def logistic_loss(scores: np.ndarray, results: np.ndarray, k: float) -> float:
+    p = np.clip(win_probability(scores, k), 1e-9, 1 - 1e-9)
+    return float(-np.mean(results * np.log(p) + (1 - results) * np.log(1 - p)))
+
+
+def find_k(scores: np.ndarray, results: np.ndarray) -> float:
+    # the scaling constant is fitted once for the starting weights and then kept fixed
+    candidates = np.linspace(0.05, 3.0, 60)
+    losses = [logistic_loss(scores, results, k) for k in candidates]
+    return float(candidates[int(np.argmin(losses))])
+
+
+def fit(x: np.ndarray, base: np.ndarray, results: np.ndarray, initial: np.ndarray, k: float,
+        epochs: int = 2000, lr: float = 0.01, l2: float = 1e-3) -> np.ndarray:
+    # the weights have very different magnitudes (0.2 for the pst scale, 75 for king safety), so the
+    # optimizer works on ratios to the initial weights. the l2 term pulls the ratios back towards 1,
+    # which keeps weights that the data barely constrains close to the hand picked values.
+    initial_ = np.where(initial == 0, 1.0, initial)
+    x_scaled = x * initial_
+    ratios = np.where(initial == 0, 0.0, 1.0)
+    m = np.zeros_like(ratios)
+    v = np.zeros_like(ratios)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    c = k * np.log(10) / 400
+
+    for step in range(1, epochs + 1):
+        scores = base + x_scaled @ ratios
+        p = win_probability(scores, k)
+        grad = x_scaled.T @ (p - results) * c / len(results) + 2 * l2 * (ratios - 1)
+
+        # adam
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        m_hat = m / (1 - beta1 ** step)
+        v_hat = v / (1 - beta2 ** step)
+        ratios -= lr * m_hat / (np.sqrt(v_hat) + eps)
+
+    return ratios * initial_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tune the evaluation weights on games with known results")
+    parser.add_argument('paths', nargs='*', default=['results'], help="pgn files or directories")
+    parser.add_argument('-o', '--output', default=WEIGHTS_FILE)
+    parser.add_argument('--epochs', type=int, default=2000)
+    parser.add_argument('--lr', type=float, default=0.01)
+    parser.add_argument('--l2', type=float, default=1e-3)
+    parser.add_argument('--skip-plies', type=int, default=8)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    positions = list(extract_positions(args.paths, args.skip_plies))
+    x, base, results = feature_matrix(positions)
+    print(f"{len(positions)} quiet positions, features extracted in {time.perf_counter() - start:.1f}s")
+
+    initial = np.array([WEIGHTS[name] for name in TUNABLE_WEIGHTS], dtype=float)
+    k = find_k(base + x @ initial, results)
+    loss_before = logistic_loss(base + x @ initial, results, k)
+
+    tuned = fit(x, base, results, initial, k, args.epochs, args.lr, args.l2)
+    loss_after = logistic_loss(base + x @ tuned, results, k)
+    print(f"k = {k:.3f}, loss {loss_before:.5f} -> {loss_after:.5f}")
+
+    for name, old, new in zip(TUNABLE_WEIGHTS, initial, tuned):
+        print(f"{name:28} {old:8.3f} -> {new:8.3f}")
+
+    weights = {name: round(float(value), 4) for name, value in zip(TUNABLE_WEIGHTS, tuned)}
+    meta = {
+        'positions': len(positions),
+        'k': k,
+        'loss_before': loss_before,
+        'loss_after': loss_after,
+        'sources': args.paths,
+    }
+    save_weights(weights, args.output, meta)
+    print(f"written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
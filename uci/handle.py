@@ -1,6 +1,48 @@
 import chess
+import os
 import sys
-from engine.Agent import Agent
+
+# the engine is imported on first use (isready or go) instead of here, so a gui gets uciok as soon as the process
+# is up. match runners start hundreds of engines and time the handshake
+
+# values set with setoption, every search uses them
+options = {
+    'Contempt': 0,
+    'TTFile': '',  # keeps the transposition tables in files next to this path between searches and runs
+    'MultiPV': 1,  # number of best lines reported
+}
+
+
+def tt_file(path: str, color: chess.Color) -> str:
+    # stored scores are from the engine's side, so each color gets its own table: analysis.tt is split into
+    # analysis.white.tt and analysis.black.tt
+    root, extension = os.path.splitext(path)
+    return f"{root}.{chess.COLOR_NAMES[color]}{extension}"
+
+
+def spin(value: str, low: int, high: int, current: int) -> int:
+    # a spin option's value clamped to its advertised range, the old one stays when it isn't a number
+    try:
+        return min(max(int(value), low), high)
+    except ValueError:
+        return current
+
+
+def format_score(score: float) -> str:
+    # uci scores are from the point of view of the side to move, which is the engine
+    from engine.Agent import mate_in
+    mate = mate_in(score)
+    if mate is not None:
+        return f"mate {mate}"
+    return f"cp {round(score)}"
+
+
+def print_info(info: dict):
+    time_ms = max(round(info['time'] * 1000), 1)
+    pv = " ".join(move.uci() for move in info['pv'] or [info['move']])
+    print(f"info depth {info['depth']} seldepth {info['seldepth']} multipv {info['multipv']} "
+          f"score {format_score(info['score'])} "
+          f"nodes {info['nodes']} time {time_ms} nps {info['nodes'] * 1000 // time_ms} pv {pv}", flush=True)
 
 
 def handle(board: chess.Board, message: str):
@@ -13,10 +55,28 @@ def handle(board: chess.Board, message: str):
     if message == "uci":
         print("id name fichess")
         print("id author Filip Gavrilovski")
+        print("option name Contempt type spin default 0 min -1000 max 1000")
+        print("option name TTFile type string default <empty>")
+        print("option name MultiPV type spin default 1 min 1 max 256")
         print("uciok")
         return
 
+    if message.startswith("setoption"):
+        # setoption name <name> value <value>
+        if "name" not in parts or "value" not in parts:
+            return
+        name = " ".join(parts[parts.index("name") + 1:parts.index("value")])
+        value = " ".join(parts[parts.index("value") + 1:])
+        if name == "Contempt":
+            options[name] = spin(value, -1000, 1000, options[name])
+        elif name == "MultiPV":
+            options[name] = spin(value, 1, 256, options[name])
+        elif name == "TTFile":
+            options[name] = "" if value == "<empty>" else value
+        return
+
     if message == "isready":
+        import engine.Agent
         print("readyok")
         return
 
@@ -49,8 +109,19 @@ def handle(board: chess.Board, message: str):
         print(board.fen())
 
     if message[0:2] == "go":
-        agent = Agent(engine_color=board.turn)
-        move = agent.find_best_move(board, 4)[0]
+        from engine.Agent import Agent, MAX_SEARCH_DEPTH
+        depth = MAX_SEARCH_DEPTH
+        if "depth" in parts[:-1]:
+            depth = int(parts[parts.index("depth") + 1])
+        tt_path = tt_file(options['TTFile'], board.turn) if options['TTFile'] else None
+        try:
+            agent = Agent(engine_color=board.turn, contempt=options['Contempt'], tt_path=tt_path)
+        except ValueError as e:
+            # the file was written with other weights, contempt or evaluator, or isn't a table at all
+            print(f"info string {e}, searching without the file", flush=True)
+            agent = Agent(engine_color=board.turn, contempt=options['Contempt'])
+        move = agent.find_best_move(board, depth, info_callback=print_info, multipv=options['MultiPV'])[0]
+        agent.close()
         if move:
             print(f"bestmove {move.uci()}")
         else:
@@ -0,0 +1,116 @@
+import queue
+import threading
+
+import chess
+
+from engine.Agent import Agent, MAX_SEARCH_DEPTH
+
+
+class SearchResult:
+    def __init__(self, search_id: int, move: chess.Move | None, score: float):
+        self.search_id = search_id
+        self.move = move
+        self.score = score
+
+
+class EngineWorker:
+    # runs the agent's search in a background thread so the gui keeps handling events and repainting.
+    # the search always works on a copy of the board, finished searches are handed back through a queue.
+    #
+    # while the opponent thinks the worker can ponder: search the position after the expected reply, or
+    # analyse the opponent's position when there is no expected reply. the agent keeps its transposition
+    # table and killer moves between searches, so the real search afterwards starts warm. if the opponent
+    # plays the expected move the ponder search simply becomes the real one.
+    def __init__(self, agent: Agent, max_depth: int = MAX_SEARCH_DEPTH):
+        self.agent = agent
+        self.max_depth = max_depth
+        self.results: queue.Queue[SearchResult] = queue.Queue()
+        self.thread: threading.Thread | None = None
+        self.search_id = 0
+        self.cancelled_id = -1
+        self.info: dict = {}
+        self.lines: list[dict] = []  # info of every completed depth of the current search
+        self.root: chess.Board | None = None  # position of the current search, for printing its lines
+        self.background = False  # results of ponder and analysis searches are held back
+        self.ponder_move: chess.Move | None = None
+
+    def start(self, board: chess.Board):
+        # the agent can only run one search at a time
+        if self.is_thinking():
+            self.cancel()
+            self.thread.join()
+        self.search_id += 1
+        self.info = {}
+        self.lines = []
+        self.root = board.copy(stack=False)
+        self.background = False
+        self.ponder_move = None
+        self.agent.stopped = False  # here and not in the thread, a cancel right after this has to reach the search
+        self.thread = threading.Thread(target=self._search, args=(board.copy(), self.search_id), daemon=True)
+        self.thread.start()
+
+    def ponder(self, board: chess.Board, move: chess.Move | None):
+        # board is the position with the opponent to move, move the reply the engine expects
+        if move is not None:
+            board = board.copy()
+            board.push(move)
+        self.start(board)
+        self.background = True
+        self.ponder_move = move
+
+    def ponder_hit(self):
+        # the opponent played the expected move, the result of the ponder search is used as is
+        self.background = False
+        self.ponder_move = None
+
+    def stop_background(self):
+        if self.background:
+            self.cancel()
+            self.background = False
+            self.ponder_move = None
+
+    def _search(self, board: chess.Board, search_id: int):
+        move, score = self.agent.find_best_move(board, self.max_depth, info_callback=self._on_info)
+        self.results.put(SearchResult(search_id, move, score))
+
+    def _on_info(self, info: dict):
+        self.info = info
+        self.lines = self.lines + [info]
+
+    def is_thinking(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def live_info(self) -> dict:
+        # progress of the running search, read directly from the agent
+        return {
+            'depth': self.info.get('depth', 0),
+            'nodes': self.agent.nodes,
+            'move': self.info.get('move') or self.agent.root_best_move,
+            'score': self.info.get('score'),
+            'pv': self.info.get('pv', []),
+        }
+
+    def force_move(self):
+        # stop searching and play the best move found so far
+        self.agent.stop()
+
+    def cancel(self):
+        # stop searching and throw the result away
+        self.cancelled_id = self.search_id
+        self.agent.stop()
+
+    def poll(self) -> SearchResult | None:
+        if self.background:
+            return None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if result.search_id == self.search_id and result.search_id != self.cancelled_id:
+                return result
+
+    def shutdown(self):
+        if self.is_thinking():
+            self.cancel()
+            self.thread.join()
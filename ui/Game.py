@@ -1,12 +1,20 @@
 import pygame
 import chess
 import os
-from engine.Agent import Agent
+from engine.Agent import Agent, mate_in
+from ui.EngineWorker import EngineWorker
 
 WHITE = (255, 255, 255)
 BROWN = (92, 73, 53)
 BLACK = (0, 0, 0)
 HIGHLIGHT_COLOR = (255, 252, 166)
+BACKGROUND_COLOR = (200, 200, 200)
+
+FPS = 30
+TEXT_CACHE_SIZE = 256
+
+ANALYSIS_LINES = 5  # latest completed depths shown in the analysis overlay
+ANALYSIS_PV_LENGTH = 6
 
 WINDOW_SIZE = 800
 PADDING = 40
@@ -20,6 +28,9 @@ CAPTURED_ROW_WIDTH = (PIECES_PER_ROW * CAPTURED_IMG_SIZE) + ((PIECES_PER_ROW - 1
 CAPTURED_AREA_WIDTH = CAPTURED_ROW_WIDTH + 2 * PADDING
 TOTAL_WIDTH = WINDOW_SIZE + CAPTURED_AREA_WIDTH
 
+HEADER_RECT = pygame.Rect(0, 0, WINDOW_SIZE, PADDING)
+PANEL_RECT = pygame.Rect(WINDOW_SIZE, 0, CAPTURED_AREA_WIDTH, WINDOW_SIZE)
+
 MIDDLE_GAME_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 ENDGAME_FEN = "8/5pk1/6p1/7p/7P/5K2/6P1/6R1 w - - 0 45"
 
@@ -33,6 +44,11 @@ piece_files = {
 }
 
 
+def format_score(score: float) -> str:
+    mate = mate_in(score)
+    return f"#{mate}" if mate is not None else f"{score:.2f}"
+
+
 def load_piece_images():
     images = {}
     for color, folder in [('w', 'white'), ('b', 'black')]:
@@ -54,6 +70,7 @@ class Game:
 
         self.font = pygame.font.SysFont("Arial", 28, bold=True)
         self.small_font = pygame.font.SysFont("Arial", 20)
+        self.tiny_font = pygame.font.SysFont("Arial", 16)
 
         self.board = chess.Board(fen)
         self.images = load_piece_images()
@@ -70,6 +87,20 @@ class Game:
         self.last_move = None
         self.flipped = False
         self.engine_score = 0
+        self.captures: list[str | None] = []  # captured piece symbol per move, for taking moves back
+        self.worker: EngineWorker | None = None
+        self.show_analysis = False
+
+        # what is currently on the screen, render() only redraws the parts that differ
+        self.text_cache: dict[tuple, pygame.Surface] = {}
+        self.drawn_pieces: dict[chess.Square, chess.Piece] = {}
+        self.drawn_highlight: set[chess.Square] = set()
+        self.drawn_turn: chess.Color | None = None
+        self.drawn_panel: tuple | None = None
+        self.sprite_rect: pygame.Rect | None = None
+        self.analysed_lines: list[dict] | None = None
+        self.analysis_text: tuple[str, ...] = ()
+        self._build_static_surfaces()
 
     def _handle_capture(self, move: chess.Move):
         captured_piece = None
@@ -79,6 +110,7 @@ class Game:
         elif self.board.is_capture(move):
             captured_piece = self.board.piece_at(move.to_square)
 
+        self.captures.append(captured_piece.symbol() if captured_piece else None)
         if captured_piece:
             moving_piece_color = self.board.piece_at(move.from_square).color
             if moving_piece_color == chess.WHITE:
@@ -88,6 +120,15 @@ class Game:
                 self.captured_by_black.append(captured_piece.symbol())
                 self.captured_by_black.sort(key=lambda s: self.piece_value_map.get(s.lower(), 0))
 
+    def _take_back(self):
+        move = self.board.pop()
+        captured = self.captures.pop()
+        if captured:
+            captured_list = self.captured_by_white if self.board.turn == chess.WHITE else self.captured_by_black
+            captured_list.remove(captured)
+        self.last_move = self.board.peek() if self.board.move_stack else None
+        return move
+
     def get_square_under_mouse(self, pos):
         mx, my = pos
         if not (PADDING <= mx < PADDING + BOARD_SIZE and PADDING <= my < PADDING + BOARD_SIZE):
@@ -120,15 +161,76 @@ class Game:
             return False
         return piece.color == self.board.turn
 
+    def _build_static_surfaces(self):
+        # everything that only changes when the board is flipped is drawn once: background, empty squares
+        # and coordinates. the captured piece icons are scaled once as well.
+        self.background = pygame.Surface((TOTAL_WIDTH, WINDOW_SIZE))
+        self.background.fill(BACKGROUND_COLOR)
+        for row in range(8):
+            for col in range(8):
+                color = WHITE if (row + col) % 2 == 0 else BROWN
+                pygame.draw.rect(self.background, color, self._square_rect(row, col))
+
+        files = "abcdefgh" if not self.flipped else "hgfedcba"
+        for i in range(8):
+            rank_label = self.font.render(str(8 - i) if not self.flipped else str(i + 1), True, BLACK)
+            self.background.blit(rank_label, rank_label.get_rect(
+                center=(PADDING - 20, PADDING + i * SQUARE_SIZE + SQUARE_SIZE // 2)))
+            file_label = self.font.render(files[i], True, BLACK)
+            self.background.blit(file_label, file_label.get_rect(
+                center=(PADDING + i * SQUARE_SIZE + SQUARE_SIZE // 2, PADDING + BOARD_SIZE + 20)))
+
+        self.captured_images = {
+            symbol: pygame.transform.smoothscale(image, (CAPTURED_IMG_SIZE, CAPTURED_IMG_SIZE))
+            for symbol, image in self.images.items()
+        }
+        self.full_redraw = True
+
+    def _text(self, font: pygame.font.Font, text: str, color) -> pygame.Surface:
+        key = (id(font), text, color)
+        label = self.text_cache.get(key)
+        if label is None:
+            if len(self.text_cache) > TEXT_CACHE_SIZE:
+                self.text_cache.clear()
+            label = self.text_cache[key] = font.render(text, True, color)
+        return label
+
+    @staticmethod
+    def _square_rect(row: int, col: int) -> pygame.Rect:
+        return pygame.Rect(PADDING + col * SQUARE_SIZE, PADDING + row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+    def _squares_in_rect(self, rect: pygame.Rect) -> set[chess.Square]:
+        squares = set()
+        for row in range(8):
+            for col in range(8):
+                if rect.colliderect(self._square_rect(row, col)):
+                    squares.add(self._screen_coords_to_square(row, col))
+        return squares
+
+    def _draw_square(self, square: chess.Square) -> pygame.Rect:
+        rect = self._square_rect(*self._square_to_screen_coords(square))
+        self.screen.blit(self.background, rect, rect)
+        piece = self.board.piece_at(square)
+        if piece and (not self.dragging or square != self.dragged_from_square):
+            self.screen.blit(self.images[piece.symbol()], rect.topleft)
+        if self.last_move and square in (self.last_move.from_square, self.last_move.to_square):
+            pygame.draw.rect(self.screen, HIGHLIGHT_COLOR, rect, 6)
+        return rect
+
+    def _render_header(self):
+        self.screen.blit(self.background, HEADER_RECT, HEADER_RECT)
+        turn_text = f"{'White' if self.board.turn == chess.WHITE else 'Black'}'s turn"
+        turn_label = self._text(self.font, turn_text, BLACK)
+        self.screen.blit(turn_label, (PADDING, PADDING // 2 - turn_label.get_height() // 2))
+
     def _render_captured(self):
         def draw_set(title, score_text, pieces, start_y):
             base_x = WINDOW_SIZE + PADDING
-            title_text = self.small_font.render(f"{title} {score_text}", True, BLACK)
+            title_text = self._text(self.small_font, f"{title} {score_text}", BLACK)
             self.screen.blit(title_text, (base_x, start_y))
 
             for i, symbol in enumerate(pieces):
-                img = self.images[symbol]
-                img = pygame.transform.smoothscale(img, (CAPTURED_IMG_SIZE, CAPTURED_IMG_SIZE))
+                img = self.captured_images[symbol]
 
                 row = i // PIECES_PER_ROW
                 col = i % PIECES_PER_ROW
@@ -153,67 +255,134 @@ class Game:
         draw_set("Black's Captures", black_score_text, self.captured_by_black, PADDING + 50)
         draw_set("White's Captures", white_score_text, self.captured_by_white, PADDING + 250)
 
-    def render(self):
-        turn_text = f"{'White' if self.board.turn == chess.WHITE else 'Black'}'s turn"
-        turn_label = self.font.render(turn_text, True, BLACK)
-        self.screen.blit(turn_label, (PADDING, PADDING // 2 - turn_label.get_height() // 2))
-
-        files = "abcdefgh" if not self.flipped else "hgfedcba"
-
-        for row in range(8):
-            for col in range(8):
-                color = WHITE if (row + col) % 2 == 0 else BROWN
-                rect = pygame.Rect(
-                    PADDING + col * SQUARE_SIZE,
-                    PADDING + row * SQUARE_SIZE,
-                    SQUARE_SIZE,
-                    SQUARE_SIZE
-                )
-                pygame.draw.rect(self.screen, color, rect)
-
-                square = self._screen_coords_to_square(row, col)
-                piece = self.board.piece_at(square)
-                if piece and (not self.dragging or square != self.dragged_from_square):
-                    symbol = piece.symbol()
-                    self.screen.blit(self.images[symbol], rect.topleft)
-
-            rank_label_text = str(8 - row) if not self.flipped else str(row + 1)
-            label = self.font.render(rank_label_text, True, BLACK)
-            label_rect = label.get_rect(
-                center=(PADDING - 20, PADDING + row * SQUARE_SIZE + SQUARE_SIZE // 2))
-            self.screen.blit(label, label_rect)
-
-        if self.last_move:
-            for square in [self.last_move.from_square, self.last_move.to_square]:
-                row, col = self._square_to_screen_coords(square)
-                rect = pygame.Rect(
-                    PADDING + col * SQUARE_SIZE,
-                    PADDING + row * SQUARE_SIZE,
-                    SQUARE_SIZE,
-                    SQUARE_SIZE
-                )
-                pygame.draw.rect(self.screen, HIGHLIGHT_COLOR, rect, 6)
-
-        for col in range(8):
-            label = self.font.render(files[col], True, BLACK)
-            label_rect = label.get_rect(
-                center=(PADDING + col * SQUARE_SIZE + SQUARE_SIZE // 2, PADDING + BOARD_SIZE + 20))
-            self.screen.blit(label, label_rect)
-
-        score_text = f"Engine eval: {self.engine_score:.2f}"
+    def _analysis_lines(self) -> tuple[str, ...]:
+        # the best line of the latest completed depths of the current or last search, deepest first
+        if not self.worker or not self.worker.root:
+            return ()
+        root = self.worker.root
+        lines = []
+        for info in reversed(self.worker.lines[-ANALYSIS_LINES:]):
+            pv = info['pv'][:ANALYSIS_PV_LENGTH] or [info['move']]
+            lines.append(f"d{info['depth']} {format_score(info['score'])}  {root.variation_san(pv)}")
+        return tuple(lines)
+
+    def _panel_state(self) -> tuple:
+        thinking = None
+        if self.worker and self.worker.is_thinking():
+            info = self.worker.live_info()
+            thinking = (info['depth'], info['nodes'], info['move'], self.worker.background, self.worker.ponder_move)
+        analysis = None
+        if self.show_analysis:
+            # the lines only change when a depth completes
+            if self.worker is None or self.worker.lines is not self.analysed_lines:
+                self.analysed_lines = self.worker.lines if self.worker else None
+                self.analysis_text = self._analysis_lines()
+            analysis = self.analysis_text
+        return round(self.engine_score, 2), tuple(self.captured_by_white), tuple(self.captured_by_black), \
+            thinking, analysis
+
+    def _render_panel(self, state: tuple):
+        self.screen.blit(self.background, PANEL_RECT, PANEL_RECT)
+
+        score_text = f"Engine eval: {format_score(self.engine_score)}"
         score_color = (0, 128, 0) if self.engine_score > 0 else (200, 0, 0) if self.engine_score < 0 else BLACK
-        score_label = self.small_font.render(score_text, True, score_color)
-        self.screen.blit(score_label, (WINDOW_SIZE + PADDING, PADDING))
+        self.screen.blit(self._text(self.small_font, score_text, score_color), (WINDOW_SIZE + PADDING, PADDING))
 
         self._render_captured()
 
+        thinking, analysis = state[3], state[4]
+        if analysis is not None:
+            self._render_analysis(analysis)
+        if thinking:
+            self._render_thinking(*thinking)
+
+    def _render_analysis(self, lines: tuple[str, ...]):
+        base_y = PADDING + 420
+        title = self._text(self.small_font, "Analysis (A to hide)", BLACK)
+        self.screen.blit(title, (WINDOW_SIZE + PADDING, base_y))
+        for i, line in enumerate(lines):
+            label = self._text(self.tiny_font, line, BLACK)
+            self.screen.blit(label, (WINDOW_SIZE + PADDING, base_y + 30 + i * 22))
+
+    def _render_thinking(self, depth: int, nodes: int, move: chess.Move | None, pondering: bool,
+                         ponder_move: chess.Move | None):
+        if not pondering:
+            title, hint = "Thinking...", "Space: move now, Esc: cancel"
+        elif ponder_move:
+            title, hint = "Pondering...", f"expecting {ponder_move.uci()}"
+        else:
+            title, hint = "Analysing...", ""
+        lines = [
+            f"{title} depth {depth + 1}",
+            f"{nodes} nodes, best {move.uci() if move else '-'}",
+            hint,
+        ]
+        for i, line in enumerate(lines):
+            if not line:
+                continue
+            label = self._text(self.small_font, line, BLACK)
+            self.screen.blit(label, (WINDOW_SIZE + PADDING, WINDOW_SIZE - PADDING - (len(lines) - i) * 26))
+
+    def render(self) -> list[pygame.Rect]:
+        # redraws only what changed since the last frame and returns the dirty rectangles
+        dirty = []
+        dirty_squares = set()
+        header_dirty = panel_dirty = False
+
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            dirty.append(self.screen.get_rect())
+            dirty_squares.update(chess.SQUARES)
+            header_dirty = panel_dirty = True
+            self.full_redraw = False
+
+        # whatever the dragged piece covered last frame
+        sprite_rect = None
         if self.dragging and self.dragged_piece:
-            self.screen.blit(self.images[self.dragged_piece], self.dragged_pos)
+            sprite_rect = pygame.Rect(self.dragged_pos, (SQUARE_SIZE, SQUARE_SIZE))
+        if self.sprite_rect and self.sprite_rect != sprite_rect:
+            self.screen.blit(self.background, self.sprite_rect, self.sprite_rect)
+            dirty.append(self.sprite_rect)
+            dirty_squares |= self._squares_in_rect(self.sprite_rect)
+            header_dirty |= bool(self.sprite_rect.colliderect(HEADER_RECT))
+            panel_dirty |= bool(self.sprite_rect.colliderect(PANEL_RECT))
+
+        # squares whose piece or highlight changed, this also covers castling, en passant and take backs
+        pieces = self.board.piece_map()
+        if self.dragging:
+            pieces.pop(self.dragged_from_square, None)
+        dirty_squares.update(square for square in pieces.keys() | self.drawn_pieces.keys()
+                             if pieces.get(square) != self.drawn_pieces.get(square))
+        highlight = {self.last_move.from_square, self.last_move.to_square} if self.last_move else set()
+        dirty_squares |= highlight ^ self.drawn_highlight
+        self.drawn_pieces = pieces
+        self.drawn_highlight = highlight
+
+        for square in dirty_squares:
+            dirty.append(self._draw_square(square))
+
+        if header_dirty or self.board.turn != self.drawn_turn:
+            self._render_header()
+            self.drawn_turn = self.board.turn
+            dirty.append(HEADER_RECT)
+
+        state = self._panel_state()
+        if panel_dirty or state != self.drawn_panel:
+            self._render_panel(state)
+            self.drawn_panel = state
+            dirty.append(PANEL_RECT)
+
+        if sprite_rect:
+            self.screen.blit(self.images[self.dragged_piece], sprite_rect)
+            if sprite_rect != self.sprite_rect or dirty:
+                dirty.append(sprite_rect)
+        self.sprite_rect = sprite_rect
+
+        return dirty
 
     def print_text(self, text: str):
-        self.screen.fill((200, 200, 200))
+        self.full_redraw = True
         self.render()
-        pygame.display.flip()
 
         overlay = pygame.Surface((TOTAL_WIDTH, WINDOW_SIZE), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 128))
@@ -225,40 +394,70 @@ class Game:
         pygame.display.flip()
         pygame.time.wait(3000)
 
-    def start_game(self, engine_color: chess.Color = chess.BLACK, with_fen: bool = False):
+    def start_game(self, engine_color: chess.Color = chess.BLACK, with_fen: bool = False, ponder: bool = True):
+        # with ponder the engine keeps searching during the player's turn, see EngineWorker
         self.flipped = (engine_color == chess.WHITE)
+        self._build_static_surfaces()
         agent = Agent(engine_color=engine_color)
+        self.worker = EngineWorker(agent)
+        clock = pygame.time.Clock()
+        engine_paused = False
+        pondered_ply = -1
+        checked_ply = -1
         running = True
 
         while running:
-            if self.board.is_checkmate():
-                winner = "White" if self.board.turn == chess.BLACK else "Black"
-                self.print_text(f"Checkmate! {winner} wins!")
-                running = False
-                continue
-            if self.board.is_stalemate() or self.board.is_insufficient_material() or self.board.is_seventyfive_moves() or self.board.is_fivefold_repetition():
-                self.print_text("Stalemate!")
-                running = False
-                continue
-
-            if self.board.turn == engine_color:
-                best_move, best_score = agent.find_best_move(self.board)
-                self.engine_score = best_score
-                if best_move:
-                    self._handle_capture(best_move)
-                    self.board.push(best_move)
-                    self.last_move = best_move
-                    if with_fen: print(self.board.fen())
-                self.screen.fill((200, 200, 200))
-                self.render()
-                pygame.display.flip()
-                continue
+            # the game can only end after a move
+            if self.board.ply() != checked_ply:
+                checked_ply = self.board.ply()
+                if self.board.is_checkmate():
+                    winner = "White" if self.board.turn == chess.BLACK else "Black"
+                    self.print_text(f"Checkmate! {winner} wins!")
+                    running = False
+                    continue
+                if self.board.is_stalemate() or self.board.is_insufficient_material() or self.board.is_seventyfive_moves() or self.board.is_fivefold_repetition():
+                    self.print_text("Stalemate!")
+                    running = False
+                    continue
+
+            # the engine searches in the background, the loop keeps handling events and repainting
+            result = self.worker.poll()
+            if result and result.move and self.board.turn == engine_color:
+                self.engine_score = result.score
+                self._handle_capture(result.move)
+                self.board.push(result.move)
+                self.last_move = result.move
+                if with_fen: print(self.board.fen())
+            elif self.board.turn == engine_color and not engine_paused and not self.worker.is_thinking() \
+                    and not self.worker.results.qsize():
+                self.worker.start(self.board)
+
+            players_turn = self.board.turn != engine_color
+
+            if ponder and players_turn and pondered_ply != self.board.ply():
+                # search the reply the engine expects, or the whole position if it has none
+                pondered_ply = self.board.ply()
+                expected = agent.principal_variation(self.board, 1)
+                self.worker.ponder(self.board, expected[0] if expected else None)
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
 
-                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                    self.show_analysis = not self.show_analysis
+
+                elif event.type == pygame.KEYDOWN and self.worker.is_thinking() and not self.worker.background:
+                    if event.key == pygame.K_SPACE:
+                        self.worker.force_move()
+                    elif event.key == pygame.K_ESCAPE:
+                        # stop the engine and take back the player's last move
+                        self.worker.cancel()
+                        if self.board.move_stack:
+                            self._take_back()
+                        engine_paused = True
+
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and players_turn:
                     row, col = self.get_square_under_mouse(event.pos)
                     if row is not None:
                         square = self._screen_coords_to_square(row, col)
@@ -289,18 +488,25 @@ class Game:
                         move = chess.Move(from_square, to_square, promotion=chess.QUEEN if is_promotion else None)
 
                         if move in self.board.legal_moves:
+                            if self.worker.background and move == self.worker.ponder_move:
+                                self.worker.ponder_hit()
+                            else:
+                                self.worker.stop_background()
                             self._handle_capture(move)
                             self.board.push(move)
                             self.engine_score = agent.evaluator.evaluate(self.board, 0)
                             self.last_move = move
+                            engine_paused = False
                             if with_fen: print(self.board.fen())
 
                     self.dragging = False
                     self.dragged_piece = None
                     self.dragged_from_square = None
 
-            self.screen.fill((200, 200, 200))
-            self.render()
-            pygame.display.flip()
+            dirty = self.render()
+            if dirty:
+                pygame.display.update(dirty)
+            clock.tick(FPS)
 
+        self.worker.shutdown()
         pygame.quit()
\ No newline at end of file